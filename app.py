@@ -1,25 +1,51 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import os
+import time
+import logging
+import telemetry
+from index_store import MODEL_NAME, LiveIndex, search_parameter
+from encoders import load_encoder
+from query_cache import result_cache, cache_stats
+from query_batcher import QueryBatcher
+from lexical_index import SEARCH_MODE, SEARCH_MODES
+import serving
+from shards import SHARDS, ShardCoordinator
+
+telemetry.configure_logging()  # LOG_LEVEL, LOG_FORMAT
+log = logging.getLogger('app')
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize RAG components
-MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Initialize RAG components (prebuilt index, memory mapped)
 try:
-    embedding_model = SentenceTransformer(MODEL_NAME)
-    index = faiss.read_index("case_embeddings.index")
-    cases = np.load("case_ids.npy", allow_pickle=True)
-except Exception as e:
-    print(f"Error loading RAG components: {str(e)}")
+    embedding_model = load_encoder(MODEL_NAME)  # ENCODER_BACKEND: torch, onnx or onnx-int8
+    coordinator = live_index = batcher = None
+    if SHARDS:  # the shard servers hold the index (shards.py)
+        coordinator = ShardCoordinator(embedding_model)
+    else:
+        live_index = LiveIndex(embedding_model)  # follows versions published by index_store.py update, read per request
+        batcher = QueryBatcher(embedding_model)  # coalesces concurrent requests
+    serving.register(app, embedding_model, live_index, batcher, coordinator)  # /ready, warm-up per worker
+except Exception:
+    log.exception("Error loading RAG components")
+
+# Frontend filters -> metadata columns (case_metadata.py), 'keyword' has no column
+METADATA_FILTERS = {
+    'judge': 'judge',
+    'caseNo': 'case_number',
+    'crimeNo': 'crime_number',
+    'petitioner': 'parties',  # petitioner or respondent, cause titles often swap the roles
+    'lawyer': 'lawyer',
+    'location': 'location',
+    'timeframe': 'date'
+}
 
 @app.route('/search-cases', methods=['POST'])
 def search_cases():
     try:
+        start = time.perf_counter()
         data = request.get_json()
         if not data:
             return jsonify({"status": "error", "message": "No filters provided"}), 400
@@ -46,32 +72,72 @@ def search_cases():
                 query_parts.append(value)
         query = " ".join(query_parts)
 
-        # Use RAG to retrieve cases
-        query_embedding = embedding_model.encode([query], convert_to_numpy=True)
-        distances, indices = index.search(query_embedding, 10)  # Get top 10 results
-        retrieved_cases = [cases[i] for i in indices[0] if i < len(cases)]
-
-        # Apply additional filtering
-        filtered_cases = []
-        for case in retrieved_cases:
-            case_text = str(case).lower()
-            matches_all = True
-            
-            for key, value in filters.items():
-                if value and value.lower() not in case_text:
-                    matches_all = False
-                    break
-            
-            if matches_all:
-                filtered_cases.append(case)
+        # vector, lexical (BM25) or hybrid ranking
+        mode = data.get('mode') or SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            return jsonify({"status": "error", "message": f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+        try:
+            nprobe = search_parameter(data.get('nprobe'), 'nprobe')
+            ef_search = search_parameter(data.get('efSearch'), 'efSearch')
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        telemetry.observe('parse', time.perf_counter() - start)
+        telemetry.annotate(query=query[:200], mode=mode)
 
-        return jsonify({
-            "status": "success",
-            "cases": filtered_cases[:10]  # Limit to 10 results
-        })
+        # Sharded index: every shard filters and ranks its own cases, the best 10 are merged
+        if coordinator is not None:
+            try:
+                retrieved_cases, missing = coordinator.search(
+                    query, 10, {column: filters[key] for key, column in METADATA_FILTERS.items()},
+                    keyword=filters['keyword'], mode=mode, nprobe=nprobe,
+                    ef_search=ef_search, snippets=False)
+            except ValueError as e:
+                return jsonify({"status": "error", "message": str(e)}), 400
+            with telemetry.timed('serialize'):
+                return jsonify({"status": "success", "cases": retrieved_cases, "partial": bool(missing)})
+
+        case_index = live_index.get()
+        cases = case_index.cases
+
+        # Same filters on the same index version give the same result
+        cache_key = ("search-cases", tuple(filters.items()), nprobe, ef_search, mode)
+        cached = result_cache.get(cache_key, case_index.version)
+        if cached is not None:
+            return jsonify({"status": "success", "cases": list(cached)})
 
-    except Exception as e:
-        print(f"Error processing request: {str(e)}")
+        # Metadata filters pick the candidate cases before the vector search
+        start = time.perf_counter()
+        try:
+            case_ids = case_index.metadata.filter(
+                {column: filters[key] for key, column in METADATA_FILTERS.items()})
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        # The keyword's words must appear in the text itself, looked up in the BM25 postings
+        if filters['keyword']:
+            keyword_ids = case_index.keyword_cases(filters['keyword'])
+            if case_ids is not None:  # only canonical cases have passages, so a near-duplicate's id never matches
+                keyword_ids = np.intersect1d(case_index.canonical_cases(case_ids), keyword_ids)
+            case_ids = keyword_ids
+        telemetry.observe('filter', time.perf_counter() - start)
+
+        # Use RAG to rank the candidates
+        hits = []
+        if case_ids is None or len(case_ids):
+            hits = batcher.search_cases(case_index, query, 10,  # Get top 10 cases
+                                        nprobe=nprobe, ef_search=ef_search,
+                                        case_ids=case_ids, mode=mode)
+        with telemetry.timed('serialize'):
+            retrieved_cases = [str(cases[hit["case"]]) for hit in hits]
+
+            result_cache.put(cache_key, tuple(retrieved_cases), case_index.version)
+            return jsonify({
+                "status": "success",
+                "cases": retrieved_cases
+            })
+
+    except Exception:
+        log.exception("Error processing request")
         return jsonify({
             "status": "error",
             "message": "Error processing request. Please try again."
@@ -79,7 +145,11 @@ def search_cases():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy"})
+    return jsonify({"status": "healthy", "cache": cache_stats()})
+
+telemetry.instrument(app)  # stage histograms on /metrics, X-Trace-Id, slow request log
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000) 
\ No newline at end of file
+    # Development server; in production run `python serving.py app`
+    serving.start()
+    app.run(debug=True, use_reloader=False, port=5000)
@@ -1,46 +1,87 @@
+import logging
 from flask import Flask, request, jsonify
-from rag import retrieve_cases
+import rag
+from rag import retrieve_cases, find_cases
+from query_cache import cache_stats
+from index_store import AGGREGATIONS, search_parameter
+from lexical_index import SEARCH_MODE, SEARCH_MODES
 from flask_cors import CORS
+import serving
+import telemetry
+
+log = logging.getLogger('backend')
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+serving.register(app, rag.embedding_model, rag.live_index, rag.batcher, rag.coordinator)  # /ready, warm-up
 
 @app.route('/chat', methods=['POST'])
 def chat():
-    data = request.json
-    query = data.get('query', '')
-    print(f"Received request with data: {data}")
+    with telemetry.timed('parse'):
+        data = request.json
+        query = data.get('query', '')
+        mode = data.get('mode') or SEARCH_MODE
+        aggregate = data.get('aggregate') or 'max'
+    telemetry.annotate(query=query[:200], mode=mode)
+    log.debug("chat request", extra={'request': data})
     if not query:
-        print("No query provided in the request.")
+        log.info("chat request without a query")
         return jsonify({'error': 'No query provided'}), 400
+    if mode not in SEARCH_MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+    if aggregate not in AGGREGATIONS:
+        return jsonify({'error': f"aggregate must be one of {', '.join(AGGREGATIONS)}"}), 400
+    try:
+        nprobe = search_parameter(data.get('nprobe'), 'nprobe')
+        ef_search = search_parameter(data.get('efSearch'), 'efSearch')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Retrieve cases using the chatbot functionality
     try:
-        retrieved_cases = retrieve_cases(query)
-        print(f"Retrieved cases: {retrieved_cases}")
-    except Exception as e:
-        print(f"Error retrieving cases: {e}")
+        # Snippets of the best matching passages per case, optional ANN tuning
+        # for IVF (nprobe) / HNSW (efSearch) indexes, max/sum case scoring and
+        # vector/lexical/hybrid retrieval
+        retrieved_cases = retrieve_cases(query, nprobe=nprobe, ef_search=ef_search,
+                                         aggregate=aggregate, mode=mode)
+        log.debug("retrieved cases", extra={'cases': len(retrieved_cases)})
+    except Exception:
+        log.exception("error retrieving cases")
         return jsonify({'error': 'Error retrieving cases'}), 500
     
-    return jsonify({'cases': retrieved_cases})
+    with telemetry.timed('serialize'):
+        return jsonify({'cases': retrieved_cases})
 
 @app.route('/retrieve-judge', methods=['POST'])
 def retrieve_judge_cases():
-    data = request.json
-    judge = data.get('judge', '')
-    print(f"Received request for judge: {judge}")
+    with telemetry.timed('parse'):
+        data = request.json
+        judge = data.get('judge', '')
+    telemetry.annotate(judge=judge[:200])
+    log.debug("judge request", extra={'judge': judge})
     
     if not judge:
         return jsonify({'error': 'No judge name provided'}), 400
     
     try:
-        # Use the retrieve_cases function with judge filter
-        cases = retrieve_cases(query="", judge_name=judge)
-        print(f"Retrieved cases for judge {judge}: {cases}")
-        return jsonify({'cases': cases})
+        # Metadata index lookup, no query to embed
+        cases = find_cases(judge_name=judge, limit=int(data.get('limit', 20)))
+        log.debug("retrieved cases for judge", extra={'judge': judge, 'cases': len(cases)})
+        with telemetry.timed('serialize'):
+            return jsonify({'cases': cases})
     except Exception as e:
-        print(f"Error retrieving cases for judge {judge}: {e}")
+        log.exception("error retrieving cases for judge", extra={'judge': judge})
         return jsonify({'error': str(e)}), 500
 
+@app.route('/cache-stats', methods=['GET'])
+def cache_statistics():
+    # Hit/miss counters of the query embedding and result caches
+    return jsonify(cache_stats())
+
+telemetry.instrument(app)  # stage histograms on /metrics, X-Trace-Id, slow request log
+
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    # Development server; in production run `python serving.py backend`. No
+    # reloader, it would import rag.py (model and index) a second time
+    serving.start()
+    app.run(debug=True, use_reloader=False)
@@ -0,0 +1,95 @@
+"""Recall vs latency of the ANN index types against the exact flat index.
+
+    python -m benchmarks.ann_recall [--index case_embeddings.index] [--synthetic 200000] [--k 10]
+
+Vectors come from an existing index file (the shipped case_embeddings.index
+by default). The hackathon set has only a few dozen cases. --synthetic N
+grows it to N vectors by blending and jittering the real ones, normalized
+like MiniLM embeddings, which gives numbers that mean something at archive
+scale. Queries are generated the same way and are not in the index.
+
+The compressed types (sq8, pq, ivf_pq) are also run with rerank=R: a
+shortlist of R*k from the compressed codes, re-ranked by exact distance to
+the float vectors, as CaseIndex.search does with INDEX_RERANK. B/vector is
+the serialized index size per vector; the float vectors a re-ranking index
+reads stay memory mapped on disk and are not counted.
+"""
+import time
+import argparse
+import faiss
+import numpy as np
+from index_store import make_index, train_and_add, search_parameters, rerank
+
+PARAM_GRID = {
+    "flat": [{}],
+    "ivf_flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+    "ivf_pq": [{"nprobe": p} for p in (1, 4, 16, 64)] + [{"nprobe": p, "rerank": 4} for p in (16, 64)],
+    "hnsw": [{"ef_search": e} for e in (16, 32, 64, 128, 256)],
+    "fp16": [{}],
+    "sq8": [{}, {"rerank": 2}, {"rerank": 4}],
+    "pq": [{}, {"rerank": 4}, {"rerank": 16}],
+}
+
+def jitter(vectors, n, sigma, rng):
+    # Random blends of two real vectors plus noise: a spread-out set rather
+    # than tight clusters of near-duplicates with ambiguous nearest neighbours
+    a, b = vectors[rng.integers(0, len(vectors), n)], vectors[rng.integers(0, len(vectors), n)]
+    w = rng.random((n, 1), dtype=np.float32)
+    noisy = w * a + (1 - w) * b + rng.normal(0, sigma, a.shape).astype(np.float32)
+    return noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+def load_vectors(path):
+    index = faiss.read_index(path)
+    return index.reconstruct_n(0, index.ntotal)
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="case_embeddings.index", help="flat index to take vectors from")
+    parser.add_argument("--synthetic", type=int, default=0, help="grow the set to this many jittered vectors")
+    parser.add_argument("--sigma", type=float, default=0.02, help="per-dimension jitter for synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = load_vectors(args.index)
+    if args.synthetic > len(vectors):
+        vectors = np.vstack([vectors, jitter(vectors, args.synthetic - len(vectors), args.sigma, rng)])
+    queries = jitter(vectors, args.queries, args.sigma, rng)
+    k = min(args.k, len(vectors))
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, recall@{k} vs flat\n")
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    print(f"{'index':<10}{'params':<24}{'build s':>9}{'MB':>9}{'B/vector':>10}{'ms/query':>10}{'recall':>9}")
+    for index_type, grid in PARAM_GRID.items():
+        start = time.perf_counter()
+        index = train_and_add(make_index(index_type, vectors.shape[1], len(vectors)), vectors)
+        build_s = time.perf_counter() - start
+        size = len(faiss.serialize_index(index))
+        for params in grid:
+            shortlist = k * params.get("rerank", 1)
+            search_params = search_parameters(index, params.get("nprobe"), params.get("ef_search"))
+            found = np.empty((len(queries), k), dtype=np.int64)
+            start = time.perf_counter()
+            for i, q in enumerate(queries):  # one query at a time, as the servers search
+                if search_params is None:
+                    distances, ids = index.search(q[None, :], shortlist)
+                else:
+                    distances, ids = index.search(q[None, :], shortlist, params=search_params)
+                if shortlist > k:
+                    distances, ids = rerank(q[None, :], ids, vectors, k)
+                found[i] = ids[0]
+            ms = 1000 * (time.perf_counter() - start) / len(queries)
+            label = ",".join(f"{key}={value}" for key, value in params.items()) or "-"
+            print(f"{index_type:<10}{label:<24}{build_s:>9.2f}{size / 1e6:>9.1f}{size / len(vectors):>10.1f}"
+                  f"{ms:>10.3f}{recall_at_k(found, truth):>9.3f}")
+
+if __name__ == "__main__":
+    main()
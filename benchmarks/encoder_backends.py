@@ -0,0 +1,83 @@
+"""Encode latency, throughput, memory and retrieval agreement of the encoder backends.
+
+    python -m benchmarks.encoder_backends [--backends torch onnx onnx-int8] [--queries 200] [--passages 512] [--k 10]
+
+Each backend is loaded in a fresh process, so load time and RSS are its own.
+Queries are random snippets of the indexed cases (as in query_batching) and
+are searched on the stored index with every backend's embeddings; agreement
+is the overlap of the top k cases with those of the first backend, which is
+the reference (torch by default, the model the index was built with).
+"""
+import time
+import argparse
+import multiprocessing
+import numpy as np
+from index_store import MODEL_NAME, INDEX_DIR, load_index
+from encoders import ENCODER_BACKENDS
+from benchmarks.query_batching import make_queries
+
+def rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        import resource  # peak, not current, and Unix only
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(backend, queries, passages, batch_size):
+    from encoders import load_encoder
+    start = time.perf_counter()
+    encoder = load_encoder(MODEL_NAME, backend)
+    load_s = time.perf_counter() - start
+    encoder.encode(["warm up"])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        encoder.encode([query])
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    encoder.encode(passages, batch_size=batch_size)
+    throughput = len(passages) / (time.perf_counter() - start)
+    return {"load_s": load_s, "p50_ms": 1000 * np.percentile(latencies, 50),
+            "p99_ms": 1000 * np.percentile(latencies, 99), "passages_per_s": throughput, "rss_mb": rss_mb(),
+            "embeddings": np.asarray(encoder.encode(queries, batch_size=batch_size), dtype=np.float32)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=ENCODER_BACKENDS, default=list(ENCODER_BACKENDS))
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--passages", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    case_index, problem = load_index(args.index_dir, text_file=None)
+    if case_index is None:
+        raise SystemExit(f"No usable index in {args.index_dir}: {problem}")
+    queries = make_queries(case_index.cases, args.queries)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(case_index.index.ntotal, min(args.passages, case_index.index.ntotal), replace=False)
+    passages = [case_index.passage(i) for i in sample]
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for backend in args.backends:
+        with context.Pool(1) as pool:
+            results[backend] = pool.apply(measure, (backend, queries, passages, args.batch_size))
+
+    reference = args.backends[0]
+    ranked = {b: [[hit["case"] for hit in hits] for hits in case_index.search_cases(r["embeddings"], args.k)]
+              for b, r in results.items()}
+    print(f"\n{len(queries)} queries, {len(passages)} passages (batch {args.batch_size}), "
+          f"top {args.k} cases vs {reference}\n")
+    print(f"{'backend':>10}{'load s':>8}{'RSS MB':>8}{'p50 ms':>8}{'p99 ms':>8}{'pass/s':>8}"
+          f"{'cosine':>8}{'overlap':>9}")
+    for backend, r in results.items():
+        cosine = np.mean(np.sum(r["embeddings"] * results[reference]["embeddings"], axis=1))
+        overlap = np.mean([len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(ranked[backend], ranked[reference])])
+        print(f"{backend:>10}{r['load_s']:>8.2f}{r['rss_mb']:>8.0f}{r['p50_ms']:>8.1f}{r['p99_ms']:>8.1f}"
+              f"{r['passages_per_s']:>8.0f}{cosine:>8.4f}{overlap:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmarks the OCR preprocessing settings on sample PDFs.
+
+    python -m benchmarks.ocr_preprocessing path/to/pdfs [--pages 20] [--ocr]
+
+For every preset it reports render + preprocessing time and memory per page.
+With --ocr it also reports EasyOCR time and characters recognized per page.
+"""
+import os
+import time
+import argparse
+import tracemalloc
+import fitz
+from image_preprocessing import make_settings, render_page
+
+PRESETS = {
+    "legacy-72dpi-rgb": make_settings(dpi=72, grayscale=False),
+    "gray-72dpi": make_settings(dpi=72),
+    "gray-auto": make_settings(),
+    "gray-auto-deskew": make_settings(deskew=True),
+    "gray-auto-otsu": make_settings(binarize="otsu"),
+    "gray-auto-deskew-adaptive": make_settings(deskew=True, binarize="adaptive"),
+}
+
+def sample_pages(pdf_dir, max_pages):
+    pages = []
+    for filename in sorted(os.listdir(pdf_dir)):
+        if not filename.lower().endswith(".pdf"):
+            continue
+        doc = fitz.open(os.path.join(pdf_dir, filename))
+        for page in doc:
+            pages.append(page)
+            if len(pages) >= max_pages:
+                return pages
+    return pages
+
+def bench_preset(pages, settings, reader=None):
+    render_s = ocr_s = 0.0
+    peak_bytes = chars = dpi_total = 0
+    for page in pages:
+        tracemalloc.start()
+        start = time.perf_counter()
+        img = render_page(page, settings)
+        render_s += time.perf_counter() - start
+        # tracemalloc sees NumPy copies, the MuPDF pixmap buffer is added by hand
+        pixmap_bytes = img.pixmap.h * img.pixmap.stride if img.pixmap is not None else 0
+        peak_bytes += tracemalloc.get_traced_memory()[1] + pixmap_bytes
+        tracemalloc.stop()
+        dpi_total += img.dpi
+
+        if reader is not None:
+            start = time.perf_counter()
+            chars += len(" ".join(reader.readtext(img.image, detail=0)))
+            ocr_s += time.perf_counter() - start
+    n = len(pages)
+    return {
+        "render_ms": 1000 * render_s / n,
+        "ocr_ms": 1000 * ocr_s / n if reader is not None else None,
+        "mem_kb": peak_bytes / n / 1024,
+        "dpi": dpi_total / n,
+        "chars": chars / n if reader is not None else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_dir")
+    parser.add_argument("--pages", type=int, default=20, help="number of pages to sample")
+    parser.add_argument("--ocr", action="store_true", help="also time EasyOCR on every rendering")
+    args = parser.parse_args()
+
+    pages = sample_pages(args.pdf_dir, args.pages)
+    if not pages:
+        print("No PDF pages found.")
+        return
+    reader = None
+    if args.ocr:
+        import easyocr
+        reader = easyocr.Reader(["en"])
+
+    print(f"{len(pages)} pages sampled from {args.pdf_dir}\n")
+    print(f"{'preset':<28}{'avg dpi':>8}{'render ms/pg':>14}{'mem KB/pg':>11}{'ocr ms/pg':>11}{'chars/pg':>10}")
+    for name, settings in PRESETS.items():
+        r = bench_preset(pages, settings, reader)
+        ocr_ms = f"{r['ocr_ms']:.0f}" if r["ocr_ms"] is not None else "-"
+        chars = f"{r['chars']:.0f}" if r["chars"] is not None else "-"
+        print(f"{name:<28}{r['dpi']:>8.0f}{r['render_ms']:>14.1f}{r['mem_kb']:>11.0f}{ocr_ms:>11}{chars:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Latency and throughput of case searches with and without query batching.
+
+    python -m benchmarks.query_batching [--clients 1 8 32] [--requests 400] [--max-batch 32] [--max-wait-ms 2]
+                                        [--backend torch|onnx|onnx-int8]
+
+Loads the embedding model and the stored index the way rag.py does, then
+sends requests from N client threads, first one encode + search per request,
+then through the QueryBatcher. Queries are random snippets of the indexed
+cases, and the embedding cache is cleared before every run.
+"""
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from index_store import MODEL_NAME, load_or_build
+from encoders import ENCODER_BACKEND, ENCODER_BACKENDS, load_encoder
+from query_cache import embedding_cache
+from query_batcher import QueryBatcher
+
+def make_queries(cases, n, words=8, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        tokens = str(cases[rng.randrange(len(cases))]).split()
+        start = rng.randrange(max(1, len(tokens) - words))
+        queries.append(" ".join(tokens[start:start + words]))
+    return queries
+
+def run(batcher, case_index, queries, clients):
+    embedding_cache.clear()
+    latencies = []
+
+    def client(chunk):
+        for query in chunk:
+            start = time.perf_counter()
+            batcher.search_cases(case_index, query, 3)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(client, [queries[i::clients] for i in range(clients)]))
+    wall = time.perf_counter() - start
+    ms = 1000 * np.asarray(latencies)
+    return np.percentile(ms, 50), np.percentile(ms, 99), len(queries) / wall
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2)
+    parser.add_argument("--backend", choices=ENCODER_BACKENDS, default=ENCODER_BACKEND)
+    args = parser.parse_args()
+
+    model = load_encoder(MODEL_NAME, args.backend)
+    case_index = load_or_build(model)
+    queries = make_queries(case_index.cases, args.requests)
+    direct = QueryBatcher(model, enabled=False)
+    batched = QueryBatcher(model, args.max_batch, args.max_wait_ms, enabled=True)
+    direct.search_cases(case_index, "warm up", 3)
+
+    print(f"\n{len(queries)} requests, top 3 cases, max batch {args.max_batch}, max wait {args.max_wait_ms} ms\n")
+    print(f"{'clients':>8}{'mode':>10}{'p50 ms':>10}{'p99 ms':>10}{'QPS':>10}{'avg batch':>11}")
+    for clients in args.clients:
+        for mode, batcher in (("direct", direct), ("batched", batched)):
+            batcher.batches = batcher.queries = 0
+            p50, p99, qps = run(batcher, case_index, queries, clients)
+            avg_batch = batcher.stats()["avg_batch"] if batcher.enabled else 1
+            print(f"{clients:>8}{mode:>10}{p50:>10.1f}{p99:>10.1f}{qps:>10.1f}{avg_batch:>11}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""docs/sec of the spaCy normalization used by the similarity graph.
+
+    python -m benchmarks.spacy_preprocessing [--text-file extracted_text1.txt] [--docs 200] [--processes 4]
+
+Compares the original loop (full pipeline, nlp(text) per case), nlp.pipe
+without the parser and NER, the same over --processes workers, and a second
+run that is served from a fresh token cache. Every variant must produce the
+tokens of the original loop.
+"""
+import os
+import time
+import argparse
+import tempfile
+import spacy
+from token_cache import SPACY_MODEL, NLP_BATCH_SIZE, TokenCache, doc_tokens, load_nlp, normalize
+
+def timed(label, run, n, reference=None):
+    start = time.perf_counter()
+    tokens = run()
+    elapsed = time.perf_counter() - start
+    same = "" if reference is None else ("  same tokens" if tokens == reference else "  TOKENS DIFFER")
+    print(f"{label:<34}{elapsed:>8.2f}s{n / elapsed:>10.1f} docs/sec{same}")
+    return tokens
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--text-file", default="extracted_text1.txt")
+    parser.add_argument("--docs", type=int, default=200, help="cases to process (repeated if the file has fewer)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=NLP_BATCH_SIZE)
+    parser.add_argument("--model", default=SPACY_MODEL)
+    args = parser.parse_args()
+
+    with open(args.text_file, encoding="utf-8") as f:
+        cases = [case for case in f.read().split("--- Extracted Text from:")[1:] if case.strip()]
+    cases = (cases * (args.docs // max(len(cases), 1) + 1))[:args.docs]
+    print(f"{len(cases)} cases, {sum(map(len, cases)) / max(len(cases), 1):.0f} characters on average\n")
+
+    full = spacy.load(args.model)
+    full.max_length = max(full.max_length, max(map(len, cases)) + 1)
+    reference = timed(f"nlp() per case, {'+'.join(full.pipe_names)}", lambda: [doc_tokens(full(c)) for c in cases],
+                      len(cases))
+    nlp = load_nlp(args.model)
+    timed(f"nlp.pipe, {'+'.join(nlp.pipe_names)}",
+          lambda: normalize(cases, nlp=nlp, n_process=1, batch_size=args.batch_size), len(cases), reference)
+    if args.processes > 1:
+        timed(f"nlp.pipe, {args.processes} processes",
+              lambda: normalize(cases, nlp=nlp, n_process=args.processes, batch_size=args.batch_size),
+              len(cases), reference)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TokenCache(os.path.join(tmp, "tokens.sqlite"))
+        timed("nlp.pipe, filling the token cache",
+              lambda: normalize(cases, cache, nlp=nlp, n_process=args.processes, batch_size=args.batch_size),
+              len(cases), reference)
+        timed("token cache hits", lambda: normalize(cases, cache, nlp=nlp), len(cases), reference)
+        cache.close()
+
+if __name__ == "__main__":
+    main()
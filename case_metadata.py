@@ -0,0 +1,272 @@
+import os
+import re
+import time
+import difflib
+import argparse
+import multiprocessing
+from collections import defaultdict
+import numpy as np
+from gazetteer import load_gazetteer
+from case_records import CaseRecordReader, CaseRecordWriter, case_id_of
+
+# Structured metadata columns for filtered search.
+#
+# extract_metadata() pulls court, judge, case/crime numbers, judgment date,
+# parties, lawyers and location out of a judgment's cause title with
+# precompiled regexes. Judges and courts are first looked up in the gazetteer
+# (gazetteer.py), which also maps OCR misreadings to one canonical name; the
+# regexes only fill in names the gazetteer doesn't know. The OCR pipeline
+# stores the result in each case record, where index builds pick it up.
+# `python case_metadata.py reprocess RECORDS` re-extracts the metadata of
+# already OCR'd cases in bulk.
+# MetadataIndex turns those columns into an inverted index (field -> token ->
+# sorted case ids), so a filter resolves to a candidate id set before any
+# vector search instead of substring-scanning the top hits afterwards.
+#
+# Values are lists of strings per field, except "date" (ISO yyyy-mm-dd or
+# None). A filter value matches when all of its tokens occur in the field.
+
+TEXT_FIELDS = ("court", "judge", "case_number", "crime_number", "petitioner", "accused", "respondent", "lawyer",
+               "location")
+FIELDS = TEXT_FIELDS + ("date",)
+NUMBER_FIELDS = ("case_number", "crime_number")
+PARTY_FIELDS = ("petitioner", "accused", "respondent")  # searchable together as "parties"
+
+HEADER_CHARS = 5000  # The cause title and the "Dated this" line sit at the start of a judgment
+MAX_VALUES = 5
+
+MONTHS = ["JANUARY", "FEBRUARY", "MARCH", "APRIL", "MAY", "JUNE", "JULY", "AUGUST", "SEPTEMBER", "OCTOBER",
+          "NOVEMBER", "DECEMBER"]
+WEEKDAYS = r"(?:MON|TUES|WEDNES|T[HI]URS|FRI|SATUR|SUN)DA"  # OCR: THURSDAX, TIURSDAY
+
+JUDGE_RE = re.compile(r"JUSTICE\s+((?:[A-Za-z][A-Za-z.'\-]*\s*){1,5}?)(?=\s*(?:(?i:" + WEEKDAYS + r")|&|AND\b|[,;:]|$))")
+COURT_RE = re.compile(r"IN\s+THE\s+((?:HIGH\s+)?COURT\s+OF\s+[A-Za-z]+)", re.IGNORECASE)
+CASE_NUMBER_RE = re.compile(r"\b([A-Za-z][A-Za-z.()]{0,14}?)\s*No[.,:;]?\s*(\d{1,6})\s*(?:of|OF|Of|0f)\s*((?:19|20)\d{2})\b")
+CRIME_NUMBER_RE = re.compile(r"CRIME\s*NO[.:]?\s*(\d{1,6})\s*/\s*((?:19|20)\d{2})", re.IGNORECASE)
+DATED_RE = re.compile(r"Dated\s+this\s+the\s+(\d{1,2})\S*\s*day\s+of\s+([A-Za-z]+),?\s*((?:19|20)\d{2})",
+                      re.IGNORECASE)
+DAY_OF_RE = re.compile(r"\b(\d{1,2}|[IL1]ST)\w*\s+DAY\s+OF\s+([A-Za-z]+),?\s*((?:19|20)\d{2})", re.IGNORECASE)
+TEXT_DATE_RE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+([A-Za-z]{3,}),?\s+((?:19|20)\d{2})\b", re.IGNORECASE)
+NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})[-./](\d{1,2})[-./]((?:19|20)\d{2})\b")
+POLICE_STATION_RE = re.compile(r"\b([A-Za-z]{3,})\s+POLICE\s+STATION", re.IGNORECASE)
+COURT_SEAT_RE = re.compile(r"COURT\s+OF\s+[A-Za-z]+\s+AT\s+([A-Za-z]{3,})", re.IGNORECASE)
+# The "(?!EXHIBIT)" guards skip the exhibit lists in the appendix ("PETITIONER(S)' EXHIBITS: ANNEX A1")
+PETITIONER_RE = re.compile(r"PETITIONER(?:(?!EXHIBIT)[^:]){0,40}?:\s*([A-Z][A-Z .']{2,60}?)(?=\s*(?:[;,]|AGED|S/O|D/O|W/O|\d))")
+RESPONDENT_RE = re.compile(r"RESPONDENT(?:(?!EXHIBIT)[^:]){0,40}?:\s*(?:THE\s+)?([A-Z][A-Z .']{2,60}?)"
+                           r"(?=\s*(?:[;,]|REPRESENTED|THROUGH|REP\b|BY\b|AGED|\d))")
+ACCUSED_RE = re.compile(r"ACCUSED(?:(?!EXHIBIT)[^:]){0,30}?:\s*([A-Z][A-Z .']{2,60}?)(?=\s*(?:[;,]|AGED|S/O|D/O|W/O|\d))")
+LAWYER_RE = re.compile(r"\bBY\s+ADVS?[.,]?\s+(?:SRI\.?\s*|SMT\.?\s*)?([A-Z][A-Z. ]{2,40}?)(?=\s*(?:\(|RESPONDENT|[;,]|$))")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def _clean(value):
+    return " ".join(value.replace("\n", " ").split()).strip(" .,;:-").upper()
+
+def _month(name):
+    match = difflib.get_close_matches(name.upper(), MONTHS, n=1, cutoff=0.7)  # OCR: JAMUARY, FEBRUARV
+    return MONTHS.index(match[0]) + 1 if match else None
+
+def _iso(day, month, year):
+    try:
+        return str(np.datetime64(f"{int(year):04d}-{int(month):02d}-{int(day):02d}", "D"))
+    except ValueError:
+        return None
+
+def extract_date(text):
+    """Judgment date of a case as yyyy-mm-dd, or None."""
+    for pattern in (DATED_RE, DAY_OF_RE, TEXT_DATE_RE):
+        for day, month, year in pattern.findall(text):
+            day = 1 if day.upper() in ("IST", "LST", "1ST") else day
+            iso = _iso(day, _month(month) or 0, year)
+            if iso:
+                return iso
+    for day, month, year in NUMERIC_DATE_RE.findall(text):
+        iso = _iso(day, month, year)
+        if iso:
+            return iso
+    return None
+
+def _unique(values):
+    seen = []
+    for value in values:
+        value = _clean(value)
+        if value and value not in seen:
+            seen.append(value)
+    return seen[:MAX_VALUES]
+
+_default_gazetteer = None
+
+def default_gazetteer():
+    global _default_gazetteer
+    if _default_gazetteer is None:
+        _default_gazetteer = load_gazetteer() or False  # False: no gazetteer file, don't look again
+    return _default_gazetteer or None
+
+def extract_metadata(text, gazetteer=None):
+    """Metadata columns of one case from its text (gazetteer defaults to gazetteer.json)."""
+    header = text[:HEADER_CHARS]
+    gazetteer = gazetteer or default_gazetteer()
+    known = gazetteer.find(header) if gazetteer else {}
+    return {
+        "court": known.get("courts") or _unique(COURT_RE.findall(header)),
+        "judge": known.get("judges") or _unique(JUDGE_RE.findall(header)),
+        "case_number": _unique(f"{re.sub(r'[^A-Za-z]', '', kind)} {number}/{year}"
+                               for kind, number, year in CASE_NUMBER_RE.findall(header)
+                               if kind.upper() != "CRIME"),
+        "crime_number": _unique(f"{number}/{year}" for number, year in CRIME_NUMBER_RE.findall(header)),
+        "date": extract_date(header),
+        "petitioner": _unique(PETITIONER_RE.findall(header)),
+        "accused": _unique(ACCUSED_RE.findall(header)),
+        "respondent": _unique(RESPONDENT_RE.findall(header)),
+        "lawyer": _unique(LAWYER_RE.findall(header)),
+        "location": _unique(place for place in COURT_SEAT_RE.findall(header) + POLICE_STATION_RE.findall(header)
+                            if place.upper() not in ("THE", "OF", "AND")),
+    }
+
+def case_fields(metadata):
+    """The court_name ... respondent fields of a case record, from its metadata columns."""
+    def joined(field):
+        return "; ".join(metadata.get(field) or ()) or None
+    return {
+        "court_name": (metadata.get("court") or [None])[0],
+        "judge_name": joined("judge"),
+        "case_number": (metadata.get("case_number") or [None])[0],
+        "date": metadata.get("date"),
+        "petitioner": joined("petitioner"),
+        "accused": joined("accused"),
+        "respondent": joined("respondent"),
+    }
+
+def metadata_for_cases(cases, records_file=None):
+    """Metadata columns per case text: from the OCR records when they have them, else extracted."""
+    reader = CaseRecordReader(records_file) if records_file and os.path.exists(records_file) else None
+    metadata = []
+    for case in cases:
+        record = reader.get(case_id_of(case)) if reader is not None else None
+        if record is not None and record.get("metadata"):
+            metadata.append(record["metadata"])
+        else:
+            metadata.append(extract_metadata(case))
+    return metadata
+
+def tokenize(value, field=None):
+    """Normalized tokens of a metadata value or filter; "Crl.M.C" and "CRLMC" are one token in numbers."""
+    value = str(value).lower()
+    if field in NUMBER_FIELDS:
+        value = re.sub(r"[.,]", "", value)
+    return _TOKEN.findall(value)
+
+def parse_timeframe(value):
+    """(first, last) day of a year, "2014-2016" range, month or date, as datetime64; None if unrecognized."""
+    value = value.strip()
+    years = re.fullmatch(r"((?:19|20)\d{2})(?:\s*(?:-|to|–)\s*((?:19|20)\d{2}))?", value)
+    if years:
+        first, last = years.group(1), years.group(2) or years.group(1)
+        return np.datetime64(f"{first}-01-01"), np.datetime64(f"{last}-12-31")
+    month = re.fullmatch(r"((?:19|20)\d{2})-(\d{1,2})", value)
+    if month:
+        start = np.datetime64(f"{month.group(1)}-{int(month.group(2)):02d}", "M")
+        return start.astype("datetime64[D]"), (start + 1).astype("datetime64[D]") - 1
+    iso = re.fullmatch(r"((?:19|20)\d{2})-(\d{1,2})-(\d{1,2})", value)
+    day = _iso(iso.group(3), iso.group(2), iso.group(1)) if iso else extract_date(value)
+    if day:
+        return np.datetime64(day), np.datetime64(day)
+    return None
+
+class MetadataIndex:
+    """Inverted index over the metadata columns of every case, by case id."""
+
+    def __init__(self, records):
+        self.records = records
+        postings = {field: defaultdict(list) for field in TEXT_FIELDS + ("parties",)}
+        for case_id, record in enumerate(records):
+            for field in TEXT_FIELDS:
+                tokens = {t for value in record.get(field) or () for t in tokenize(value, field)}
+                for token in tokens:
+                    postings[field][token].append(case_id)
+                if field in PARTY_FIELDS:
+                    for token in tokens:
+                        if not postings["parties"][token] or postings["parties"][token][-1] != case_id:
+                            postings["parties"][token].append(case_id)
+        self.postings = {field: {token: np.asarray(ids, dtype=np.int64) for token, ids in tokens.items()}
+                         for field, tokens in postings.items()}
+        self.dates = np.array([record.get("date") or "NaT" for record in records], dtype="datetime64[D]")
+
+    def __len__(self):
+        return len(self.records)
+
+    def lookup(self, field, value):
+        """Sorted ids of the cases whose field contains every token of value."""
+        postings = self.postings[field]
+        ids = None
+        for token in tokenize(value, field):
+            found = postings.get(token)
+            if found is None:
+                return np.empty(0, dtype=np.int64)
+            ids = found if ids is None else np.intersect1d(ids, found, assume_unique=True)
+        return np.arange(len(self.records), dtype=np.int64) if ids is None else ids
+
+    def between(self, first, last):
+        """Sorted ids of the cases dated within [first, last]."""
+        return np.flatnonzero((self.dates >= first) & (self.dates <= last)).astype(np.int64)
+
+    def filter(self, filters):
+        """Ids matching all non-empty filters ({field: value}, "date" takes a timeframe).
+
+        Returns None when no filter is set. Raises ValueError for an
+        unrecognized timeframe or field.
+        """
+        ids = None
+        for field, value in filters.items():
+            if not value or not str(value).strip():
+                continue
+            if field == "date":
+                timeframe = parse_timeframe(str(value))
+                if timeframe is None:
+                    raise ValueError(f"Unrecognized date or timeframe {value!r}")
+                found = self.between(*timeframe)
+            elif field in self.postings:
+                found = self.lookup(field, value)
+            else:
+                raise ValueError(f"Unknown metadata field {field!r}")
+            ids = found if ids is None else np.intersect1d(ids, found, assume_unique=True)
+        return ids
+
+def _extract_header(header):
+    return extract_metadata(header)
+
+def reprocess_records(records_file, workers=os.cpu_count() or 1, chunksize=64):
+    """Re-extracts the metadata of every case in a records file, in place, across processes."""
+    reader = CaseRecordReader(records_file)
+    tmp = records_file + ".tmp"
+    start = time.perf_counter()
+    filled = defaultdict(int)
+    count = 0
+    # Workers only get the headers, the full records are streamed a second time here
+    headers = (record["text"][:HEADER_CHARS] for record in reader)
+    records = iter(reader)
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers) as pool, CaseRecordWriter(tmp, compress=reader.compressed) as writer:
+        for metadata in pool.imap(_extract_header, headers, chunksize):
+            record = next(records)
+            record.update(case_fields(metadata))
+            record["metadata"] = metadata
+            writer.write(record)
+            count += 1
+            for field in FIELDS:
+                filled[field] += bool(metadata.get(field))
+    os.replace(tmp, records_file)
+    os.replace(tmp + ".idx", records_file + ".idx")
+    elapsed = time.perf_counter() - start
+    print(f"Reprocessed {count} cases in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} docs/sec, "
+          f"{workers} workers)")
+    for field in FIELDS:
+        print(f"  {field:<13}{filled[field]:>7} ({100 * filled[field] / count if count else 0:.0f}%)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-extract case metadata from OCR'd case records.")
+    parser.add_argument("command", choices=["reprocess"])
+    parser.add_argument("records_file", help="all_extracted_cases.jsonl(.gz) written by ocr_extraction.py")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    reprocess_records(args.records_file, args.workers)
@@ -0,0 +1,124 @@
+import os
+import gzip
+import json
+
+# Streaming storage for the extracted case records.
+#
+# Each case is appended to a JSONL file as soon as it is finished, so memory
+# stays flat and a crash keeps everything written so far. With compression
+# every line is its own gzip member: the file is still a valid .jsonl.gz for
+# zcat/gzip.open, and each record can be decompressed on its own.
+#
+# A small side index (<path>.idx, one JSON array [case_id, offset, length]
+# per line) lets a single case be read with one seek.
+
+def case_id_of(case_text):
+    """Case ID of a case from extracted_text.txt: its "<filename> ---" header without the extension."""
+    return os.path.splitext(case_text.split(" ---", 1)[0].strip())[0]
+
+class CaseRecordWriter:
+    """Appends case records to a JSONL(.gz) file and its offset index."""
+
+    def __init__(self, path, compress=None, fsync_every=100, append=False):
+        self.path = path
+        self.compress = path.endswith(".gz") if compress is None else compress
+        self.fsync_every = fsync_every
+        self.data = open(path, "ab" if append else "wb")
+        self.index = open(path + ".idx", "a" if append else "w", encoding="utf-8")
+        self.count = 0
+
+    def write(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        if self.compress:
+            line = gzip.compress(line)
+        offset = self.data.tell()
+        self.data.write(line)
+        self.index.write(json.dumps([record["case_id"], offset, len(line)], ensure_ascii=False) + "\n")
+        self.count += 1
+        if self.fsync_every and self.count % self.fsync_every == 0:
+            self.sync()
+
+    def sync(self):
+        """Flushes data before index and fsyncs both, so the index never points past the data."""
+        for f in (self.data, self.index):
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        self.sync()
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CaseRecordReader:
+    """Random access (one seek per case) and streaming reads over a CaseRecordWriter file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.compressed = path.endswith(".gz")
+        self._offsets = None
+
+    def _load_index(self):
+        if self._offsets is not None:
+            return self._offsets
+        size = os.path.getsize(self.path)
+        offsets = {}
+        if os.path.exists(self.path + ".idx"):
+            with open(self.path + ".idx", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        case_id, offset, length = json.loads(line)
+                    except ValueError:  # torn last line after a crash
+                        continue
+                    if offset + length <= size:
+                        offsets[case_id] = (offset, length)  # a later write of the same case wins
+        elif not self.compressed:
+            # No side index: rebuild it from the line offsets
+            offset = 0
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        offsets[json.loads(line)["case_id"]] = (offset, len(line))
+                    offset += len(line)
+        else:
+            raise FileNotFoundError(f"Missing offset index {self.path}.idx")
+        self._offsets = offsets
+        return offsets
+
+    def __len__(self):
+        return len(self._load_index())
+
+    def __contains__(self, case_id):
+        return case_id in self._load_index()
+
+    def ids(self):
+        return list(self._load_index())
+
+    def get(self, case_id):
+        """Returns one case record, or None if the case isn't in the file."""
+        entry = self._load_index().get(case_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            raw = f.read(length)
+        if self.compressed:
+            raw = gzip.decompress(raw)
+        return json.loads(raw)
+
+    def __iter__(self):
+        """Streams every complete record in file order."""
+        opener = gzip.open if self.compressed else open
+        with opener(self.path, "rb") as f:
+            try:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        yield json.loads(line)
+            except EOFError:  # truncated final gzip member after a crash
+                return
@@ -0,0 +1,84 @@
+import os
+import zlib
+import numpy as np
+
+# Compact storage of the case texts.
+#
+# The texts used to be saved with np.save as a fixed-width unicode array, so
+# every case took 4 bytes per character of the longest judgment. Here each
+# case is stored as its UTF-8 bytes, optionally zlib-compressed on its own,
+# back to back in cases.bin; case_offsets.npy holds the n + 1 byte offsets.
+# Both are memory mapped, so opening a store reads nothing, a case is one
+# slice plus a decode, and the page cache rather than the process holds the
+# corpus.
+
+BLOB_FILE = "cases.bin"
+OFFSETS_FILE = "case_offsets.npy"
+COMPRESSIONS = (None, "zlib")
+CASE_COMPRESSION = os.environ.get("CASE_COMPRESSION") or None  # "zlib" to compress every case
+
+class CaseStore:
+    """Read-only sequence of case texts backed by the memory mapped store in a directory."""
+
+    def __init__(self, directory, compression=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown case compression {compression!r}, expected one of {COMPRESSIONS}")
+        self.directory = directory
+        self.compression = compression
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        path = os.path.join(directory, BLOB_FILE)
+        # np.memmap can't map an empty file
+        self.blob = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.empty(0, np.uint8)
+        self._last = (None, None)  # passages of one case are read in a row
+
+    @classmethod
+    def exists(cls, directory):
+        return all(os.path.exists(os.path.join(directory, f)) for f in (BLOB_FILE, OFFSETS_FILE))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"case {i} out of range")
+        last = self._last  # one read, request threads and the batcher share the store
+        if last[0] == i:
+            return last[1]
+        data = self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+        if self.compression == "zlib":
+            data = zlib.decompress(data)
+        text = data.decode("utf-8")
+        self._last = (i, text)
+        return text
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self):
+        return int(self.blob.nbytes + self.offsets.nbytes)
+
+def write_case_store(directory, cases, compression=CASE_COMPRESSION):
+    """Writes the texts to directory as a case store, through temporary files renamed into place."""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown case compression {compression!r}, expected one of {COMPRESSIONS}")
+    blob_path = os.path.join(directory, BLOB_FILE)
+    offsets = np.zeros(len(cases) + 1, dtype=np.int64)
+    with open(blob_path + ".tmp", "wb") as f:
+        for i, case in enumerate(cases):
+            data = str(case).encode("utf-8")
+            if compression == "zlib":
+                data = zlib.compress(data)
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    offsets_path = os.path.join(directory, OFFSETS_FILE)
+    with open(offsets_path + ".tmp", "wb") as f:
+        np.save(f, offsets)
+    os.replace(blob_path + ".tmp", blob_path)
+    os.replace(offsets_path + ".tmp", offsets_path)
@@ -0,0 +1,47 @@
+import os
+import re
+import numpy as np
+
+# Overlapping passages for embedding.
+#
+# all-MiniLM-L6-v2 truncates its input at 256 word pieces, so a judgment
+# embedded whole was only ever indexed by its first page or so. Cases are
+# split into windows of CHUNK_WORDS words that overlap by CHUNK_OVERLAP words,
+# so a sentence cut at one window edge is whole in the next. Legal English
+# runs ~1.3 word pieces per word, so a window stays inside the model limit.
+#
+# Chunks are kept as two arrays parallel to the FAISS ids: chunk_case (chunk
+# id -> case index) and chunk_spans (character start/end in the case text).
+# Passages are sliced from the case texts instead of being stored twice.
+
+CHUNK_WORDS = int(os.environ.get("CHUNK_WORDS", "150"))
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "30"))
+
+_WORD = re.compile(r"\S+")
+
+def chunk_spans(text, words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Character (start, end) spans of the overlapping word windows of text."""
+    bounds = [m.span() for m in _WORD.finditer(text)]
+    step = max(1, words - overlap)
+    spans = []
+    for start in range(0, len(bounds), step):
+        end = min(start + words, len(bounds))
+        spans.append((bounds[start][0], bounds[end - 1][1]))
+        if end == len(bounds):
+            break
+    return spans
+
+def chunk_cases(cases, words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Splits every case into passages. Returns (texts, chunk_case, chunk_spans)."""
+    texts, owners, spans = [], [], []
+    for i, case in enumerate(cases):
+        for start, end in chunk_spans(case, words, overlap):
+            texts.append(case[start:end])
+            owners.append(i)
+            spans.append((start, end))
+    return texts, np.asarray(owners, dtype=np.int32), np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+
+def whole_case_chunks(cases):
+    """One chunk per case, the layout of indexes built before chunking."""
+    spans = np.asarray([(0, len(case)) for case in cases], dtype=np.int64).reshape(-1, 2)
+    return np.arange(len(cases), dtype=np.int32), spans
@@ -1,57 +1,154 @@
-import spacy
-import networkx as nx
-import matplotlib.pyplot as plt
-
-with open('extracted_text1.txt', 'r', encoding='utf-8') as file:
-    text = file.read()
-
-cases = text.split('--- Extracted Text from:')[1:]
-
-
-
-nlp = spacy.load('en_core_web_sm')
-
-def preprocess(text):
-    doc = nlp(text)
-    tokens = [token.lemma_.lower() for token in doc if not token.is_stop and not token.is_punct and token.is_alpha]
-    return ' '.join(tokens)
-
-preprocessed_cases = [preprocess(case) for case in cases]
-
-from sklearn.feature_extraction.text import TfidfVectorizer
-
-vectorizer = TfidfVectorizer()
-tfidf_matrix = vectorizer.fit_transform(preprocessed_cases)
-
-from sklearn.metrics.pairwise import cosine_similarity
-
-similarity_matrix = cosine_similarity(tfidf_matrix)
-
-
-
-G = nx.Graph()
-
-for i, case in enumerate(cases):
-    G.add_node(i, text=case)
-
-threshold = 0.5  # Adjust this threshold as needed
-
-for i in range(len(cases)):
-    for j in range(i + 1, len(cases)):
-        if similarity_matrix[i, j] > threshold:
-            G.add_edge(i, j, weight=similarity_matrix[i, j])
-
-
-
-
-pos = nx.spring_layout(G)
-nx.draw(G, pos, with_labels=True, node_size=50, font_size=8, edge_color='gray', width=0.5)
-labels = nx.get_edge_attributes(G, 'weight')
-nx.draw_networkx_edge_labels(G, pos, edge_labels=labels)
-plt.show()
-
-nx.write_gexf(G, 'case_similarity_graph.gexf')
-
-communities = nx.algorithms.community.greedy_modularity_communities(G)
-for i, community in enumerate(communities):
-    print(f"Community {i}: {community}")
\ No newline at end of file
+import os
+import argparse
+import numpy as np
+import scipy.sparse as sp
+import networkx as nx
+from token_cache import NLP_PROCESSES, TOKEN_CACHE_FILE, TokenCache, normalize
+
+# Case similarity graph.
+#
+# Cases are linked to their most similar cases (cosine similarity above
+# THRESHOLD), then grouped into communities. The first version built the
+# dense n x n similarity matrix and compared every pair in a Python loop,
+# so time and memory grew with n^2 and it failed beyond a few thousand
+# judgments. Now each case only keeps its top NEIGHBOURS:
+#
+#   tfidf       TF-IDF rows are L2-normalized, so a block of rows times the
+#               sparse transpose gives their cosine similarities; only one
+#               BLOCK_ROWS x n block is in memory at a time
+#   embeddings  mean of each case's passage embeddings from the stored index
+#               (python index_store.py build), searched with a FAISS
+#               inner-product index; cases deleted by an index update are
+#               left out, though their passages stay until compaction
+#
+# Thresholding and the i < j dedup are vectorized and the edges are added
+# in bulk. The graph is written as case_similarity_graph.gexf as before,
+# plus a sparse adjacency matrix (scipy .npz) for reuse without networkx.
+# Communities are found with Louvain, which is near-linear in the number of
+# edges; greedy modularity is quadratic.
+#
+# The TF-IDF input is each case's lemmas without stop words, normalized by
+# token_cache.py (batched spaCy without parser/NER, cached on disk).
+
+TEXT_FILE = 'extracted_text1.txt'
+GEXF_FILE = 'case_similarity_graph.gexf'
+NPZ_FILE = 'case_similarity_graph.npz'
+THRESHOLD = 0.5  # Adjust this threshold as needed
+NEIGHBOURS = 50  # Edges kept per case, at most
+BLOCK_ROWS = 1024
+DRAW_MAX_NODES = 500  # Spring layouts of larger graphs are slow and unreadable
+
+def tfidf_vectors(cases, n_process=NLP_PROCESSES, cache_file=TOKEN_CACHE_FILE):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    cache = TokenCache(cache_file) if cache_file else None
+    try:
+        preprocessed_cases = [' '.join(tokens) for tokens in normalize(cases, cache, n_process=n_process)]
+    finally:
+        if cache is not None:
+            cache.close()
+    return TfidfVectorizer().fit_transform(preprocessed_cases)  # rows are L2-normalized
+
+def embedding_vectors(index_dir):
+    """Live cases and unit mean passage embeddings of the stored index."""
+    from index_store import load_index
+    case_index, problem = load_index(index_dir, text_file=None)
+    if case_index is None or case_index.embeddings is None:
+        raise SystemExit(f"No usable index in {index_dir}: {problem or 'no stored embeddings'}")
+    deleted = np.asarray(case_index.deleted, dtype=bool)  # tombstones stay in the index until it is compacted
+    chunk_case = np.asarray(case_index.chunk_case)
+    live_chunks = ~deleted[chunk_case]
+    vectors = np.zeros((len(case_index.cases), case_index.embeddings.shape[1]), dtype=np.float32)
+    np.add.at(vectors, chunk_case[live_chunks], np.asarray(case_index.embeddings, dtype=np.float32)[live_chunks])
+    live = np.flatnonzero(~deleted)
+    vectors = vectors[np.asarray(case_index.canonical)[live]]  # near-duplicates share their canonical case's passages
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return [case_index.cases[i] for i in live], vectors
+
+def sparse_neighbours(matrix, k, threshold, block_rows=BLOCK_ROWS):
+    """Up to k most similar other rows per row above threshold, as (rows, cols, similarities)."""
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    rows, cols, sims = [], [], []
+    transposed = matrix.T.tocsr()
+    for start in range(0, n, block_rows):
+        block = (matrix[start:start + block_rows] @ transposed).toarray()
+        ids = np.arange(start, start + len(block))
+        block[np.arange(len(block)), ids] = -np.inf  # no self loops
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(block, top, 1)
+        keep = top_sims > threshold
+        rows.append(np.broadcast_to(ids[:, None], top.shape)[keep])
+        cols.append(top[keep])
+        sims.append(top_sims[keep])
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+
+def dense_neighbours(vectors, k, threshold):
+    """sparse_neighbours for dense unit vectors, with a FAISS inner-product search."""
+    import faiss
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    sims, top = index.search(vectors, min(k, len(vectors) - 1) + 1)  # the case itself comes back too
+    ids = np.broadcast_to(np.arange(len(vectors))[:, None], top.shape)
+    keep = (top >= 0) & (top != ids) & (sims > threshold)
+    return ids[keep], top[keep], sims[keep]
+
+def similarity_matrix(n, rows, cols, sims):
+    """Upper triangular sparse adjacency (i < j); a pair found from both ends is kept once."""
+    i, j = np.minimum(rows, cols), np.maximum(rows, cols)
+    _, first = np.unique(i.astype(np.int64) * n + j, return_index=True)
+    return sp.csr_matrix((sims[first].astype(np.float32), (i[first], j[first])), shape=(n, n))
+
+def build_graph(cases, upper):
+    G = nx.Graph()
+    G.add_nodes_from((i, {'text': case}) for i, case in enumerate(cases))
+    coo = upper.tocoo()
+    G.add_weighted_edges_from(zip(coo.row.tolist(), coo.col.tolist(), coo.data.astype(float).tolist()))
+    return G
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the case similarity graph and its communities.")
+    parser.add_argument('--text-file', default=TEXT_FILE)
+    parser.add_argument('--vectors', choices=['tfidf', 'embeddings'], default='tfidf')
+    parser.add_argument('--index-dir', default=os.environ.get('INDEX_DIR', 'index'), help="for --vectors embeddings")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--neighbours', type=int, default=NEIGHBOURS)
+    parser.add_argument('--processes', type=int, default=NLP_PROCESSES, help="spaCy worker processes")
+    parser.add_argument('--token-cache', default=TOKEN_CACHE_FILE, help="'' to run spaCy on every case")
+    parser.add_argument('--draw', action='store_true', help=f"plot graphs of up to {DRAW_MAX_NODES} cases")
+    args = parser.parse_args()
+
+    if args.vectors == 'embeddings':
+        cases, vectors = embedding_vectors(args.index_dir)
+    else:
+        with open(args.text_file, 'r', encoding='utf-8') as file:
+            text = file.read()
+        cases = text.split('--- Extracted Text from:')[1:]
+        vectors = tfidf_vectors(cases, args.processes, args.token_cache)
+    if len(cases) < 2:
+        raise SystemExit("Need at least two cases")
+
+    if args.vectors == 'embeddings':
+        rows, cols, sims = dense_neighbours(vectors, args.neighbours, args.threshold)
+    else:
+        rows, cols, sims = sparse_neighbours(vectors, args.neighbours, args.threshold)
+    upper = similarity_matrix(len(cases), rows, cols, sims)
+    sp.save_npz(NPZ_FILE, upper)
+
+    G = build_graph(cases, upper)
+    print(f"{G.number_of_nodes()} cases, {G.number_of_edges()} edges above {args.threshold}")
+    nx.write_gexf(G, GEXF_FILE)
+
+    if args.draw and len(cases) <= DRAW_MAX_NODES:
+        import matplotlib.pyplot as plt
+        pos = nx.spring_layout(G)
+        nx.draw(G, pos, with_labels=True, node_size=50, font_size=8, edge_color='gray', width=0.5)
+        labels = {edge: f"{weight:.2f}" for edge, weight in nx.get_edge_attributes(G, 'weight').items()}
+        nx.draw_networkx_edge_labels(G, pos, edge_labels=labels)
+        plt.show()
+
+    communities = nx.algorithms.community.louvain_communities(G, weight='weight', seed=0)
+    for i, community in enumerate(sorted(communities, key=len, reverse=True)):
+        print(f"Community {i}: {sorted(community)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import os
+import re
+import json
+from collections import deque
+
+# Known-name matching for metadata extraction.
+#
+# gazetteer.json lists canonical judge and court names with their aliases
+# (initials spelled out or not, frequent OCR misreadings). All aliases are
+# compiled into one Aho-Corasick automaton, so a cause title is scanned once
+# regardless of how many names are known. Text and aliases are normalized to
+# upper-case words separated by single spaces, with a space on both ends,
+# which makes every match a whole-word match ("P.UBAID" == "P UBAID").
+
+GAZETTEER_FILE = os.environ.get("GAZETTEER_FILE",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.json"))
+
+_WORD = re.compile(r"[A-Z0-9]+")
+
+def normalize(text):
+    return " " + " ".join(_WORD.findall(text.upper())) + " "
+
+class Gazetteer:
+    """Aho-Corasick automaton over the aliases of {category: {canonical name: [aliases]}}."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for category, names in entries.items():
+            for canonical, aliases in names.items():
+                for alias in {canonical, *aliases}:
+                    self._add(normalize(alias), (category, canonical))
+        self._link()
+
+    def _add(self, pattern, value):
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append(value)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        """Canonical names found in text, {category: [names in order of first occurrence]}."""
+        found = {category: [] for category in self.entries}
+        state = 0
+        for char in normalize(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for category, canonical in self.output[state]:
+                if canonical not in found[category]:
+                    found[category].append(canonical)
+        return found
+
+def load_gazetteer(path=GAZETTEER_FILE):
+    """The Gazetteer in path, or None if there is no such file."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return Gazetteer(json.load(f))
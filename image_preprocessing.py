@@ -0,0 +1,127 @@
+import fitz  # PyMuPDF for rendering pages
+import numpy as np
+import cv2
+
+# Rasterization and image cleanup in front of EasyOCR.
+#
+# Pages are rendered straight to grayscale at a DPI picked from the size of
+# their glyphs, and the pixmap buffer is handed to the recognizer without a
+# copy. Deskew and binarization are optional extra passes for poor scans.
+
+DEFAULT_SETTINGS = {
+    "dpi": "auto",           # Fixed DPI, or "auto" to choose one per page from glyph size
+    "min_dpi": 100,
+    "max_dpi": 300,
+    "target_glyph_px": 32,   # Font size (em height) in pixels that EasyOCR reads best
+    "grayscale": True,       # False renders RGB and converts to BGR like the original pipeline
+    "deskew": False,
+    "binarize": None,        # None, "otsu" or "adaptive"
+}
+
+PROBE_DPI = 36  # Low resolution render used to measure glyphs on scanned pages
+MAX_DESKEW_ANGLE = 15.0
+
+def make_settings(**overrides):
+    """Returns DEFAULT_SETTINGS with the given keys replaced (None values are ignored)."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    return settings
+
+def settings_key(settings):
+    """Stable string form of the settings, used to key cached OCR output."""
+    return ",".join(f"{k}={settings[k]}" for k in sorted(settings))
+
+class PageImage:
+    """A rendered page or region.
+
+    `image` is a NumPy view of `pixmap`'s sample buffer (or a processed copy
+    of it), the pixmap is kept here so the view stays valid.
+    """
+
+    __slots__ = ("image", "pixmap", "dpi")
+
+    def __init__(self, image, pixmap, dpi):
+        self.image = image
+        self.pixmap = pixmap
+        self.dpi = dpi
+
+def pixmap_to_array(pixmap):
+    """Zero-copy NumPy view of a pixmap's samples (h x w or h x w x n)."""
+    samples = np.frombuffer(pixmap.samples_mv, dtype=np.uint8).reshape(pixmap.h, pixmap.stride)
+    samples = samples[:, :pixmap.w * pixmap.n]  # drop row padding, still a view
+    if pixmap.n == 1:
+        return samples
+    return samples.reshape(pixmap.h, pixmap.w, pixmap.n)
+
+def text_layer_font_size(page):
+    """Median font size (points) of the page's text layer, None if it has none."""
+    sizes = [span["size"]
+             for block in page.get_text("dict")["blocks"] if block.get("type") == 0
+             for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+    return float(np.median(sizes)) if sizes else None
+
+def scanned_font_size(page, clip=None):
+    """Estimates the font size (points) of a scanned page from a low resolution render."""
+    pixmap = page.get_pixmap(dpi=PROBE_DPI, colorspace=fitz.csGRAY, clip=clip, alpha=False)
+    gray = pixmap_to_array(pixmap)
+    binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    # Glyph-sized blobs only: no specks, no rules or pictures
+    heights = heights[(heights >= 2) & (heights <= gray.shape[0] // 10)]
+    if len(heights) < 20:
+        return None
+    glyph_pt = float(np.median(heights)) * 72.0 / PROBE_DPI
+    return glyph_pt / 0.6  # median glyph is roughly x-height, about 0.6 em
+
+def choose_dpi(page, settings, clip=None):
+    """Picks the render DPI so the page's text comes out near target_glyph_px."""
+    if settings["dpi"] != "auto":
+        return int(settings["dpi"])
+    # Image regions are measured on their own pixels, the text layer around them says nothing
+    font_pt = (None if clip else text_layer_font_size(page)) or scanned_font_size(page, clip)
+    if not font_pt:
+        return settings["max_dpi"]
+    dpi = settings["target_glyph_px"] * 72.0 / font_pt
+    return int(min(max(dpi, settings["min_dpi"]), settings["max_dpi"]))
+
+def deskew(gray):
+    """Rotates a grayscale page so its text lines are horizontal."""
+    binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    coords = cv2.findNonZero(binary)
+    if coords is None:
+        return gray
+    angle = cv2.minAreaRect(coords)[-1]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    if abs(angle) < 0.3 or abs(angle) > MAX_DESKEW_ANGLE:
+        return gray
+    h, w = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+def binarize(gray, method):
+    if method == "otsu":
+        return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    if method == "adaptive":
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+    raise ValueError(f"Unknown binarization method: {method}")
+
+def render_page(page, settings=None, clip=None):
+    """Renders a page (or the clip rectangle of it) ready for OCR, returns a PageImage."""
+    settings = settings or DEFAULT_SETTINGS
+    dpi = choose_dpi(page, settings, clip)
+
+    if not settings["grayscale"]:
+        pixmap = page.get_pixmap(dpi=dpi, clip=clip, alpha=False)
+        return PageImage(cv2.cvtColor(pixmap_to_array(pixmap), cv2.COLOR_RGB2BGR), None, dpi)
+
+    pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, clip=clip, alpha=False)
+    image = pixmap_to_array(pixmap)
+    if settings["deskew"]:
+        image = deskew(image)
+    if settings["binarize"]:
+        image = binarize(image, settings["binarize"])
+    return PageImage(image, pixmap, dpi)
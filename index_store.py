@@ -0,0 +1,1008 @@
+import os
+import re
+import json
+import time
+import shutil
+import threading
+import hashlib
+import uuid
+import logging
+import argparse
+import faiss
+import numpy as np
+from chunking import CHUNK_WORDS, CHUNK_OVERLAP, chunk_cases, whole_case_chunks
+from case_metadata import MetadataIndex, extract_metadata, metadata_for_cases
+from lexical_index import LexicalIndex
+from case_store import CASE_COMPRESSION, CaseStore, write_case_store
+from near_duplicates import DEDUP_THRESHOLD, DuplicateFinder, signatures
+
+# Build-once / load-many lifecycle of the case index.
+#
+# `python index_store.py build` embeds the extracted text and writes the FAISS
+# index, the raw embeddings, the case texts (see case_store.py), the BM25
+# postings and a meta.json into a version directory of INDEX_DIR, then
+# publishes it by renaming INDEX_DIR/CURRENT. Servers then only load those
+# files (memory mapped) and check that the stored model name, vector dimension
+# and corpus version still match; a rebuild happens only when they don't.
+# Switching INDEX_TYPE retrains from the stored embeddings without re-encoding
+# the corpus.
+#
+# `python index_store.py update` (or a server finding a changed corpus) embeds
+# only new and changed cases and appends them. Removed cases are tombstoned
+# (deleted.npy) and filtered out of every search until a compaction rewrites
+# the index without them. Running servers pick up a newly published version
+# through LiveIndex without a restart.
+#
+# Vectors are per passage (see chunking.py), not per case. Searches fetch
+# CHUNK_FANOUT x top_k passages and aggregate them to cases, scored by their
+# best passage ("max") or by all their matching passages ("sum").
+#
+# Metadata filters (see case_metadata.py) are applied before the vector
+# search: the matching cases' passages are scored exactly from the stored
+# embeddings when there are few of them, otherwise the index is searched with
+# a faiss IDSelector restricted to them.
+#
+# The passages are also indexed for BM25 (see lexical_index.py); lexical
+# searches aggregate passages to cases the same way.
+#
+# Near-duplicate cases (see near_duplicates.py) are kept, with their texts
+# and metadata, but only their canonical case is chunked and embedded
+# (canonical.npy maps every case to its canonical case, minhash.npy holds
+# the signatures for later updates). A duplicate has no passages, so it
+# never takes a top-k slot, and filters that match it select its canonical
+# case instead.
+#
+# Index types: "flat" (exact, brute force), "ivf_flat" and "ivf_pq" (inverted
+# lists, PQ-compressed codes for the latter, tuned with nprobe) and "hnsw"
+# (graph, tuned with efSearch). "fp16", "sq8" and "pq" are brute force over
+# compressed vectors: 2 bytes, 1 byte or a few bits per dimension instead of
+# 4. The lossy types (sq8, pq, ivf_pq) fetch RERANK_FACTOR x more candidates
+# and re-rank them by exact distance to the float vectors in embeddings.npy,
+# which stay memory mapped, i.e. on disk and in the page cache rather than in
+# the process.
+#
+# faiss can only memory map the inverted lists of IVF indexes; every other
+# type is read into the heap of each process that loads it. A "flat" index
+# with stored embeddings is therefore not read at all: MappedFlatIndex scans
+# the memory mapped embeddings.npy instead, which server workers share.
+
+EXTRACTED_TEXT_FILE = os.environ.get(
+    "EXTRACTED_TEXT_FILE", "C:\\Users\\mehta\\Downloads\\dataset-innovatex-test-output\\extracted_text.txt")
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"  # Lightweight, fast, and free
+INDEX_DIR = os.environ.get("INDEX_DIR", "index")
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "fp16", "sq8", "pq")
+LOSSY_INDEX_TYPES = ("ivf_pq", "sq8", "pq")  # Searched with exact re-ranking of a shortlist
+INDEX_TYPE = os.environ.get("INDEX_TYPE", "flat")
+TRAIN_SAMPLE_SIZE = 100_000  # Vectors sampled to train IVF centroids / PQ codebooks
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+DEFAULT_NPROBE = int(os.environ.get("INDEX_NPROBE", "16"))
+DEFAULT_EF_SEARCH = int(os.environ.get("INDEX_EF_SEARCH", "64"))
+RERANK_FACTOR = int(os.environ.get("INDEX_RERANK", "4"))  # Shortlist size / k for lossy indexes, 1 turns it off
+CHUNK_FANOUT = 8
+EXACT_FILTER_MAX = 20_000  # Filtered searches over at most this many passages skip the ANN index
+FLAT_SCAN_ROWS = 65_536  # Vectors per block when MappedFlatIndex scans embeddings.npy
+AGGREGATIONS = ("max", "sum")
+
+INDEX_FILE = "case_embeddings.index"
+CASES_FILE = "cases.npy"  # case texts of indexes built before the case store, still read
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNK_CASE_FILE = "chunk_case.npy"
+CHUNK_SPANS_FILE = "chunk_spans.npy"
+METADATA_FILE = "metadata.json"
+
+# Case records written next to the extracted text by ocr_extraction.py, their
+# metadata columns are used instead of extracting them again
+RECORDS_FILES = ("all_extracted_cases.jsonl", "all_extracted_cases.jsonl.gz")
+META_FILE = "meta.json"
+DELETED_FILE = "deleted.npy"
+CANONICAL_FILE = "canonical.npy"
+SIGNATURES_FILE = "minhash.npy"
+CURRENT_FILE = "CURRENT"  # name of the published version directory
+COMPACT_RATIO = float(os.environ.get("INDEX_COMPACT_RATIO", "0.2"))  # Share of dead passages that triggers compaction
+INDEX_RELOAD_INTERVAL = float(os.environ.get("INDEX_RELOAD_INTERVAL", "5"))  # seconds between checks for a new version
+
+# Files written by the original rag.py/embeddings.py, imported once if present
+LEGACY_INDEX_FILE = "case_embeddings.index"
+LEGACY_CASES_FILE = "case_ids.npy"
+
+ENCODE_BATCH_SIZE = 64
+
+log = logging.getLogger(__name__)  # server-side messages, the commands below print
+
+class CaseIndex:
+    """A loaded index: the FAISS index over passages, the case texts and their build metadata."""
+
+    def __init__(self, index, cases, meta, embeddings=None, chunk_case=None, chunk_spans=None, metadata=None,
+                 lexical=None, deleted=None, canonical=None, signatures=None):
+        self.index = index
+        self.cases = cases
+        self.meta = meta
+        self.embeddings = embeddings  # float32 vectors, memory mapped
+        if chunk_case is None:
+            chunk_case, chunk_spans = whole_case_chunks(cases)
+        self.chunk_case = chunk_case  # chunk id -> case index
+        self.chunk_spans = chunk_spans  # chunk id -> (start, end) in the case text
+        self._metadata = metadata
+        self._lexical = lexical
+        self.deleted = np.zeros(len(cases), dtype=bool) if deleted is None else deleted  # tombstones
+        self.canonical = np.arange(len(cases)) if canonical is None else canonical  # case -> canonical case
+        self.signatures = signatures  # MinHash signature per case, None for indexes built before dedup
+        self._dead_chunks = None
+        self._chunk_starts = None
+
+    @property
+    def metadata(self):
+        """MetadataIndex of the cases, extracted from the texts if none was stored."""
+        if self._metadata is None:
+            self._metadata = MetadataIndex([extract_metadata(str(case)) for case in self.cases])
+        return self._metadata
+
+    @property
+    def lexical(self):
+        """LexicalIndex of the passages, built from the texts if none was stored."""
+        if self._lexical is None:
+            self._lexical = LexicalIndex.build([self.passage(i) for i in range(len(self.chunk_case))])
+        return self._lexical
+
+    @property
+    def version(self):
+        """Id of the published index, new for every build, update, re-index or compaction."""
+        return self.meta.get("index_id") or self.meta["corpus_version"]
+
+    def __len__(self):
+        return len(self.cases)
+
+    def case_chunks(self, case_ids):
+        """Chunk ids of the given cases (chunks of a case are contiguous)."""
+        if self._chunk_starts is None:
+            self._chunk_starts = np.searchsorted(self.chunk_case, np.arange(len(self.cases) + 1))
+        case_ids = np.asarray(case_ids, dtype=np.int64)
+        if len(case_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        starts, ends = self._chunk_starts[case_ids], self._chunk_starts[case_ids + 1]
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)]).astype(np.int64)
+
+    def live_cases(self, case_ids):
+        """case_ids without the deleted cases."""
+        case_ids = np.asarray(case_ids, dtype=np.int64)
+        return case_ids[~self.deleted[case_ids]]
+
+    def canonical_cases(self, case_ids):
+        """The distinct canonical cases of case_ids, ascending."""
+        return np.unique(np.asarray(self.canonical, dtype=np.int64)[np.asarray(case_ids, dtype=np.int64)])
+
+    @property
+    def duplicates(self):
+        """Number of live cases folded into another case."""
+        return int(((np.asarray(self.canonical) != np.arange(len(self.cases))) & ~self.deleted).sum())
+
+    @property
+    def dead_chunks(self):
+        """Chunk ids of the deleted cases, still in the index until it is compacted."""
+        if self._dead_chunks is None:
+            self._dead_chunks = self.case_chunks(np.flatnonzero(self.deleted))
+        return self._dead_chunks
+
+    def search(self, query_embeddings, top_k, nprobe=None, ef_search=None, chunk_ids=None, exclude=None):
+        """Returns (distances, indices) like faiss, for a (n, d) query matrix.
+
+        nprobe (IVF) and ef_search (HNSW) apply to this call only, the shared
+        index is not modified. chunk_ids restricts the search to those
+        passages, exclude leaves those passages out.
+        """
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        if chunk_ids is not None and len(chunk_ids) <= EXACT_FILTER_MAX and self.embeddings is not None:
+            return self._exact_search(queries, top_k, chunk_ids)
+        if isinstance(self.index, MappedFlatIndex):
+            allowed = None
+            if chunk_ids is not None:
+                allowed = np.zeros(self.index.ntotal, dtype=bool)
+                allowed[chunk_ids] = True
+            elif exclude is not None and len(exclude):
+                allowed = np.ones(self.index.ntotal, dtype=bool)
+                allowed[exclude] = False
+            return self.index.search(queries, top_k, allowed)
+        selector = None
+        if chunk_ids is not None:
+            chunk_ids = np.ascontiguousarray(chunk_ids, dtype=np.int64)
+            selector = faiss.IDSelectorBatch(len(chunk_ids), faiss.swig_ptr(chunk_ids))
+        elif exclude is not None and len(exclude):
+            exclude = np.ascontiguousarray(exclude, dtype=np.int64)
+            excluded = faiss.IDSelectorBatch(len(exclude), faiss.swig_ptr(exclude))
+            selector = faiss.IDSelectorNot(excluded)
+            selector.excluded = excluded  # IDSelectorNot does not own it
+        params = search_parameters(self.index, nprobe, ef_search, selector)
+        shortlist = top_k * self.rerank_factor
+        if params is None:
+            distances, ids = self.index.search(queries, shortlist)
+        else:
+            distances, ids = self.index.search(queries, shortlist, params=params)
+        if shortlist == top_k:
+            return distances, ids
+        return rerank(queries, ids, self.embeddings, top_k)
+
+    @property
+    def rerank_factor(self):
+        """Shortlist multiplier for this index, 1 if its distances are exact enough as they are."""
+        if self.embeddings is None or self.meta.get("index_type") not in LOSSY_INDEX_TYPES:
+            return 1
+        return max(1, RERANK_FACTOR)
+
+    def _exact_search(self, queries, top_k, chunk_ids):
+        """Brute-force squared L2 against the stored vectors of a few passages."""
+        ids = np.sort(chunk_ids)
+        vectors = np.asarray(self.embeddings[ids], dtype=np.float32)
+        distances = (queries ** 2).sum(1)[:, None] + (vectors ** 2).sum(1)[None, :] - 2 * queries @ vectors.T
+        k = min(top_k, len(ids))
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.take_along_axis(distances, top, 1).argsort(1), 1)
+        return np.take_along_axis(distances, top, 1), ids[top]
+
+    def search_cases(self, query_embeddings, top_k, aggregate="max", nprobe=None, ef_search=None, case_ids=None):
+        """Case-level search. Returns, per query, up to top_k hits best first.
+
+        A hit is {"case": case index, "score": similarity, "chunks": [(chunk
+        id, similarity), ...]} with the case's matching passages best first.
+        case_ids (e.g. from metadata.filter()) restricts the search to those cases.
+        """
+        if aggregate not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {aggregate!r}, expected one of {AGGREGATIONS}")
+        chunk_ids = None if case_ids is None else self.case_chunks(self.live_cases(self.canonical_cases(case_ids)))
+        total = self.index.ntotal - len(self.dead_chunks) if chunk_ids is None else len(chunk_ids)
+        if total == 0:
+            return [[] for _ in range(len(query_embeddings))]
+        k = min(top_k * CHUNK_FANOUT, total)
+        distances, chunk_ids = self.search(query_embeddings, k, nprobe, ef_search, chunk_ids, self.dead_chunks)
+        # Squared L2 between unit vectors -> cosine similarity
+        return [self._case_hits(row_ids, 1.0 - row_distances / 2, top_k, aggregate)
+                for row_distances, row_ids in zip(distances, chunk_ids)]
+
+    def search_lexical(self, queries, top_k, aggregate="max", case_ids=None):
+        """search_cases for query strings, with passages scored by BM25 instead of similarity."""
+        if aggregate not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {aggregate!r}, expected one of {AGGREGATIONS}")
+        allowed = None
+        if case_ids is not None:
+            allowed = np.zeros(len(self.chunk_case), dtype=bool)
+            allowed[self.case_chunks(self.live_cases(self.canonical_cases(case_ids)))] = True
+        elif len(self.dead_chunks):
+            allowed = np.ones(len(self.chunk_case), dtype=bool)
+            allowed[self.dead_chunks] = False
+        results = []
+        for query in queries:
+            scores, chunk_ids = self.lexical.search(query, top_k * CHUNK_FANOUT, allowed)
+            results.append(self._case_hits(chunk_ids, scores, top_k, aggregate))
+        return results
+
+    def keyword_cases(self, keyword):
+        """Cases whose passages contain every word of keyword, ascending."""
+        words = keyword.split()
+        if not words:
+            return np.empty(0, dtype=np.int64)
+        cases = None
+        for word in words:  # words may sit in different passages of the case
+            found = np.unique(np.asarray(self.chunk_case[self.lexical.matching(word)], dtype=np.int64))
+            cases = found if cases is None else np.intersect1d(cases, found, assume_unique=True)
+        return self.live_cases(cases)
+
+    def _case_hits(self, chunk_ids, scores, top_k, aggregate):
+        """Groups one query's scored passages (best first) by case into its top_k case hits."""
+        hits = {}
+        for chunk_id, score in zip(chunk_ids, scores):
+            if chunk_id < 0:  # fewer results than asked for
+                continue
+            hits.setdefault(int(self.chunk_case[chunk_id]), []).append((int(chunk_id), float(score)))
+        scored = [{"case": case, "chunks": chunks,
+                   "score": chunks[0][1] if aggregate == "max" else sum(max(s, 0.0) for _, s in chunks)}
+                  for case, chunks in hits.items()]
+        scored.sort(key=lambda hit: hit["score"], reverse=True)
+        return scored[:top_k]
+
+    def passage(self, chunk_id):
+        start, end = self.chunk_spans[chunk_id]
+        return str(self.cases[self.chunk_case[chunk_id]])[start:end]
+
+    def snippet(self, hit, max_passages=2):
+        """The case's name line followed by its best matching passages in text order."""
+        case = str(self.cases[hit["case"]])
+        spans = sorted(tuple(self.chunk_spans[c]) for c, _ in hit["chunks"][:max_passages])
+        merged = []
+        for start, end in spans:  # neighbouring chunks overlap, don't repeat text
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        passages = "\n...\n".join(case[start:end] for start, end in merged)
+        if merged[0][0] == 0:  # the first passage already starts with the name line
+            return passages
+        return f"{case.split(' ---', 1)[0].strip()} ---\n...\n{passages}"
+
+class MappedFlatIndex:
+    """Brute-force squared L2 search over memory mapped vectors, in place of a loaded IndexFlatL2.
+
+    Scans the vectors in blocks of FLAT_SCAN_ROWS, so a search touches the
+    page cache rather than a private copy of the index.
+    """
+
+    is_trained = True
+
+    def __init__(self, vectors, block_rows=FLAT_SCAN_ROWS):
+        self.vectors = vectors
+        self.d = vectors.shape[1]
+        self.ntotal = len(vectors)
+        self.block_rows = block_rows
+        self._norms = None
+
+    @property
+    def norms(self):
+        """Squared norm per vector, computed on first use (4 bytes per vector)."""
+        if self._norms is None:
+            self._norms = np.concatenate([
+                (np.asarray(self.vectors[start:start + self.block_rows], dtype=np.float32) ** 2).sum(1)
+                for start in range(0, self.ntotal, self.block_rows)] or [np.empty(0, np.float32)])
+        return self._norms
+
+    def search(self, queries, k, allowed=None):
+        """Returns (distances, ids) like faiss; allowed is an optional boolean mask over the vectors."""
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        query_norms = (queries ** 2).sum(1)[:, None]
+        for start in range(0, self.ntotal, self.block_rows):
+            block = np.asarray(self.vectors[start:start + self.block_rows], dtype=np.float32)
+            block_distances = query_norms + self.norms[start:start + len(block)][None, :] - 2 * queries @ block.T
+            if allowed is not None:
+                block_distances[:, ~allowed[start:start + len(block)]] = np.inf
+            # Merge the block into the running top k
+            candidates = np.concatenate([distances, block_distances], axis=1)
+            candidate_ids = np.concatenate(
+                [ids, np.broadcast_to(np.arange(start, start + len(block)), block_distances.shape)], axis=1)
+            top = np.argpartition(candidates, k - 1, axis=1)[:, :k]
+            distances = np.take_along_axis(candidates, top, 1)
+            ids = np.take_along_axis(candidate_ids, top, 1)
+        order = distances.argsort(1, kind="stable")
+        distances, ids = np.take_along_axis(distances, order, 1), np.take_along_axis(ids, order, 1)
+        ids[np.isinf(distances)] = -1  # fewer allowed vectors than k
+        return distances, ids
+
+def search_parameter(value, name):
+    """A request's nprobe / efSearch as a positive int, None if it wasn't given."""
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number < 1:
+        raise ValueError(f"{name} must be a positive integer, got {value!r}")
+    return number
+
+def search_parameters(index, nprobe=None, ef_search=None, selector=None):
+    """Per-call faiss SearchParameters, None for an unfiltered flat index."""
+    if faiss.try_extract_index_ivf(index) is not None:
+        params = faiss.SearchParametersIVF()
+        params.nprobe = int(nprobe or DEFAULT_NPROBE)
+    elif isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = int(ef_search or DEFAULT_EF_SEARCH)
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        params.sel = selector
+        params.selector = selector  # keeps the Python object alive with the params
+    return params
+
+def make_index(index_type, d, n):
+    """Creates an empty (untrained) index of the given type sized for n vectors."""
+    # ~4*sqrt(n) lists, but keep >= 39 training points per centroid as faiss wants
+    nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))
+    if index_type == "flat":
+        return faiss.IndexFlatL2(d)
+    if index_type == "ivf_flat":
+        return faiss.index_factory(d, f"IVF{nlist},Flat")
+    if index_type == "ivf_pq":
+        return faiss.index_factory(d, f"IVF{nlist},PQ{_pq_shape(d, n)}")
+    if index_type == "pq":
+        # One inverted list scanned whole: plain IndexPQ does not take id selectors
+        return faiss.index_factory(d, f"IVF1,PQ{_pq_shape(d, n)}")
+    if index_type == "sq8":
+        return faiss.index_factory(d, "SQ8")
+    if index_type == "fp16":
+        return faiss.index_factory(d, "SQfp16")
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return index
+    raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+def _pq_shape(d, n):
+    m = next(m for m in (48, 32, 24, 16, 12, 8, 4, 2, 1) if d % m == 0)  # d/m dims per sub-quantizer
+    nbits = int(min(8, max(1, np.log2(max(n, 2)) - 1)))  # 256 centroids need a few thousand vectors
+    return f"{m}x{nbits}"
+
+def rerank(queries, ids, vectors, top_k):
+    """Exact squared L2 re-ranking of candidate ids (-1 padded, per query) against vectors[ids]."""
+    distances = np.full((len(queries), top_k), np.inf, dtype=np.float32)
+    result = np.full((len(queries), top_k), -1, dtype=np.int64)
+    for i, (query, row) in enumerate(zip(queries, ids)):
+        row = np.unique(row[row >= 0])  # sorted, for sequential reads of the memory map
+        if not len(row):
+            continue
+        exact = ((np.asarray(vectors[row], dtype=np.float32) - query) ** 2).sum(1)
+        order = np.argsort(exact, kind="stable")[:top_k]
+        distances[i, :len(order)], result[i, :len(order)] = exact[order], row[order]
+    return distances, result
+
+def train_and_add(index, embeddings, sample_size=TRAIN_SAMPLE_SIZE, seed=0):
+    """Trains the index on a random sample of the vectors if needed, then adds them all."""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = embeddings
+        if len(embeddings) > sample_size:
+            sample = embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))]
+        index.train(sample)
+    index.add(embeddings)
+    return index
+
+def index_info(index, index_type):
+    info = {"index_type": index_type}
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        info["nlist"] = int(ivf.nlist)
+    code_size = getattr(ivf if ivf is not None else index, "code_size", None)
+    info["bytes_per_vector"] = int(code_size if code_size is not None else index.d * 4)
+    return info
+
+# Read and logically separate cases
+def load_cases(file_path):
+    cases = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    # Assuming cases are separated by "--- Extracted Text from:"
+    raw_cases = text.split("--- Extracted Text from:")[1:]
+    for case in raw_cases:
+        case = case.strip()
+        if case:
+            cases.append(case)
+    return cases
+
+def corpus_version(file_path):
+    """Content hash of the extracted text, identifies the corpus an index was built from."""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+def _replace_file(path, write):
+    """Writes through a temporary file and renames it into place."""
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+def _save_array(path, array):
+    # np.save appends .npy to names without it, so write through an open file
+    def write(p):
+        with open(p, "wb") as f:
+            np.save(f, array)
+    _replace_file(path, write)
+
+def current_dir(index_dir=INDEX_DIR):
+    """Directory holding the published version of the index in index_dir.
+
+    Indexes written before versioning keep their files in index_dir itself.
+    """
+    version = _read_current(index_dir)
+    return os.path.join(index_dir, version) if version else index_dir
+
+def _read_current(index_dir):
+    path = os.path.join(index_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read().strip() or None
+
+def _new_version_dir(index_dir):
+    os.makedirs(index_dir, exist_ok=True)
+    numbers = [int(name[1:]) for name in os.listdir(index_dir) if re.fullmatch(r"v\d+", name)]
+    path = os.path.join(index_dir, f"v{max(numbers, default=0) + 1:06d}")
+    os.makedirs(path)
+    return path
+
+def _publish(index_dir, version_dir):
+    """Points index_dir at a fully written version_dir and drops all but the previous version.
+
+    CURRENT is replaced with a rename, so readers see either the old or the
+    new version, never a mix. The previous version stays for servers that
+    have not reloaded yet.
+    """
+    previous = _read_current(index_dir)
+    def write(p):
+        with open(p, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(version_dir))
+    _replace_file(os.path.join(index_dir, CURRENT_FILE), write)
+    keep = {os.path.basename(version_dir), previous}
+    flat = previous is None and os.path.exists(os.path.join(index_dir, META_FILE))
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if re.fullmatch(r"v\d+", name) and name not in keep:
+            shutil.rmtree(path, ignore_errors=True)  # still mapped on Windows: removed next time
+        elif flat and os.path.isfile(path) and name != CURRENT_FILE:
+            try:  # files of the unversioned layout
+                os.remove(path)
+            except OSError:
+                pass
+
+def _link_files(source_dir, target_dir, exclude=()):
+    """Hard links (or copies) the files of one version into the next."""
+    for name in os.listdir(source_dir):
+        path = os.path.join(source_dir, name)
+        if name in exclude or name == CURRENT_FILE or name.endswith(".tmp") or not os.path.isfile(path):
+            continue
+        try:
+            os.link(path, os.path.join(target_dir, name))
+        except OSError:
+            shutil.copy2(path, os.path.join(target_dir, name))
+
+def save_index(case_index, index_dir=INDEX_DIR):
+    """Writes the index as a new version of index_dir and publishes it."""
+    version_dir = _new_version_dir(index_dir)
+    _replace_file(os.path.join(version_dir, INDEX_FILE), lambda p: faiss.write_index(case_index.index, p))
+    write_case_store(version_dir, case_index.cases, CASE_COMPRESSION)
+    case_index.meta["case_compression"] = CASE_COMPRESSION
+    _save_array(os.path.join(version_dir, CHUNK_CASE_FILE), np.asarray(case_index.chunk_case, dtype=np.int32))
+    _save_array(os.path.join(version_dir, CHUNK_SPANS_FILE), np.asarray(case_index.chunk_spans, dtype=np.int64))
+    def write_metadata(p):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(case_index.metadata.records, f, ensure_ascii=False)
+    _replace_file(os.path.join(version_dir, METADATA_FILE), write_metadata)
+    case_index.lexical.save(version_dir, _save_array)
+    if case_index.embeddings is not None:
+        _save_array(os.path.join(version_dir, EMBEDDINGS_FILE), np.asarray(case_index.embeddings, dtype=np.float32))
+    case_index.meta["deleted_cases"] = int(case_index.deleted.sum())
+    if case_index.meta["deleted_cases"]:
+        _save_array(os.path.join(version_dir, DELETED_FILE), np.asarray(case_index.deleted, dtype=bool))
+    case_index.meta["duplicate_cases"] = case_index.duplicates
+    _save_array(os.path.join(version_dir, CANONICAL_FILE), np.asarray(case_index.canonical, dtype=np.int32))
+    if case_index.signatures is not None:
+        _save_array(os.path.join(version_dir, SIGNATURES_FILE), np.asarray(case_index.signatures, dtype=np.uint32))
+    write_meta(case_index.meta, version_dir)
+    _publish(index_dir, version_dir)
+
+def write_meta(meta, directory):
+    # A fresh id per published version: the query caches are keyed on it, and
+    # a re-index or compaction publishes a different index of the same corpus
+    meta["index_id"] = uuid.uuid4().hex[:16]
+    def write(p):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+    _replace_file(os.path.join(directory, META_FILE), write)
+
+def records_file_for(text_file):
+    """The OCR case records written alongside text_file, or None."""
+    for name in RECORDS_FILES:
+        path = os.path.join(os.path.dirname(text_file), name)
+        if os.path.exists(path):
+            return path
+    return None
+
+def build_index(embedding_model, text_file=EXTRACTED_TEXT_FILE, index_dir=INDEX_DIR, model_name=MODEL_NAME,
+                index_type=INDEX_TYPE):
+    """Embeds the passages of every case in text_file and saves a new index to index_dir."""
+    start = time.perf_counter()
+    cases = load_cases(text_file)
+    if not cases:
+        raise ValueError(f"No cases were extracted from {text_file}. Check the extracted_text.txt format.")
+    case_signatures, canonical = assign_duplicates(cases, DuplicateFinder(DEDUP_THRESHOLD))
+    unique = np.flatnonzero(canonical == np.arange(len(cases)))
+    chunks, chunk_case, chunk_spans = chunk_cases([cases[i] for i in unique], CHUNK_WORDS, CHUNK_OVERLAP)
+    chunk_case = unique[chunk_case].astype(np.int32)
+    print(f"Number of cases loaded: {len(cases)} ({len(chunks)} passages)")
+
+    # Create embeddings
+    chunk_embeddings = embedding_model.encode(chunks, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True)
+
+    # Create FAISS index
+    d = chunk_embeddings.shape[1]  # Embedding dimensionality
+    index = train_and_add(make_index(index_type, d, len(chunk_embeddings)), chunk_embeddings)
+
+    st = os.stat(text_file)
+    meta = {
+        "model_name": model_name,
+        "dim": int(d),
+        "ntotal": int(index.ntotal),
+        "ncases": len(cases),
+        "chunk_words": CHUNK_WORDS,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "dedup_threshold": DEDUP_THRESHOLD,
+        **index_info(index, index_type),
+        "corpus_file": os.path.abspath(text_file),
+        "corpus_size": st.st_size,
+        "corpus_mtime": st.st_mtime,
+        "corpus_version": corpus_version(text_file),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    metadata = MetadataIndex(metadata_for_cases(cases, records_file_for(text_file)))
+    lexical = LexicalIndex.build(chunks)
+    case_index = CaseIndex(index, cases, meta, chunk_embeddings, chunk_case, chunk_spans, metadata, lexical,
+                           canonical=canonical, signatures=case_signatures)
+    save_index(case_index, index_dir)
+    report_duplicates(cases, canonical, 0, d)
+    print(f"✅ Index built: {len(cases)} cases, {index.ntotal} passages ({index_type}) in {time.perf_counter() - start:.1f}s "
+          f"(corpus version {meta['corpus_version']})")
+    return case_index
+
+def assign_duplicates(texts, finder, first_id=0):
+    """MinHash signatures of texts (case ids first_id, first_id + 1, ...) and their canonical case ids."""
+    case_signatures = signatures(texts)
+    canonical = np.array([finder.assign(first_id + i, sig) for i, sig in enumerate(case_signatures)],
+                         dtype=np.int64)
+    return case_signatures, canonical
+
+def report_duplicates(texts, canonical, first_id, d):
+    """Prints the near-duplicates among texts and the passages they did not need."""
+    duplicates = [i for i, c in enumerate(canonical) if c != first_id + i]
+    if not duplicates:
+        return
+    skipped = len(chunk_cases([texts[i] for i in duplicates], CHUNK_WORDS, CHUNK_OVERLAP)[0])
+    print(f"Near-duplicates: {len(duplicates)} cases folded into their canonical case, {skipped} passages "
+          f"({skipped * d * 4 / 2**20:.1f} MB of float32 vectors) not embedded")
+
+def reindex(index_dir=INDEX_DIR, index_type=INDEX_TYPE):
+    """Rebuilds the FAISS index from the stored embeddings with another index type."""
+    source_dir = current_dir(index_dir)
+    meta = _read_meta_file(source_dir)
+    embeddings = np.load(os.path.join(source_dir, EMBEDDINGS_FILE), mmap_mode="r")
+    index = train_and_add(make_index(index_type, embeddings.shape[1], len(embeddings)), embeddings)
+    meta = {k: v for k, v in meta.items() if k not in ("index_type", "nlist")}
+    meta.update(index_info(index, index_type))
+    # Everything but the FAISS index carries over to the new version unchanged
+    version_dir = _new_version_dir(index_dir)
+    _link_files(source_dir, version_dir, exclude=(INDEX_FILE, META_FILE))
+    _replace_file(os.path.join(version_dir, INDEX_FILE), lambda p: faiss.write_index(index, p))
+    write_meta(meta, version_dir)
+    _publish(index_dir, version_dir)
+    print(f"✅ Re-indexed {index.ntotal} vectors as {index_type}")
+
+def update_index(embedding_model, text_file=EXTRACTED_TEXT_FILE, index_dir=INDEX_DIR, model_name=MODEL_NAME):
+    """Brings the stored index in line with text_file, embedding only new or changed cases.
+
+    Removed and changed cases are tombstoned, their passages stay in the
+    index but are never returned. Once more than COMPACT_RATIO of the
+    passages are dead the index is compacted. The result is published as a
+    new version; there must be only one writer at a time.
+    """
+    start = time.perf_counter()
+    dim = embedding_model.get_sentence_embedding_dimension()
+    case_index, problem = load_index(index_dir, model_name, dim, text_file=None)
+    if case_index is None:
+        raise RuntimeError(f"Cannot update the index: {problem}")
+    meta = case_index.meta
+    if case_index.embeddings is None or meta.get("corpus_version") == "legacy":
+        raise RuntimeError("Cannot update the index: it has no stored embeddings, build it instead")
+    if (meta.get("chunk_words"), meta.get("chunk_overlap")) != (CHUNK_WORDS, CHUNK_OVERLAP):
+        raise RuntimeError("Cannot update the index: the passage chunking settings have changed, build it instead")
+    cases = load_cases(text_file)
+    if not cases:
+        raise ValueError(f"No cases were extracted from {text_file}. Check the extracted_text.txt format.")
+
+    # Cases are matched by content; an edited case is a removal plus an addition
+    live = {}
+    for i in np.flatnonzero(~case_index.deleted):
+        live.setdefault(_case_hash(case_index.cases[i]), []).append(int(i))
+    deleted = np.array(case_index.deleted, dtype=bool)
+    added = []
+    for case in cases:
+        same = live.get(_case_hash(case))
+        if same:
+            same.pop()
+        else:
+            added.append(case)
+    for ids in live.values():
+        deleted[ids] = True
+    removed = int(deleted.sum() - case_index.deleted.sum())
+    # A live duplicate of a removed case has no passages of its own; it is
+    # added again to be matched or embedded like a new case
+    canonical = np.asarray(case_index.canonical, dtype=np.int64)
+    orphans = [int(i) for i in np.flatnonzero(~deleted) if deleted[canonical[i]]]
+    deleted[orphans] = True
+    added = [case_index.cases[i] for i in orphans] + added
+    st = os.stat(text_file)
+    corpus = {"corpus_file": os.path.abspath(text_file), "corpus_size": st.st_size, "corpus_mtime": st.st_mtime,
+              "corpus_version": corpus_version(text_file)}
+    if not added and not removed:  # e.g. only the file's mtime changed
+        source_dir = current_dir(index_dir)
+        version_dir = _new_version_dir(index_dir)
+        _link_files(source_dir, version_dir, exclude=(META_FILE,))
+        write_meta({**meta, **corpus}, version_dir)
+        _publish(index_dir, version_dir)
+        print("✅ Index is up to date, no cases were added or removed")
+        return case_index
+
+    ncases = len(case_index.cases)
+    old_signatures = case_index.signatures
+    if old_signatures is None:  # built before near-duplicate detection
+        old_signatures = signatures(case_index.cases)
+    finder = DuplicateFinder(meta.get("dedup_threshold", DEDUP_THRESHOLD))
+    for i in np.flatnonzero(~deleted & (canonical == np.arange(ncases))):
+        finder.add(int(i), old_signatures[i])
+    new_signatures, new_canonical = assign_duplicates(added, finder, ncases)
+    unique = np.flatnonzero(new_canonical == np.arange(ncases, ncases + len(added)))
+    chunks, chunk_case, chunk_spans = chunk_cases([added[i] for i in unique], CHUNK_WORDS, CHUNK_OVERLAP)
+    index = faiss.read_index(os.path.join(current_dir(index_dir), INDEX_FILE))  # a writable copy
+    embeddings = np.asarray(case_index.embeddings, dtype=np.float32)
+    if chunks:
+        new_embeddings = embedding_model.encode(chunks, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True)
+        index.add(np.ascontiguousarray(new_embeddings, dtype=np.float32))
+        embeddings = np.concatenate([embeddings, new_embeddings])
+    meta = {**meta, **corpus, "ntotal": int(index.ntotal), "ncases": ncases + len(added),
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    metadata = MetadataIndex(case_index.metadata.records + metadata_for_cases(added, records_file_for(text_file)))
+    case_index = CaseIndex(index, list(case_index.cases) + added, meta, embeddings,
+                           np.concatenate([case_index.chunk_case, unique[chunk_case] + ncases]).astype(np.int32),
+                           np.concatenate([case_index.chunk_spans, chunk_spans]).astype(np.int64),
+                           metadata, deleted=np.concatenate([deleted, np.zeros(len(added), dtype=bool)]),
+                           canonical=np.concatenate([canonical, new_canonical]),
+                           signatures=np.concatenate([old_signatures, new_signatures]))
+    if len(case_index.dead_chunks) > COMPACT_RATIO * index.ntotal:
+        case_index = compact(case_index)
+    save_index(case_index, index_dir)
+    report_duplicates(added, new_canonical, ncases, embeddings.shape[1])
+    print(f"✅ Index updated: {len(added)} cases added ({len(chunks)} passages embedded), {removed} removed, "
+          f"{int(case_index.deleted.sum())} awaiting compaction, in {time.perf_counter() - start:.1f}s")
+    return case_index
+
+def _case_hash(text):
+    return hashlib.sha1(str(text).encode("utf-8")).digest()
+
+def compact(case_index):
+    """A copy of case_index without its deleted cases, re-indexed from the stored embeddings."""
+    keep = np.flatnonzero(~case_index.deleted)
+    if not len(keep):
+        raise ValueError("Cannot compact an index whose cases are all deleted")
+    chunk_ids = case_index.case_chunks(keep)
+    counts = np.bincount(np.asarray(case_index.chunk_case), minlength=len(case_index.cases))[keep]
+    embeddings = np.asarray(case_index.embeddings[chunk_ids], dtype=np.float32)
+    meta = case_index.meta
+    index = train_and_add(make_index(meta["index_type"], embeddings.shape[1], len(embeddings)), embeddings)
+    meta = {**{k: v for k, v in meta.items() if k != "nlist"}, **index_info(index, meta["index_type"]),
+            "ntotal": int(index.ntotal), "ncases": len(keep), "compacted_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    new_ids = np.full(len(case_index.cases), -1, dtype=np.int64)
+    new_ids[keep] = np.arange(len(keep))
+    case_signatures = None if case_index.signatures is None else np.asarray(case_index.signatures)[keep]
+    print(f"Compacting: dropping {len(case_index.cases) - len(keep)} deleted cases")
+    return CaseIndex(index, [case_index.cases[i] for i in keep], meta, embeddings,
+                     np.repeat(np.arange(len(keep), dtype=np.int32), counts),
+                     np.asarray(case_index.chunk_spans)[chunk_ids],
+                     MetadataIndex([case_index.metadata.records[i] for i in keep]),
+                     canonical=new_ids[np.asarray(case_index.canonical)[keep]], signatures=case_signatures)
+
+def compact_index(index_dir=INDEX_DIR, model_name=MODEL_NAME):
+    """Compacts the stored index now, whatever its share of deleted cases."""
+    case_index, problem = load_index(index_dir, model_name, text_file=None)
+    if case_index is None:
+        raise RuntimeError(f"Cannot compact the index: {problem}")
+    if not case_index.deleted.any():
+        print("Nothing to compact")
+        return case_index
+    case_index = compact(case_index)
+    save_index(case_index, index_dir)
+    print(f"✅ Compacted to {len(case_index)} cases, {case_index.index.ntotal} passages")
+    return case_index
+
+def read_meta(index_dir=INDEX_DIR):
+    return _read_meta_file(current_dir(index_dir))
+
+def _read_meta_file(directory):
+    path = os.path.join(directory, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def check_meta(meta, model_name=MODEL_NAME, dim=None, text_file=EXTRACTED_TEXT_FILE, index_type=None):
+    """Returns why a stored index can't be used, or None if it is consistent.
+
+    The corpus is only compared when the extracted text is available (serving
+    nodes may ship just the index); size + mtime is the fast path, the
+    content hash decides otherwise.
+    """
+    if meta is None:
+        return "no index has been built yet"
+    if meta.get("model_name") != model_name:
+        return f"index was built with {meta.get('model_name')}, the server uses {model_name}"
+    if dim is not None and meta.get("dim") != dim:
+        return f"index dimension {meta.get('dim')} does not match the model's {dim}"
+    if index_type is not None and meta.get("index_type") != index_type:
+        return f"index type changed from {meta.get('index_type')} to {index_type}"
+    if text_file and os.path.exists(text_file):
+        if meta.get("corpus_version") == "legacy":
+            return "index was imported from the legacy files, its corpus is unknown"
+        st = os.stat(text_file)
+        if (st.st_size, st.st_mtime) != (meta.get("corpus_size"), meta.get("corpus_mtime")):
+            if corpus_version(text_file) != meta.get("corpus_version"):
+                return "the extracted text has changed since the index was built"
+        if (meta.get("chunk_words"), meta.get("chunk_overlap")) != (CHUNK_WORDS, CHUNK_OVERLAP):
+            return "the passage chunking settings have changed"
+    return None
+
+def _read_faiss_index(path):
+    # Only IVF indexes keep their lists in the mapping, faiss reads other types into memory
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:  # index type without mmap support in this faiss build
+        return faiss.read_index(path)
+
+def load_index(index_dir=INDEX_DIR, model_name=MODEL_NAME, dim=None, text_file=EXTRACTED_TEXT_FILE,
+               index_type=None):
+    """Loads the published index (memory mapped). Returns (CaseIndex, None) or (None, reason)."""
+    directory = current_dir(index_dir)  # versions are never modified once published
+    meta = _read_meta_file(directory)
+    problem = check_meta(meta, model_name, dim, text_file, index_type)
+    if problem:
+        return None, problem
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILE)
+    embeddings = np.load(embeddings_path, mmap_mode="r") if os.path.exists(embeddings_path) else None
+    if meta.get("index_type") == "flat" and embeddings is not None:
+        index = MappedFlatIndex(embeddings)  # the faiss file holds the same vectors
+    else:
+        index = _read_faiss_index(os.path.join(directory, INDEX_FILE))
+    if CaseStore.exists(directory):
+        cases = CaseStore(directory, meta.get("case_compression"))
+    else:
+        cases = np.load(os.path.join(directory, CASES_FILE), mmap_mode="r")
+    chunk_case = chunk_spans = None
+    if os.path.exists(os.path.join(directory, CHUNK_CASE_FILE)):
+        chunk_case = np.load(os.path.join(directory, CHUNK_CASE_FILE), mmap_mode="r")
+        chunk_spans = np.load(os.path.join(directory, CHUNK_SPANS_FILE), mmap_mode="r")
+    metadata = None
+    if os.path.exists(os.path.join(directory, METADATA_FILE)):
+        with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as f:
+            metadata = MetadataIndex(json.load(f))
+    lexical = LexicalIndex.load(directory)
+    if lexical is not None and len(lexical) != index.ntotal:  # left over from an older build
+        lexical = None
+    deleted = None
+    if os.path.exists(os.path.join(directory, DELETED_FILE)):
+        deleted = np.load(os.path.join(directory, DELETED_FILE))
+    canonical = case_signatures = None
+    if os.path.exists(os.path.join(directory, CANONICAL_FILE)):
+        canonical = np.load(os.path.join(directory, CANONICAL_FILE))
+    if os.path.exists(os.path.join(directory, SIGNATURES_FILE)):
+        case_signatures = np.load(os.path.join(directory, SIGNATURES_FILE), mmap_mode="r")
+    case_index = CaseIndex(index, cases, meta, embeddings, chunk_case, chunk_spans, metadata, lexical, deleted,
+                           canonical, case_signatures)
+    if not (index.ntotal == len(case_index.chunk_case) == meta["ntotal"]
+            and len(cases) == meta.get("ncases", len(cases)) == len(case_index.deleted) == len(case_index.canonical)):
+        return None, "index files are incomplete"
+    return case_index, None
+
+def import_legacy(index_dir=INDEX_DIR, model_name=MODEL_NAME):
+    """Copies case_embeddings.index + case_ids.npy from the repo root into index_dir."""
+    if not (os.path.exists(LEGACY_INDEX_FILE) and os.path.exists(LEGACY_CASES_FILE)):
+        return None
+    index = faiss.read_index(LEGACY_INDEX_FILE)
+    cases = np.load(LEGACY_CASES_FILE, allow_pickle=True)
+    meta = {"model_name": model_name, "dim": int(index.d), "ntotal": int(index.ntotal),
+            "index_type": "flat", "corpus_version": "legacy",
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    embeddings = index.reconstruct_n(0, index.ntotal)  # flat index, vectors are stored as is
+    case_index = CaseIndex(index, [str(c) for c in cases], meta, embeddings)
+    save_index(case_index, index_dir)
+    print(f"Imported legacy {LEGACY_INDEX_FILE}/{LEGACY_CASES_FILE} into {index_dir}")
+    return case_index
+
+def load_or_build(embedding_model, index_dir=INDEX_DIR, model_name=MODEL_NAME, text_file=EXTRACTED_TEXT_FILE,
+                  index_type=INDEX_TYPE):
+    """Fast path for servers: load the stored index, rebuild only if it is stale or missing."""
+    dim = embedding_model.get_sentence_embedding_dimension()
+    case_index, problem = load_index(index_dir, model_name, dim, text_file, index_type)
+    if case_index is not None:
+        log.info(f"Loaded index {case_index.version}: {len(case_index)} cases, {case_index.index.ntotal} passages "
+                 f"({case_index.meta['index_type']})")
+        return case_index
+
+    if read_meta(index_dir) is None and not os.path.exists(text_file) and import_legacy(index_dir, model_name):
+        return load_or_build(embedding_model, index_dir, model_name, text_file, index_type)
+
+    meta = read_meta(index_dir)
+    has_embeddings = os.path.exists(os.path.join(current_dir(index_dir), EMBEDDINGS_FILE))
+    if check_meta(meta, model_name, dim, text_file) is None and has_embeddings:
+        # Only the index type differs, the stored embeddings are still valid
+        log.info(f"Re-indexing: {problem}")
+        reindex(index_dir, index_type)
+    elif (check_meta(meta, model_name, dim, None, index_type) is None and has_embeddings
+          and meta.get("corpus_version") != "legacy"
+          and (meta.get("chunk_words"), meta.get("chunk_overlap")) == (CHUNK_WORDS, CHUNK_OVERLAP)):
+        # Only the corpus differs, embed just the new and changed cases
+        log.info(f"Updating index: {problem}")
+        update_index(embedding_model, text_file, index_dir, model_name)
+    else:
+        log.info(f"Rebuilding index: {problem}")
+        build_index(embedding_model, text_file, index_dir, model_name, index_type)
+    case_index, problem = load_index(index_dir, model_name, dim, text_file, index_type)
+    if case_index is None:
+        raise RuntimeError(f"Index rebuild failed: {problem}")
+    return case_index
+
+class LiveIndex:
+    """The published CaseIndex of index_dir, swapped for a newer version when one is published.
+
+    Servers call get() per request; at most every check_interval seconds it
+    reads CURRENT and, if it changed, loads the new version in the calling
+    thread while the other requests keep using the old one. warm, if set, is
+    called with the new CaseIndex before it is swapped in, so the first
+    requests on it don't pay for the page faults.
+    """
+
+    def __init__(self, embedding_model, index_dir=INDEX_DIR, model_name=MODEL_NAME, text_file=EXTRACTED_TEXT_FILE,
+                 index_type=INDEX_TYPE, check_interval=INDEX_RELOAD_INTERVAL):
+        self.index_dir = index_dir
+        self.model_name = model_name
+        self.dim = embedding_model.get_sentence_embedding_dimension()
+        self.check_interval = check_interval
+        self.case_index = load_or_build(embedding_model, index_dir, model_name, text_file, index_type)
+        self._published = _read_current(index_dir)
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+        self.warm = None
+        self.reloads = 0
+
+    @property
+    def published(self):
+        """Version directory named by CURRENT when it was last read."""
+        return self._published
+
+    def get(self, refresh=False):
+        """The current CaseIndex; refresh=True reads CURRENT now, waiting for a reload in progress."""
+        due = refresh or time.monotonic() - self._checked >= self.check_interval
+        if due and self._lock.acquire(blocking=refresh):
+            try:
+                self._checked = time.monotonic()
+                published = _read_current(self.index_dir)
+                if published != self._published:
+                    # The writer checked the corpus, only the model has to match here
+                    case_index, problem = load_index(self.index_dir, self.model_name, self.dim, text_file=None)
+                    if case_index is None:
+                        log.warning(f"Not reloading index version {published}: {problem}")
+                    else:
+                        if self.warm is not None:
+                            self.warm(case_index)
+                        self.case_index = case_index
+                        self.reloads += 1
+                        log.info(f"Reloaded index {case_index.version} ({published}): {len(case_index)} cases, "
+                                 f"{int(case_index.deleted.sum())} deleted")
+                    self._published = published
+            finally:
+                self._lock.release()
+        return self.case_index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, update or inspect the case index.")
+    parser.add_argument("command", choices=["build", "update", "compact", "reindex", "info"])
+    parser.add_argument("--text-file", default=EXTRACTED_TEXT_FILE)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        meta = read_meta(args.index_dir)
+        print(json.dumps(meta, indent=2) if meta else f"No index in {args.index_dir}")
+        problem = check_meta(meta, text_file=args.text_file)
+        print(f"Status: {'stale, ' + problem if problem else 'up to date'}")
+    elif args.command == "reindex":
+        reindex(args.index_dir, args.index_type)
+    elif args.command == "compact":
+        compact_index(args.index_dir)
+    elif args.command == "update":
+        from encoders import load_encoder
+        update_index(load_encoder(MODEL_NAME), args.text_file, args.index_dir)
+    else:
+        from encoders import load_encoder
+        build_index(load_encoder(MODEL_NAME), args.text_file, args.index_dir, index_type=args.index_type)
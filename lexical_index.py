@@ -0,0 +1,185 @@
+import os
+import re
+import numpy as np
+
+# BM25 over the indexed passages, for hybrid retrieval.
+#
+# Exact names and numbers ("HARUN-UL-RASHID", "CRL.MC 3/2014") embed poorly,
+# a lexical index finds them directly. Postings are kept as flat arrays,
+# saved with np.save and memory mapped on load like the vectors:
+#
+#   terms       sorted vocabulary (bytes), term id = position
+#   offsets     postings of term t are docs/tfs[offsets[t]:offsets[t + 1]]
+#   docs, tfs   passage ids (ascending within a term) and term frequencies
+#   lengths     tokens per passage
+#   max_scores  best BM25 contribution of each term, for MaxScore pruning
+#
+# Queries are scored term at a time with MaxScore: terms go in decreasing
+# order of their best contribution, and once the k-th best score so far
+# exceeds what the remaining terms could add up to, no unseen passage can
+# make the top k. From then on the remaining (frequent, low idf) terms are
+# only probed for the candidates still in reach, instead of scanning their
+# long postings lists.
+#
+# Vector and BM25 case rankings are combined with reciprocal rank fusion,
+# which needs no score calibration between the two.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TERM_LENGTH = 32  # longer tokens are OCR noise and would widen the terms array
+RRF_K = 60
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+SEARCH_MODE = os.environ.get("SEARCH_MODE", "vector")
+
+ARRAYS = ("terms", "offsets", "docs", "tfs", "lengths", "max_scores")
+FILE_PREFIX = "lexical_"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) <= MAX_TERM_LENGTH]
+
+class LexicalIndex:
+    """BM25 index over a list of passages, ids are passage positions."""
+
+    def __init__(self, terms, offsets, docs, tfs, lengths, max_scores):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+        self.max_scores = max_scores
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @classmethod
+    def build(cls, texts):
+        vocab = {}
+        term_ids, doc_ids = [], []
+        lengths = np.zeros(len(texts), dtype=np.int32)
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[doc] = len(tokens)
+            term_ids.extend(vocab.setdefault(t, len(vocab)) for t in tokens)
+            doc_ids.extend([doc] * len(tokens))
+
+        # Renumber terms in sorted order, so lookups are a binary search
+        terms = np.array(sorted(vocab), dtype=f"S{MAX_TERM_LENGTH}")
+        rank = np.empty(len(vocab), dtype=np.int64)
+        rank[[vocab[t.decode()] for t in terms]] = np.arange(len(vocab))
+        keys = rank[np.asarray(term_ids, dtype=np.int64)] * max(len(texts), 1) + np.asarray(doc_ids, dtype=np.int64)
+        keys, tfs = np.unique(keys, return_counts=True)
+        term_of, docs = np.divmod(keys, max(len(texts), 1))
+        offsets = np.searchsorted(term_of, np.arange(len(terms) + 1)).astype(np.int64)
+        index = cls(terms, offsets, docs.astype(np.int32), np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16),
+                    lengths, np.zeros(len(terms), dtype=np.float32))
+        if len(docs):
+            scores = index._score(term_of, docs, index.tfs)
+            index.max_scores = np.maximum.reduceat(scores, offsets[:-1]).astype(np.float32)
+        return index
+
+    def save(self, index_dir, save_array):
+        for name in ARRAYS:
+            save_array(os.path.join(index_dir, f"{FILE_PREFIX}{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, index_dir):
+        """The index stored in index_dir (memory mapped), or None if it has none."""
+        paths = [os.path.join(index_dir, f"{FILE_PREFIX}{name}.npy") for name in ARRAYS]
+        if not all(os.path.exists(p) for p in paths):
+            return None
+        return cls(*(np.load(p, mmap_mode="r") for p in paths))
+
+    def term_ids(self, query):
+        """Ids of the distinct query terms that occur in the index."""
+        if not len(self.terms):
+            return np.empty(0, dtype=np.int64)
+        tokens = np.array(sorted(set(tokenize(query))), dtype=f"S{MAX_TERM_LENGTH}")
+        pos = np.minimum(np.searchsorted(self.terms, tokens), len(self.terms) - 1)
+        return pos[self.terms[pos] == tokens]
+
+    def postings(self, term):
+        start, end = self.offsets[term], self.offsets[term + 1]
+        return np.asarray(self.docs[start:end]), np.asarray(self.tfs[start:end])
+
+    def _score(self, term, docs, tfs):
+        df = self.offsets[term + 1] - self.offsets[term]
+        idf = np.log1p((len(self.lengths) - df + 0.5) / (df + 0.5))
+        tfs = tfs.astype(np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * np.asarray(self.lengths[docs]) / self.avg_length)
+        return (idf * tfs * (BM25_K1 + 1) / (tfs + norm)).astype(np.float32)
+
+    def search(self, query, top_k, allowed=None):
+        """BM25 top_k passages of query, returns (scores, doc ids) best first.
+
+        allowed (a boolean mask over the passages) restricts the search.
+        Scores are accumulated for the passages in the postings read so far
+        only, never over the whole collection.
+        """
+        terms = self.term_ids(query)
+        terms = terms[np.argsort(-np.asarray(self.max_scores[terms]), kind="stable")]
+        # Upper bound of what the terms after each one can still add, 0 after the last
+        bounds = np.asarray(self.max_scores[terms], dtype=np.float64)
+        rest = np.append(np.cumsum(bounds[::-1])[::-1][1:], 0.0)
+        candidates = np.empty(0, dtype=np.int64)  # ascending passage ids with their scores so far
+        scores = np.empty(0, dtype=np.float64)
+        pruned = False  # True once no unseen passage can make the top k
+        threshold = 0.0
+        for term, remaining in zip(terms, rest):
+            docs, tfs = self.postings(term)
+            if not pruned:
+                if allowed is not None:
+                    keep = allowed[docs]
+                    docs, tfs = docs[keep], tfs[keep]
+                candidates, inverse = np.unique(np.concatenate([candidates, docs]), return_inverse=True)
+                scores = np.bincount(inverse, np.concatenate([scores, self._score(term, docs, tfs)]),
+                                     minlength=len(candidates))
+            else:
+                # Probe the postings for the candidates only
+                pos = np.searchsorted(docs, candidates)
+                found = pos < len(docs)
+                found[found] = docs[pos[found]] == candidates[found]
+                scores[found] += self._score(term, candidates[found], tfs[pos[found]])
+            if len(candidates) >= top_k:
+                threshold = max(threshold, float(np.partition(scores, -top_k)[-top_k]))
+            pruned = pruned or threshold > remaining
+            if pruned:
+                keep = scores + remaining >= threshold
+                candidates, scores = candidates[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        order = order[scores[order] > 0]
+        return scores[order].astype(np.float32), candidates[order]
+
+    def matching(self, query):
+        """Ids of the passages containing every term of query (any order)."""
+        tokens = set(tokenize(query))
+        terms = self.term_ids(query)
+        if not tokens or len(terms) < len(tokens):
+            return np.empty(0, dtype=np.int64)
+        docs = self.postings(terms[0])[0]
+        for term in terms[1:]:
+            docs = np.intersect1d(docs, self.postings(term)[0], assume_unique=True)
+        return docs.astype(np.int64)
+
+def reciprocal_rank_fusion(rankings, top_k, k=RRF_K):
+    """Fuses case rankings (lists of search_cases hits), each case scored sum(1 / (k + rank)).
+
+    A fused hit lists the best passage of each ranking first.
+    """
+    fused = {}
+    for hits in rankings:
+        for rank, hit in enumerate(hits, 1):
+            entry = fused.setdefault(hit["case"], {"case": hit["case"], "score": 0.0, "chunks": []})
+            entry["score"] += 1.0 / (k + rank)
+            entry["chunks"].append(hit["chunks"])
+    for entry in fused.values():
+        chunks, seen = [], set()
+        for depth in range(max(len(c) for c in entry["chunks"])):
+            for ranked in entry["chunks"]:
+                if depth < len(ranked) and ranked[depth][0] not in seen:
+                    seen.add(ranked[depth][0])
+                    chunks.append(ranked[depth])
+        entry["chunks"] = chunks
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:top_k]
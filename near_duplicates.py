@@ -0,0 +1,115 @@
+import os
+import zlib
+import numpy as np
+from lexical_index import tokenize
+
+# Near-duplicate judgments.
+#
+# Certified copies, re-scans and appeals that carry the lower-court order
+# come in as separate cases with almost the same text. Each case gets a
+# MinHash signature of its SHINGLE_WORDS-word shingles. The fraction of
+# signature slots two cases share estimates the Jaccard similarity of their
+# shingle sets, and OCR noise only changes the few shingles it touches.
+#
+# Signatures are banded into an LSH table: cases that agree on every row of
+# at least one band become candidates, and only the candidates' signatures
+# are compared. The band shape follows from DEDUP_THRESHOLD, so pairs above
+# it are very likely to collide and pairs well below it rarely do.
+#
+# Cases are assigned in order. A case whose best match among the canonical
+# cases so far reaches the threshold becomes a duplicate of that case.
+# Otherwise it is canonical itself, so an existing canonical case never
+# changes when new cases arrive. A case without a single token (empty OCR,
+# only punctuation) has no signature and is always canonical; its row in a
+# signature array is NO_SIGNATURE.
+
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.85"))  # estimated Jaccard, 0 turns dedup off
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+
+NO_SIGNATURE = 0xFFFFFFFF  # fills the signature row of a case without shingles
+
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20250315)  # fixed: signatures are stored with the index
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+
+def shingles(text, k=SHINGLE_WORDS):
+    """32-bit hashes of the distinct k-word shingles of text (its tokens if it has fewer)."""
+    words = np.array([zlib.crc32(t.encode()) for t in tokenize(str(text))], dtype=np.uint64)
+    if len(words) < k:
+        return np.unique(words)
+    mixed = np.zeros(len(words) - k + 1, dtype=np.uint64)
+    for j in range(k):  # polynomial hash of the window, wrapping at 2^64
+        mixed = mixed * np.uint64(1000003) + words[j:len(words) - k + 1 + j]
+    return np.unique((mixed ^ (mixed >> np.uint64(32))) & np.uint64(0xFFFFFFFF))
+
+def signature(text):
+    """MinHash signature of text's shingles, NUM_PERM uint32 values, None if it has none."""
+    hashes = shingles(text)
+    if not len(hashes):
+        return None
+    minimum = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), 4096):  # bounded (NUM_PERM, 4096) blocks for long judgments
+        block = hashes[None, start:start + 4096]
+        np.minimum(minimum, ((_A[:, None] * block + _B[:, None]) % _PRIME).min(1), out=minimum)
+    return (minimum & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+def signatures(texts):
+    out = np.full((len(texts), NUM_PERM), NO_SIGNATURE, dtype=np.uint32)
+    for i, text in enumerate(texts):
+        sig = signature(text)
+        if sig is not None:
+            out[i] = sig
+    return out
+
+def has_signature(sig):
+    """False for None and for the NO_SIGNATURE row of a case without shingles."""
+    return sig is not None and not np.all(np.asarray(sig) == NO_SIGNATURE)
+
+def lsh_shape(threshold, num_perm=NUM_PERM):
+    """(bands, rows) of the LSH table, with the S-curve's midpoint (1/b)^(1/r) just under threshold."""
+    shapes = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+    below = [(b, r) for b, r in shapes if (1 / b) ** (1 / r) <= threshold] or shapes[:1]
+    return max(below, key=lambda shape: (1 / shape[0]) ** (1 / shape[1]))
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+class DuplicateFinder:
+    """LSH index over the signatures of canonical cases."""
+
+    def __init__(self, threshold=DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.bands, self.rows = lsh_shape(threshold)
+        self.tables = [{} for _ in range(self.bands)]
+        self.signatures = {}
+
+    def _keys(self, sig):
+        return [sig[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+    def add(self, case_id, sig):
+        if not has_signature(sig):  # nothing to match against
+            return
+        self.signatures[case_id] = sig
+        for table, key in zip(self.tables, self._keys(sig)):
+            table.setdefault(key, []).append(case_id)
+
+    def match(self, sig):
+        """The most similar canonical case at or above the threshold, or None."""
+        candidates = {case_id for table, key in zip(self.tables, self._keys(sig)) for case_id in table.get(key, ())}
+        best, best_similarity = None, 0.0
+        for case_id in sorted(candidates):  # ties go to the earliest case
+            s = similarity(sig, self.signatures[case_id])
+            if s >= self.threshold and s > best_similarity:
+                best, best_similarity = case_id, s
+        return best
+
+    def assign(self, case_id, sig):
+        """Canonical case of case_id: its match, or case_id itself (then added as canonical)."""
+        match = self.match(sig) if self.threshold > 0 and has_signature(sig) else None
+        if match is None:
+            self.add(case_id, sig)
+            return case_id
+        return match
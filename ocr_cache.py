@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import hashlib
+
+# Persistent OCR cache.
+#
+# Every PDF is recorded with its size, mtime and SHA-256, and every page with a
+# fingerprint of its content streams and embedded images. OCR output is stored
+# per page fingerprint, so a re-run only OCRs pages it has never seen before.
+# Fingerprints and document records both carry a salt describing the OCR
+# settings, so changed settings miss the cache.
+# The OCR job queue (ocr_jobs.py) keeps its state in the same database.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    salt TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS document_pages (
+    filename TEXT NOT NULL,
+    page_no INTEGER NOT NULL,
+    page_hash TEXT NOT NULL,
+    PRIMARY KEY (filename, page_no)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    page_hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    method TEXT NOT NULL DEFAULT 'ocr'
+);
+"""
+
+def file_sha256(path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file, read in 1 MB blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def page_fingerprint(page, salt=""):
+    """Hashes what a page renders from: geometry, content streams and images.
+
+    `salt` should describe the OCR settings, so changing them invalidates the
+    cached text without touching the PDFs.
+    """
+    doc = page.parent
+    h = hashlib.sha256(salt.encode("utf-8"))
+    h.update(repr((tuple(page.rect), page.rotation)).encode("utf-8"))
+    h.update(page.read_contents())
+    for xref in sorted({img[0] for img in page.get_images(full=True)} |
+                       {xobj[0] for xobj in page.get_xobjects()}):
+        h.update(doc.xref_stream_raw(xref) or b"")
+    return h.hexdigest()
+
+class OCRCache:
+    """SQLite-backed manifest of PDFs and the OCR text of their pages."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=60)  # worker runs share the file (ocr_jobs.py)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(pages)")]
+        if "method" not in columns:  # cache written before the native text path existed
+            self.conn.execute("ALTER TABLE pages ADD COLUMN method TEXT NOT NULL DEFAULT 'ocr'")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(documents)")]
+        if "salt" not in columns:  # documents recorded before the settings were; they miss once
+            self.conn.execute("ALTER TABLE documents ADD COLUMN salt TEXT NOT NULL DEFAULT ''")
+        self.doc_hits = 0
+        self.doc_misses = 0
+        self.page_hits = 0
+        self.page_misses = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def lookup_document(self, filename, pdf_path, salt=""):
+        """Returns the cached (text, method) pages of an unchanged PDF, else None.
+
+        size + mtime is trusted as a fast path, otherwise the content hash
+        decides (a touched but identical file is still a hit). A document
+        OCR'd with other settings (`salt`, as for page_fingerprint) misses.
+        """
+        row = self.conn.execute(
+            "SELECT size, mtime, sha256, page_count, salt FROM documents WHERE filename = ?",
+            (filename,)).fetchone()
+        if row is None:
+            return None
+        size, mtime, sha, page_count, doc_salt = row
+        if doc_salt != salt:
+            return None
+        st = os.stat(pdf_path)
+        if (st.st_size, st.st_mtime) != (size, mtime):
+            if st.st_size != size or file_sha256(pdf_path) != sha:
+                return None
+            self.conn.execute("UPDATE documents SET mtime = ? WHERE filename = ?",
+                              (st.st_mtime, filename))
+
+        pages = self.conn.execute(
+            "SELECT p.text, p.method FROM document_pages d JOIN pages p ON p.page_hash = d.page_hash "
+            "WHERE d.filename = ? ORDER BY d.page_no", (filename,)).fetchall()
+        if len(pages) != page_count:
+            return None
+        return pages
+
+    def document_page_count(self, filename):
+        """Number of pages of a recorded PDF, None if it isn't recorded."""
+        row = self.conn.execute("SELECT page_count FROM documents WHERE filename = ?", (filename,)).fetchone()
+        return row[0] if row else None
+
+    def get_pages(self, page_hashes):
+        """Returns {page_hash: (text, method)} for the hashes already in the cache."""
+        found = {}
+        unique = list(set(page_hashes))
+        for i in range(0, len(unique), 500):  # stay under SQLite's variable limit
+            chunk = unique[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT page_hash, text, method FROM pages WHERE page_hash IN ({','.join('?' * len(chunk))})",
+                chunk)
+            found.update((page_hash, (text, method)) for page_hash, text, method in rows)
+        return found
+
+    def put_page(self, page_hash, text, method="ocr"):
+        self.conn.execute("INSERT OR REPLACE INTO pages (page_hash, text, method) VALUES (?, ?, ?)",
+                          (page_hash, text, method))
+
+    def commit(self):
+        self.conn.commit()
+
+    def put_document(self, filename, pdf_path, page_hashes, salt=""):
+        """Records a fully OCR'd PDF and commits it together with its pages.
+
+        `salt` is the one its page hashes were fingerprinted with.
+        """
+        st = os.stat(pdf_path)
+        self.conn.execute("DELETE FROM document_pages WHERE filename = ?", (filename,))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents (filename, size, mtime, sha256, page_count, salt) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (filename, st.st_size, st.st_mtime, file_sha256(pdf_path), len(page_hashes), salt))
+        self.conn.executemany(
+            "INSERT INTO document_pages (filename, page_no, page_hash) VALUES (?, ?, ?)",
+            [(filename, n, h) for n, h in enumerate(page_hashes)])
+        self.conn.commit()
+
+    def prune(self, filenames):
+        """Drops PDFs that are no longer in the input directory and pages nothing refers to.
+
+        Not run automatically: pages of a PDF that failed half way are kept so
+        the next run can pick them up.
+        """
+        keep = set(filenames)
+        stale = [f for (f,) in self.conn.execute("SELECT filename FROM documents") if f not in keep]
+        for filename in stale:
+            self.conn.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+            self.conn.execute("DELETE FROM document_pages WHERE filename = ?", (filename,))
+        self.conn.execute(
+            "DELETE FROM pages WHERE page_hash NOT IN (SELECT page_hash FROM document_pages)")
+        self.conn.commit()
+        return len(stale)
+
+    def report(self):
+        print(f"🗂️  OCR cache: {self.doc_hits} documents reused, {self.doc_misses} (re)processed; "
+              f"{self.page_hits} page hits, {self.page_misses} page misses")
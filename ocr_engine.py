@@ -0,0 +1,72 @@
+import math
+
+# Batched recognition around an EasyOCR reader.
+#
+# readtext() detects and recognizes one image at a time, so the recognizer
+# only ever sees the handful of text lines on a single page. Here detection
+# still runs per image, but the resulting line crops from several pages are
+# pooled, sorted by width (less padding per batch) and recognized in batches
+# of `batch_size`. Results are mapped back to their image in reading order.
+
+try:
+    from easyocr.utils import get_image_list, reformat_input
+    from easyocr.recognition import get_text
+except ImportError:  # EasyOCR internals moved, fall back to plain readtext()
+    get_image_list = reformat_input = get_text = None
+
+MODEL_HEIGHT = 64  # Line height the EasyOCR recognizer resizes crops to
+
+def set_torch_threads(threads):
+    """Sets torch's intra-op thread count for this process (None leaves the default)."""
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+class BatchedOCREngine:
+    """EasyOCR with recognition batched across pages and image regions."""
+
+    def __init__(self, reader, batch_size=32):
+        self.reader = reader
+        self.batch_size = batch_size
+        self.batched = get_text is not None
+        if self.batched:
+            # Same character filtering readtext() applies without allow/blocklists
+            self.ignore_char = "".join(set(reader.character) - set(reader.lang_char))
+
+    def detect(self, image):
+        """Finds the text lines on one image and returns their crops in reading order."""
+        if not self.batched:
+            return [image]  # recognized whole by readtext() in recognize()
+        img, img_cv_grey = reformat_input(image)
+        horizontal_list, free_list = self.reader.detect(img)
+        image_list, _ = get_image_list(horizontal_list[0], free_list[0], img_cv_grey,
+                                       model_height=MODEL_HEIGHT)
+        return [crop for _, crop in image_list]
+
+    def recognize(self, crops):
+        """Recognizes text-line crops in width-sorted batches, returns texts in input order."""
+        if not self.batched:
+            return [" ".join(self.reader.readtext(crop, detail=0)) for crop in crops]
+        texts = [""] * len(crops)
+        order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1])
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            max_width = max(math.ceil(crops[i].shape[1] / crops[i].shape[0]) for i in batch) * MODEL_HEIGHT
+            results = get_text(self.reader.character, MODEL_HEIGHT, int(max_width),
+                               self.reader.recognizer, self.reader.converter,
+                               [([[0, 0], [0, 0], [0, 0], [0, 0]], crops[i]) for i in batch],
+                               self.ignore_char, "greedy", 5, len(batch), 0.1, 0.5, 0.003, 0,
+                               self.reader.device)
+            for i, (_, text, _) in zip(batch, results):
+                texts[i] = text
+        return texts
+
+    def read(self, images):
+        """OCRs several images together, returns one joined text per image."""
+        crops_per_image = [self.detect(image) for image in images]
+        texts = self.recognize([crop for crops in crops_per_image for crop in crops])
+        joined, pos = [], 0
+        for crops in crops_per_image:
+            joined.append(" ".join(texts[pos:pos + len(crops)]))
+            pos += len(crops)
+        return joined
@@ -1,24 +1,82 @@
 import os
 import json
+import time
+import queue
+import argparse
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import fitz  # PyMuPDF for reading PDFs
 import easyocr
-import numpy as np
 import cv2
+from ocr_cache import OCRCache, page_fingerprint
+from ocr_jobs import JobQueue, print_status
+from image_preprocessing import PageImage, make_settings, render_page, settings_key
+from ocr_engine import BatchedOCREngine, set_torch_threads
+from case_records import CaseRecordWriter
+from case_metadata import extract_metadata, case_fields
 
 # Input and Output Directories
 INPUT_DIR = "C:/Users/mehta/Downloads/dataset-innovatex-test-input"
 OUTPUT_DIR = "C:/Users/mehta/Downloads/dataset-innovatex-test-output"
 TEXT_FILE = os.path.join(OUTPUT_DIR, "extracted_text.txt")
-JSON_FILE = os.path.join(OUTPUT_DIR, "all_extracted_cases.json")
+RECORDS_FILE = os.path.join(OUTPUT_DIR, "all_extracted_cases.jsonl")  # + ".gz" when compressed
+CACHE_FILE = os.path.join(OUTPUT_DIR, "ocr_cache.sqlite")
+
+OCR_LANGS = ['en']
+
+# Case records are streamed to RECORDS_FILE as each case finishes
+COMPRESS_RECORDS = os.environ.get("OCR_COMPRESS_RECORDS", "0") == "1"
+RECORDS_FSYNC_EVERY = 100  # Cases between fsyncs of the records file
+
+# Rendering and image cleanup before OCR, see image_preprocessing.DEFAULT_SETTINGS
+PREPROCESS_SETTINGS = make_settings()
+
+# Native text layer settings: born-digital pages are read directly, OCR only
+# runs on scanned pages and on images that have no text over them
+NATIVE_TEXT_MIN_CHARS = 200  # Shorter text layers are treated as scanned pages
+NATIVE_TEXT_MIN_QUALITY = float(os.environ.get("NATIVE_TEXT_MIN_QUALITY", "0.85"))  # 0-1, share of sane characters
+IMAGE_REGION_MIN_AREA = 0.05  # Images smaller than this fraction of the page are ignored
+
+# Parallel OCR settings
+NUM_WORKERS = int(os.environ.get("OCR_WORKERS", "1"))  # 1 = serial mode
+PAGES_PER_TASK = 4  # Pages handed to a worker at a time, keeps long judgments spread over the pool
+
+# Recognition settings: text lines from all pages of a task are recognized together
+OCR_BATCH_SIZE = int(os.environ.get("OCR_BATCH_SIZE", "32"))  # Line crops per recognizer call
+OCR_THREADS_PER_WORKER = int(os.environ.get("OCR_THREADS_PER_WORKER", "1"))  # torch intra-op threads per pool worker
 
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# Initialize EasyOCR reader
-reader = easyocr.Reader(['en'])
+# EasyOCR reader and batching engine, created on first use so pool workers each load their own
+reader = None
+engine = None
+
+# Writer for the streamed case records, open while process_pdfs runs
+record_writer = None
+
+# Pages extracted in this run per method ("native", "ocr", "native+ocr") and time spent in OCR
+extraction_stats = {"native": 0, "ocr": 0, "native+ocr": 0, "ocr_seconds": 0.0}
 
-# Dictionary to store all extracted cases
-all_cases = {}
+def get_reader():
+    """Returns the EasyOCR reader for this process, loading it on first use."""
+    global reader
+    if reader is None:
+        reader = easyocr.Reader(OCR_LANGS)
+    return reader
+
+def get_engine():
+    """Returns the batched OCR engine wrapped around this process's reader."""
+    global engine
+    if engine is None:
+        engine = BatchedOCREngine(get_reader(), batch_size=OCR_BATCH_SIZE)
+    return engine
+
+def cache_salt():
+    """Describes the OCR settings the cached page text depends on."""
+    return (f"easyocr:{','.join(OCR_LANGS)};native:{NATIVE_TEXT_MIN_CHARS},"
+            f"{NATIVE_TEXT_MIN_QUALITY},{IMAGE_REGION_MIN_AREA};{settings_key(PREPROCESS_SETTINGS)}")
 
 # Function to preprocess text
 def preprocess_text(text):
@@ -27,69 +85,412 @@ def preprocess_text(text):
     text = " ".join(text.split())  # Remove extra spaces
     return text
 
+def assemble_text(page_texts):
+    """Joins cleaned page texts into the case text, one line per page."""
+    return "".join(text + "\n" for text in page_texts)
+
 # Function to convert PDF page to image (NumPy array)
-def pdf_page_to_image(pdf_page):
-    """Converts a PDF page to an image for OCR processing."""
-    pixmap = pdf_page.get_pixmap()
-    img = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape((pixmap.h, pixmap.w, pixmap.n))
-    return cv2.cvtColor(img, cv2.COLOR_RGB2BGR)  # Convert to BGR for OpenCV
-
-# Process each PDF in the input directory
-def process_pdfs():
-    print("Starting PDF processing...")
-    for filename in os.listdir(INPUT_DIR):
-        if filename.lower().endswith(".pdf"):
-            pdf_path = os.path.join(INPUT_DIR, filename)
-            case_id = os.path.splitext(filename)[0]  # Extract case ID from filename
+def pdf_page_to_image(pdf_page, clip=None):
+    """Converts a PDF page (or the clip rectangle of it) to a PageImage for OCR processing."""
+    return render_page(pdf_page, PREPROCESS_SETTINGS, clip)
+
+def text_layer_quality(text):
+    """Share of characters that look like real text rather than broken font encodings."""
+    if not text:
+        return 0.0
+    good = sum(1 for c in text if c.isalnum() or c.isspace() or c in ".,;:!?()[]/-'\"&%@#")
+    return good / len(text)
+
+def has_text_layer(text):
+    """True if a page's embedded text is long and clean enough to skip OCR."""
+    text = text.strip()
+    return len(text) >= NATIVE_TEXT_MIN_CHARS and text_layer_quality(text) >= NATIVE_TEXT_MIN_QUALITY
+
+def uncovered_image_regions(page):
+    """Returns the rectangles of sizeable images on the page that have no text layer over them."""
+    page_area = abs(page.rect)
+    word_centers = [fitz.Point((w[0] + w[2]) / 2, (w[1] + w[3]) / 2) for w in page.get_text("words")]
+    regions = []
+    for img in page.get_images(full=True):
+        for rect in page.get_image_rects(img[0]):
+            rect = rect & page.rect
+            if rect.is_empty or abs(rect) < IMAGE_REGION_MIN_AREA * page_area:
+                continue
+            if any(point in rect for point in word_centers):
+                continue
+            regions.append(rect)
+    return regions
+
+# Function to decide how a page is read
+def prepare_page(page):
+    """Reads the text layer and renders whatever still needs OCR.
+
+    Returns (native_text, method, images). method is "native" when the text
+    layer covers the page, "native+ocr" when image regions need OCR on top of
+    it and "ocr" for scanned pages.
+    """
+    native_text = page.get_text()
+    if not has_text_layer(native_text):
+        return "", "ocr", [pdf_page_to_image(page)]
+    images = [pdf_page_to_image(page, clip=rect) for rect in uncovered_image_regions(page)]
+    return native_text, ("native+ocr" if images else "native"), images
+
+def read_prepared_pages(prepared_pages):
+    """OCRs the images of several prepared pages in shared recognition batches.
+
+    Detection runs as each page arrives (prepared_pages may be a lazy
+    iterator fed by a render thread), recognition once for all line crops.
+    Returns a (text, method, ocr_seconds) tuple per page.
+    """
+    ocr = get_engine()
+    pages = []
+    for native_text, method, images in prepared_pages:
+        start = time.perf_counter()
+        crops = [ocr.detect(img.image) for img in images]
+        pages.append((native_text, method, crops, time.perf_counter() - start))
+
+    all_crops = [crop for _, _, crops, _ in pages for region in crops for crop in region]
+    start = time.perf_counter()
+    texts = iter(ocr.recognize(all_crops))
+    recognize_per_crop = (time.perf_counter() - start) / len(all_crops) if all_crops else 0.0
+
+    results = []
+    for native_text, method, crops, detect_seconds in pages:
+        parts = [native_text] + [" ".join(next(texts) for _ in region) for region in crops]
+        n_crops = sum(len(region) for region in crops)
+        results.append((" ".join(part for part in parts if part), method,
+                        detect_seconds + n_crops * recognize_per_crop))
+    return results
+
+def record_page(method, ocr_seconds):
+    extraction_stats[method] += 1
+    extraction_stats["ocr_seconds"] += ocr_seconds
+
+def list_pdfs():
+    """Returns the PDF filenames in INPUT_DIR in a stable order."""
+    return sorted(f for f in os.listdir(INPUT_DIR) if f.lower().endswith(".pdf"))
+
+# Function to save one finished case to the output files
+def save_case(filename, extracted_text, page_methods=None):
+    """Writes a case to the combined text file, its own JSON file and the records file.
+
+    page_methods records, per page, whether the text came from the PDF's text
+    layer or from OCR. Court, judge, parties etc. are extracted from the text
+    (case_metadata.py), the full metadata columns go to the "metadata" field.
+    """
+    case_id = os.path.splitext(filename)[0]  # Extract case ID from filename
+
+    # Save extracted text to a common text file
+    with open(TEXT_FILE, "a", encoding="utf-8") as f:
+        f.write(f"--- Extracted Text from: {filename} ---\n")
+        f.write(extracted_text + "\n\n")
+
+    # Create structured data for JSON output
+    metadata = extract_metadata(extracted_text)
+    case_data = {
+        "case_id": case_id,
+        **case_fields(metadata),
+        "metadata": metadata,
+        "page_methods": page_methods,
+        "text": extracted_text
+    }
 
-            print(f"Processing: {filename}...")
+    # Stream into the combined records file
+    record_writer.write(case_data)
 
+    # Save extracted data as an individual JSON file
+    json_path = os.path.join(OUTPUT_DIR, f"{case_id}.json")
+    with open(json_path, "w", encoding="utf-8") as json_file:
+        json.dump(case_data, json_file, ensure_ascii=False, indent=4)
+
+# Document kept open between tasks, consecutive tasks usually hit the same PDF
+_open_doc = {"path": None, "doc": None}
+
+def _init_worker(preprocess_settings, batch_size, threads):
+    """Pool initializer: one EasyOCR reader per worker with its own torch thread budget."""
+    global PREPROCESS_SETTINGS, OCR_BATCH_SIZE
+    PREPROCESS_SETTINGS = preprocess_settings
+    OCR_BATCH_SIZE = batch_size
+    set_torch_threads(threads)  # The pool provides the parallelism, avoid oversubscription
+    cv2.setNumThreads(0)
+    get_engine()
+
+def _get_document(pdf_path):
+    if _open_doc["path"] != pdf_path:
+        if _open_doc["doc"] is not None:
+            _open_doc["doc"].close()
+        _open_doc["doc"] = fitz.open(pdf_path)
+        _open_doc["path"] = pdf_path
+    return _open_doc["doc"]
+
+def _prepare_page(pdf_path, page_no):
+    """prepare_page for the render thread, which alone touches the (not thread-safe) document.
+
+    The images are copied out of their pixmaps, so the pixmaps are freed on
+    this thread too and the OCR thread only gets plain arrays.
+    """
+    native_text, method, images = prepare_page(_get_document(pdf_path)[page_no])
+    return native_text, method, [PageImage(img.image.copy() if img.pixmap is not None else img.image, None, img.dpi)
+                                 for img in images]
+
+def ocr_page_task(task):
+    """Reads a run of pages from one PDF inside a pool worker.
+
+    Pages are prepared (text layer read, scans rasterized) on a helper thread
+    while the main thread runs detection on the ones already rendered, torch
+    releases the GIL so the two overlap. PyMuPDF is not thread-safe, so only
+    the helper thread opens and reads the document. The text lines of all
+    pages are then recognized in shared batches.
+    Returns (filename, page_numbers, results, pid, busy_seconds, error) where
+    results holds a (text, method, ocr_seconds) tuple per page.
+    """
+    pdf_path, page_numbers = task
+    filename = os.path.basename(pdf_path)
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=1) as renderer:  # waits for the renderer, also on errors
+            results = read_prepared_pages(renderer.map(_prepare_page, [pdf_path] * len(page_numbers), page_numbers))
+    except Exception as e:
+        return filename, page_numbers, None, os.getpid(), time.perf_counter() - start, str(e)
+    return filename, page_numbers, results, os.getpid(), time.perf_counter() - start, None
+
+def _fingerprint_pages(doc):
+    return [page_fingerprint(page, cache_salt()) for page in doc]
+
+def _save_cached_case(filename, cache):
+    """Writes a case whose pages are all in the cache to the outputs. Returns False if it isn't complete."""
+    pages = cache.lookup_document(filename, os.path.join(INPUT_DIR, filename), cache_salt())
+    if pages is None:
+        return False
+    if record_writer is not None:  # --worker runs leave the outputs to the main run
+        save_case(filename, assemble_text(text for text, _ in pages), [method for _, method in pages])
+    return True
+
+def enqueue_pdfs(filenames, cache, jobs):
+    """Queues the pages of the PDFs the cache doesn't hold in full, writes the others out.
+
+    Returns the filenames written out.
+    """
+    saved = []
+    for filename in filenames:
+        pdf_path = os.path.join(INPUT_DIR, filename)
+        if _save_cached_case(filename, cache):
+            page_count = cache.document_page_count(filename)
+            jobs.mark_done(filename, pdf_path, page_count)
+            cache.doc_hits += 1
+            cache.page_hits += page_count
+            saved.append(filename)
+            continue
+        cache.doc_misses += 1
+        if jobs.state(filename, pdf_path) in ("pending", "quarantined"):  # resumed, or skipped until it changes
+            continue
+        try:
+            with fitz.open(pdf_path) as doc:
+                page_hashes = _fingerprint_pages(doc)
+        except Exception as e:
+            quarantined = jobs.add_unreadable(filename, pdf_path, str(e))
+            print(f"❌ Error processing {filename}: {e}{' (quarantined)' if quarantined else ''}")
+            continue
+        cached = cache.get_pages(page_hashes)
+        cache.page_hits += sum(h in cached for h in page_hashes)
+        if jobs.add(filename, pdf_path, page_hashes, cached, cache_salt()) and _save_cached_case(filename, cache):
+            saved.append(filename)
+    return saved
+
+def _print_throughput(worker_stats, total_pages, elapsed):
+    print(f"\n📊 OCR throughput: {total_pages} pages in {elapsed:.1f}s "
+          f"({total_pages / elapsed if elapsed else 0:.2f} pages/sec overall)")
+    for n, (pid, (pages, busy)) in enumerate(sorted(worker_stats.items()), 1):
+        rate = pages / busy if busy else 0
+        print(f"   worker {n} (pid {pid}): {pages} pages, {busy:.1f}s busy, {rate:.2f} pages/sec")
+
+# Work through the job queue, with a pool of OCR workers or in this process
+def process_jobs(jobs, cache, num_workers=NUM_WORKERS, pages_per_task=PAGES_PER_TASK):
+    """OCRs queued pages until none can be claimed. Returns the filenames completed.
+
+    Tasks are runs of up to pages_per_task pages of one PDF, whose text
+    lines are recognized in shared batches. With num_workers > 1 they are
+    spread over a pool of workers, up to two tasks per worker claimed at a
+    time, serially one task is claimed at a time. Every finished task is
+    checkpointed into the cache.
+    """
+    start = time.perf_counter()
+    worker_stats = defaultdict(lambda: [0, 0.0])  # pid -> [pages, busy seconds]
+    results = queue.Queue()
+    in_flight = {}  # (filename, first page) -> deadline of the claim's lease
+    completed = []
+    pool = None
+    if num_workers > 1:
+        # spawn keeps workers independent of any torch state in the parent
+        ctx = multiprocessing.get_context("spawn")
+        init_args = (PREPROCESS_SETTINGS, OCR_BATCH_SIZE, OCR_THREADS_PER_WORKER)
+        pool = ctx.Pool(num_workers, initializer=_init_worker, initargs=init_args)
+        print(f"Processing the OCR queue on {num_workers} workers...")
+    try:
+        while True:
+            while len(in_flight) < (2 * num_workers if pool else 1):
+                task = jobs.claim(pages_per_task)
+                if task is None:
+                    break
+                filename, page_numbers = task
+                in_flight[(filename, page_numbers[0])] = time.monotonic() + jobs.lease
+                task = (os.path.join(INPUT_DIR, filename), page_numbers)
+                if pool is None:
+                    print(f"Processing: {filename} pages {page_numbers[0] + 1}-{page_numbers[-1] + 1}...")
+                    results.put(ocr_page_task(task))
+                else:
+                    pool.apply_async(ocr_page_task, (task,), callback=results.put)
+            if not in_flight:
+                wait = jobs.next_retry()
+                if wait is None:
+                    break
+                print(f"Waiting {wait:.0f}s to retry failed pages...")
+                time.sleep(wait)
+                continue
             try:
-                # Open the PDF
-                extracted_text = ""
-                doc = fitz.open(pdf_path)
-
-                for page in doc:
-                    img = pdf_page_to_image(page)  # Convert page to image
-                    text = reader.readtext(img, detail=0)  # Extract text using EasyOCR
-                    text = " ".join(text)
-                    extracted_text += preprocess_text(text) + "\n"
-
-                # Save extracted text to a common text file
-                with open(TEXT_FILE, "a", encoding="utf-8") as f:
-                    f.write(f"--- Extracted Text from: {filename} ---\n")
-                    f.write(extracted_text + "\n\n")
-
-                # Create structured data for JSON output
-                case_data = {
-                    "case_id": case_id,
-                    "court_name": None,
-                    "judge_name": None,
-                    "case_number": None,
-                    "date": None,
-                    "petitioner": None,
-                    "accused": None,
-                    "respondent": None,
-                    "text": extracted_text
-                }
-
-                # Store in combined dictionary
-                all_cases[case_id] = case_data
-
-                # Save extracted data as an individual JSON file
-                json_path = os.path.join(OUTPUT_DIR, f"{case_id}.json")
-                with open(json_path, "w", encoding="utf-8") as json_file:
-                    json.dump(case_data, json_file, ensure_ascii=False, indent=4)
-
-            except Exception as e:
-                print(f"❌ Error processing {filename}: {e}")
+                filename, page_numbers, pages, pid, busy, error = results.get(timeout=5)
+            except queue.Empty:
+                # A pool worker killed mid-task never reports back; the lease expiry requeues its pages
+                now = time.monotonic()
+                for key in [key for key, deadline in in_flight.items() if deadline < now]:
+                    del in_flight[key]
+                continue
+            if in_flight.pop((filename, page_numbers[0]), None) is None:  # reported after its lease ran out
                 continue
+            worker_stats[pid][1] += busy
+            if error is not None:
+                quarantined = jobs.fail(filename, page_numbers, error)
+                pages = ", ".join(str(n + 1) for n in page_numbers)
+                print(f"❌ Error processing {filename} (page {pages}): {error}"
+                      f"{' (quarantined)' if quarantined else ', will retry'}")
+                continue
+            worker_stats[pid][0] += len(page_numbers)
+            for text, method, ocr_seconds in pages:
+                record_page(method, ocr_seconds)
+            cache.page_misses += len(page_numbers)
+
+            # Pages are checkpointed as they come in, the document once its last page is in
+            if jobs.complete(filename, [(page_no, preprocess_text(text), method, ocr_seconds)
+                                        for page_no, (text, method, ocr_seconds) in zip(page_numbers, pages)]):
+                print(f"Processed: {filename}")
+                if _save_cached_case(filename, cache):
+                    completed.append(filename)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    total_pages = sum(pages for pages, _ in worker_stats.values())
+    if total_pages:
+        _print_throughput(worker_stats, total_pages, time.perf_counter() - start)
+    return completed
+
+def report_extraction():
+    """Prints how the pages extracted in this run were read and the OCR time avoided."""
+    native = extraction_stats["native"]
+    ocr_pages = extraction_stats["ocr"] + extraction_stats["native+ocr"]
+    if not native and not ocr_pages:
+        return
+    print(f"📄 Pages read: {native} from the text layer, {extraction_stats['ocr']} OCR'd, "
+          f"{extraction_stats['native+ocr']} text layer + OCR of image regions")
+    if native and ocr_pages:
+        per_page = extraction_stats["ocr_seconds"] / ocr_pages
+        print(f"   ≈{native * per_page:.1f}s of OCR skipped ({per_page:.2f}s per OCR'd page)")
+
+def records_path(compress=None):
+    """Path of the streamed case records, .jsonl.gz when compressed."""
+    compress = COMPRESS_RECORDS if compress is None else compress
+    return RECORDS_FILE + ".gz" if compress else RECORDS_FILE
+
+def process_pdfs(num_workers=NUM_WORKERS, prune_cache=False, write_outputs=True):
+    """OCRs new and changed PDFs through the job queue and rebuilds the outputs.
+
+    write_outputs=False only works through the queue, for extra worker runs
+    next to the one that writes extracted_text.txt and the case records.
+    """
+    global record_writer
+    print("Starting PDF processing...")
+
+    # The combined outputs are rebuilt on every run, cached cases are copied over
+    if write_outputs:
+        open(TEXT_FILE, "w", encoding="utf-8").close()
+        record_writer = CaseRecordWriter(records_path(), fsync_every=RECORDS_FSYNC_EVERY)
+
+    cache = OCRCache(CACHE_FILE)
+    jobs = JobQueue(cache)
+    try:
+        filenames = list_pdfs()
+        if prune_cache:
+            print(f"Pruned {cache.prune(filenames)} deleted PDFs from the OCR cache")
+        jobs.prune(filenames)
+        recovered = jobs.recover()
+        if recovered:
+            print(f"Released {recovered} pages claimed by worker processes that died")
+
+        saved = set(enqueue_pdfs(filenames, cache, jobs))
+        saved.update(process_jobs(jobs, cache, num_workers))
+
+        # PDFs finished by other worker runs meanwhile
+        missing = [f for f in filenames if f not in saved and not _save_cached_case(f, cache)]
+        status = jobs.status()
+    finally:
+        cache.close()
+        if record_writer is not None:
+            record_writer.close()
+            record_writer = None
 
-    # Save all extracted cases into a single JSON file
-    with open(JSON_FILE, "w", encoding="utf-8") as json_file:
-        json.dump(all_cases, json_file, ensure_ascii=False, indent=4)
+    if write_outputs:
+        print(f"Case records written to {records_path()}")
+    cache.report()
+    report_extraction()
+    print_status(status)
+    if missing:
+        print(f"⚠️ {len(missing)} PDFs are not in the outputs yet: quarantined, waiting to be retried or still "
+              f"being processed by another worker (python ocr_extraction.py --status)")
+    else:
+        print("✅ OCR processing completed successfully!")
 
-    print("✅ OCR processing completed successfully!")
+def show_status(retry_quarantined=False):
+    """Prints the job queue's progress, ETA and failures without processing anything."""
+    cache = OCRCache(CACHE_FILE)
+    try:
+        jobs = JobQueue(cache)
+        if retry_quarantined:
+            print(f"Released {jobs.retry_quarantined()} quarantined PDFs for another try")
+        print_status(jobs.status())
+    finally:
+        cache.close()
 
 if __name__ == "__main__":
-    process_pdfs() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="OCR the judgment PDFs in INPUT_DIR.")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS,
+                        help="number of OCR worker processes (1 runs serially)")
+    parser.add_argument("--prune-cache", action="store_true",
+                        help="forget deleted PDFs and unreferenced pages in the OCR cache")
+    parser.add_argument("--dpi", help="render DPI, or 'auto' to pick one per page from glyph size")
+    parser.add_argument("--color", action="store_true", help="render RGB instead of grayscale")
+    parser.add_argument("--deskew", action="store_true", help="straighten skewed scans before OCR")
+    parser.add_argument("--binarize", choices=["otsu", "adaptive"], help="threshold pages before OCR")
+    parser.add_argument("--ocr-batch-size", type=int, default=OCR_BATCH_SIZE,
+                        help="text-line crops per recognition batch")
+    parser.add_argument("--ocr-threads", type=int,
+                        help=f"torch intra-op threads per worker (default {OCR_THREADS_PER_WORKER}, "
+                             "serial mode keeps torch's default unless given)")
+    parser.add_argument("--compress", action="store_true", help="write the case records as .jsonl.gz")
+    parser.add_argument("--worker", action="store_true",
+                        help="only work through the OCR queue, next to a run that writes the outputs")
+    parser.add_argument("--status", action="store_true", help="show the OCR queue's progress, ETA and failures")
+    parser.add_argument("--retry-quarantined", action="store_true",
+                        help="give quarantined PDFs another OCR_MAX_ATTEMPTS tries")
+    args = parser.parse_args()
+    if args.status or args.retry_quarantined:
+        show_status(args.retry_quarantined)
+        raise SystemExit
+    COMPRESS_RECORDS = COMPRESS_RECORDS or args.compress
+    OCR_BATCH_SIZE = args.ocr_batch_size
+    OCR_THREADS_PER_WORKER = args.ocr_threads or OCR_THREADS_PER_WORKER
+    if args.workers <= 1:
+        set_torch_threads(args.ocr_threads)
+    PREPROCESS_SETTINGS = make_settings(dpi=args.dpi, deskew=args.deskew or None, binarize=args.binarize,
+                                        grayscale=False if args.color else None)
+    process_pdfs(args.workers, prune_cache=args.prune_cache, write_outputs=not args.worker)
@@ -0,0 +1,343 @@
+import os
+import time
+import random
+import socket
+
+# Durable OCR job queue.
+#
+# The queue lives in the OCR cache database (ocr_cache.py). Every PDF that
+# still needs OCR is a job, and each of its pages is tracked on its own. A
+# worker claims a run of pending pages of one PDF, then OCRs them. It stores
+# their text in the cache and marks them done in the same transaction. The
+# PDF itself is recorded in the cache in that transaction too, once its last
+# page is done. An interrupted run therefore loses only the pages in
+# flight, and the next run resumes from there.
+#
+# Claims are taken with an immediate write lock on the database, so several
+# runs (`ocr_extraction.py --worker`) can share one queue. A claim is a
+# lease: pages whose worker died or hung are released when the lease runs
+# out. Pages of a dead worker process on the same host are released at the
+# next start. A failed page is retried after a backoff that doubles per
+# attempt. A PDF with a page that fails OCR_MAX_ATTEMPTS times, or that
+# cannot be opened that often, is quarantined and skipped until it changes
+# or is released with --retry-quarantined. Crashes count as attempts, so a
+# PDF that kills its worker is quarantined too.
+
+OCR_MAX_ATTEMPTS = int(os.environ.get("OCR_MAX_ATTEMPTS", "3"))
+OCR_RETRY_BACKOFF = float(os.environ.get("OCR_RETRY_BACKOFF", "30"))  # seconds before the first retry, doubling
+OCR_RETRY_BACKOFF_MAX = 3600
+OCR_LEASE_SECONDS = float(os.environ.get("OCR_LEASE_SECONDS", "900"))  # a claimed task must finish within this
+RATE_WINDOW = 600  # seconds of finished pages the status ETA is based on
+
+# jobs.state: pending (pages queued), failed (could not be opened, planned
+# again on the next run), done, quarantined
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    filename TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    state TEXT NOT NULL,
+    page_count INTEGER,
+    salt TEXT NOT NULL DEFAULT '',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_pages (
+    filename TEXT NOT NULL,
+    page_no INTEGER NOT NULL,
+    page_hash TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    not_before REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    seconds REAL,
+    finished_at REAL,
+    PRIMARY KEY (filename, page_no)
+);
+CREATE INDEX IF NOT EXISTS job_pages_state ON job_pages (state, not_before);
+"""
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _worker_alive(worker):
+    """False only for a process of this host that no longer exists."""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit() or os.name == "nt":  # os.kill(pid, 0) terminates on Windows
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def backoff(attempts, base=OCR_RETRY_BACKOFF):
+    """Seconds before retry number `attempts`, with jitter so failed pages don't retry in lockstep."""
+    return min(base * 2 ** (attempts - 1), OCR_RETRY_BACKOFF_MAX) * random.uniform(0.75, 1.0)
+
+def _duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds // 3600:.0f}h{seconds % 3600 / 60:02.0f}m"
+
+class JobQueue:
+    """Per-document and per-page OCR state, stored with the OCRCache it checkpoints into."""
+
+    def __init__(self, cache, worker=None, max_attempts=OCR_MAX_ATTEMPTS, lease=OCR_LEASE_SECONDS):
+        self.cache = cache
+        self.conn = cache.conn
+        self.conn.executescript(SCHEMA)
+        if "salt" not in [row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")]:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN salt TEXT NOT NULL DEFAULT ''")
+        self.worker = worker or worker_id()
+        self.max_attempts = max_attempts
+        self.lease = lease
+
+    def state(self, filename, pdf_path):
+        """The job's state, or None if the PDF is not queued or has changed since (its job is then dropped)."""
+        row = self.conn.execute("SELECT state, size, mtime FROM jobs WHERE filename = ?", (filename,)).fetchone()
+        if row is None:
+            return None
+        st = os.stat(pdf_path)
+        if (st.st_size, st.st_mtime) != (row[1], row[2]):
+            self._drop(filename)
+            return None
+        return row[0]
+
+    def _drop(self, filename):
+        self.conn.execute("DELETE FROM jobs WHERE filename = ?", (filename,))
+        self.conn.execute("DELETE FROM job_pages WHERE filename = ?", (filename,))
+        self.conn.commit()
+
+    def _upsert(self, filename, pdf_path, state, page_count=None, attempts=0, error=None, salt=""):
+        st = os.stat(pdf_path)
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs (filename, path, size, mtime, state, page_count, salt, attempts, "
+            "last_error, enqueued_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (filename, pdf_path, st.st_size, st.st_mtime, state, page_count, salt, attempts, error, now,
+             now if state == "done" else None))
+
+    def mark_done(self, filename, pdf_path, page_count):
+        """Records a PDF the cache already holds in full."""
+        if self.state(filename, pdf_path) != "done":
+            self.conn.execute("DELETE FROM job_pages WHERE filename = ?", (filename,))
+            self._upsert(filename, pdf_path, "done", page_count)
+            self.conn.commit()
+
+    def add(self, filename, pdf_path, page_hashes, cached=(), salt=""):
+        """Queues a PDF's pages; pages whose hash is in `cached` are done already.
+
+        `salt` is the one the page hashes were fingerprinted with, a PDF
+        done with other settings is queued again.
+        Returns True if that completed the PDF (every page was cached).
+        """
+        self.conn.commit()
+        self.conn.execute("BEGIN IMMEDIATE")
+        state = self.state(filename, pdf_path)
+        if state in ("pending", "quarantined") or (  # queued or finished by another run meanwhile
+                state == "done" and self.cache.lookup_document(filename, pdf_path, salt) is not None):
+            self.conn.commit()
+            return False
+        self.conn.execute("DELETE FROM job_pages WHERE filename = ?", (filename,))
+        self._upsert(filename, pdf_path, "pending", len(page_hashes), salt=salt)
+        self.conn.executemany(
+            "INSERT INTO job_pages (filename, page_no, page_hash, state) VALUES (?, ?, ?, ?)",
+            [(filename, n, h, "done" if h in cached else "pending") for n, h in enumerate(page_hashes)])
+        return self._finish_if_complete(filename)
+
+    def add_unreadable(self, filename, pdf_path, error):
+        """Records a PDF that could not be opened. Returns True if it is now quarantined."""
+        row = self.conn.execute("SELECT attempts FROM jobs WHERE filename = ?", (filename,)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        state = "quarantined" if attempts >= self.max_attempts else "failed"
+        self._upsert(filename, pdf_path, state, attempts=attempts, error=error)
+        self.conn.commit()
+        return state == "quarantined"
+
+    def prune(self, filenames):
+        """Forgets the jobs of PDFs that are no longer in the input directory."""
+        keep = set(filenames)
+        stale = [f for (f,) in self.conn.execute("SELECT filename FROM jobs") if f not in keep]
+        for filename in stale:
+            self._drop(filename)
+        return len(stale)
+
+    def recover(self):
+        """Fails the running pages of dead worker processes on this host. Returns how many."""
+        rows = self.conn.execute("SELECT filename, page_no, worker FROM job_pages WHERE state = 'running'").fetchall()
+        dead = [(filename, page_no) for filename, page_no, worker in rows if not _worker_alive(worker)]
+        for filename, page_no in dead:
+            self._fail_page(filename, page_no, "worker process died")
+        self.conn.commit()
+        return len(dead)
+
+    def claim(self, max_pages):
+        """Leases up to max_pages claimable pages of one PDF. Returns (filename, page numbers) or None."""
+        self.conn.commit()
+        self.conn.execute("BEGIN IMMEDIATE")  # one claimer at a time across processes
+        try:
+            task = self._claim(time.time(), max_pages)
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        return task
+
+    def _claim(self, now, max_pages):
+        expired = self.conn.execute(
+            "SELECT filename, page_no, worker FROM job_pages WHERE state = 'running' AND lease_until < ?",
+            (now,)).fetchall()
+        for filename, page_no, worker in expired:
+            self._fail_page(filename, page_no, f"lease expired, worker {worker} died or hung")
+        row = self.conn.execute(
+            "SELECT p.filename FROM job_pages p JOIN jobs j ON j.filename = p.filename "
+            "WHERE j.state = 'pending' AND p.state = 'pending' AND p.not_before <= ? "
+            "ORDER BY j.enqueued_at, p.filename LIMIT 1", (now,)).fetchone()
+        if row is None:
+            return None
+        filename = row[0]
+        pages = [n for (n,) in self.conn.execute(
+            "SELECT page_no FROM job_pages WHERE filename = ? AND state = 'pending' AND not_before <= ? "
+            "ORDER BY page_no LIMIT ?", (filename, now, max_pages))]
+        self.conn.executemany(
+            "UPDATE job_pages SET state = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 "
+            "WHERE filename = ? AND page_no = ?",
+            [(self.worker, now + self.lease, filename, n) for n in pages])
+        return filename, pages
+
+    def complete(self, filename, pages):
+        """Checkpoints OCR'd pages, (page_no, text, method, seconds) each, into the cache.
+
+        Returns True if this finished the PDF; the cache then holds it as a
+        complete document, committed with its last pages.
+        """
+        now = time.time()
+        hashes = dict(self.conn.execute("SELECT page_no, page_hash FROM job_pages WHERE filename = ?", (filename,)))
+        for page_no, text, method, seconds in pages:
+            self.cache.put_page(hashes[page_no], text, method)
+            self.conn.execute(
+                "UPDATE job_pages SET state = 'done', worker = NULL, lease_until = NULL, seconds = ?, "
+                "finished_at = ? WHERE filename = ? AND page_no = ?", (seconds, now, filename, page_no))
+        return self._finish_if_complete(filename)
+
+    def _finish_if_complete(self, filename):
+        finished = self.conn.execute(
+            "UPDATE jobs SET state = 'done', finished_at = ? WHERE filename = ? AND state = 'pending' AND NOT EXISTS "
+            "(SELECT 1 FROM job_pages WHERE filename = ? AND state != 'done')",
+            (time.time(), filename, filename)).rowcount == 1
+        if not finished:
+            self.conn.commit()
+            return False
+        path, salt = self.conn.execute("SELECT path, salt FROM jobs WHERE filename = ?", (filename,)).fetchone()
+        hashes = [h for (h,) in self.conn.execute(
+            "SELECT page_hash FROM job_pages WHERE filename = ? ORDER BY page_no", (filename,))]
+        self.cache.put_document(filename, path, hashes, salt)  # commits the pages and the document together
+        return True
+
+    def fail(self, filename, page_numbers, error):
+        """Records a failed task. Returns True if its PDF is now quarantined."""
+        held = {n for (n,) in self.conn.execute(
+            "SELECT page_no FROM job_pages WHERE filename = ? AND state = 'running' AND worker = ?",
+            (filename, self.worker))}
+        for page_no in page_numbers:
+            if page_no in held:  # not if its lease ran out and another worker has it now
+                self._fail_page(filename, page_no, error)
+        self.conn.commit()
+        return self.conn.execute("SELECT state FROM jobs WHERE filename = ?", (filename,)).fetchone()[0] == "quarantined"
+
+    def _fail_page(self, filename, page_no, error):
+        attempts = self.conn.execute("SELECT attempts FROM job_pages WHERE filename = ? AND page_no = ?",
+                                     (filename, page_no)).fetchone()[0]
+        self.conn.execute(
+            "UPDATE job_pages SET state = 'pending', worker = NULL, lease_until = NULL, failures = failures + 1, "
+            "last_error = ?, not_before = ? WHERE filename = ? AND page_no = ?",
+            (error, time.time() + backoff(attempts), filename, page_no))
+        if attempts >= self.max_attempts:
+            self.conn.execute("UPDATE jobs SET state = 'quarantined', last_error = ? WHERE filename = ?",
+                              (f"page {page_no + 1}: {error}", filename))
+
+    def next_retry(self):
+        """Seconds until a page waiting for its retry can be claimed, None if no page is waiting."""
+        row = self.conn.execute(
+            "SELECT MIN(p.not_before) FROM job_pages p JOIN jobs j ON j.filename = p.filename "
+            "WHERE j.state = 'pending' AND p.state = 'pending'").fetchone()
+        return None if row[0] is None else max(row[0] - time.time(), 0.0)
+
+    def retry_quarantined(self):
+        """Queues the quarantined PDFs again with fresh attempts. Returns how many."""
+        released = self.conn.execute(
+            "UPDATE jobs SET state = CASE WHEN page_count IS NULL THEN 'failed' ELSE 'pending' END, attempts = 0 "
+            "WHERE state = 'quarantined'").rowcount
+        self.conn.execute(
+            "UPDATE job_pages SET attempts = 0, not_before = 0 WHERE state = 'pending' AND filename IN "
+            "(SELECT filename FROM jobs WHERE state = 'pending')")
+        self.conn.commit()
+        return released
+
+    def status(self):
+        """Progress counts, the recent page rate and the quarantined PDFs."""
+        now = time.time()
+        documents = {state: (count, pages or 0) for state, count, pages in self.conn.execute(
+            "SELECT state, COUNT(*), SUM(page_count) FROM jobs GROUP BY state")}
+        pages = dict(self.conn.execute(
+            "SELECT p.state, COUNT(*) FROM job_pages p JOIN jobs j ON j.filename = p.filename "
+            "WHERE j.state = 'pending' GROUP BY p.state"))
+        waiting = self.conn.execute(
+            "SELECT COUNT(*) FROM job_pages p JOIN jobs j ON j.filename = p.filename "
+            "WHERE j.state = 'pending' AND p.state = 'pending' AND p.not_before > ?", (now,)).fetchone()[0]
+        in_progress = self.conn.execute(
+            "SELECT COUNT(DISTINCT p.filename) FROM job_pages p JOIN jobs j ON j.filename = p.filename "
+            "WHERE j.state = 'pending' AND p.state IN ('running', 'done')").fetchone()[0]
+        workers = dict(self.conn.execute(
+            "SELECT worker, COUNT(*) FROM job_pages WHERE state = 'running' GROUP BY worker"))
+        recent, first = self.conn.execute(
+            "SELECT COUNT(*), MIN(finished_at) FROM job_pages WHERE finished_at >= ?", (now - RATE_WINDOW,)).fetchone()
+        failures = (self.conn.execute("SELECT COALESCE(SUM(failures), 0) FROM job_pages").fetchone()[0]
+                    + self.conn.execute("SELECT COALESCE(SUM(attempts), 0) FROM jobs WHERE page_count IS NULL"
+                                        ).fetchone()[0])
+        quarantined = self.conn.execute(
+            "SELECT filename, last_error FROM jobs WHERE state = 'quarantined' ORDER BY filename").fetchall()
+        remaining = pages.get("pending", 0) + pages.get("running", 0)
+        rate = recent / max(now - first, 1.0) if recent else 0.0
+        return {
+            "documents": {state: count for state, (count, _) in documents.items()},
+            "documents_in_progress": in_progress,
+            "pages_total": sum(n for _, n in documents.values()),
+            "pages_done": documents.get("done", (0, 0))[1] + pages.get("done", 0),
+            "pages_remaining": remaining,
+            "pages_running": pages.get("running", 0),
+            "pages_waiting_retry": waiting,
+            "workers": workers,
+            "pages_per_second": rate,
+            "eta_seconds": remaining / rate if rate else None,
+            "failed_attempts": failures,
+            "quarantined": quarantined,
+        }
+
+def print_status(status):
+    documents = status["documents"]
+    print(f"📋 OCR jobs: {sum(documents.values())} PDFs, {documents.get('done', 0)} done, "
+          f"{documents.get('pending', 0)} queued ({status['documents_in_progress']} in progress), "
+          f"{documents.get('failed', 0)} unreadable, {documents.get('quarantined', 0)} quarantined")
+    print(f"   Pages: {status['pages_done']}/{status['pages_total']} done, {status['pages_running']} running on "
+          f"{len(status['workers'])} workers, {status['pages_waiting_retry']} waiting to retry")
+    if status["pages_per_second"]:
+        eta = status["eta_seconds"]
+        print(f"   Rate: {status['pages_per_second']:.2f} pages/sec over the last {RATE_WINDOW // 60} min, "
+              f"ETA {_duration(eta) if eta else 'now'}")
+    elif status["pages_remaining"]:
+        print(f"   Rate: no pages finished in the last {RATE_WINDOW // 60} min, no ETA")
+    print(f"   Failures: {status['failed_attempts']} failed attempts, {len(status['quarantined'])} quarantined PDFs")
+    for filename, error in status["quarantined"]:
+        print(f"      {filename}: {error}")
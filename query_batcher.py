@@ -0,0 +1,170 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+from query_cache import embedding_cache, encode_query
+from lexical_index import SEARCH_MODE, SEARCH_MODES, reciprocal_rank_fusion
+import telemetry
+
+# Micro-batching of concurrent queries.
+#
+# Under load every request ran its own one-row encode and its own one-row
+# index search. With batching, requests hand their query to one worker
+# thread. The worker waits up to QUERY_BATCH_WAIT_MS for more queries (at
+# most QUERY_BATCH_SIZE), encodes them in a single batch, then searches the
+# stacked query matrix once per distinct set of search parameters. Each
+# request blocks on its own future until its hits are ready. The worker only
+# waits while requests are overlapping (the previous batch held more than one
+# query), so a lone request at low load is not delayed.
+#
+# Lexical (BM25) searches need no encoding and run in the calling thread; a
+# hybrid search fuses them with the batched vector search of the same query.
+#
+# The worker thread is started by the first queued query of each process:
+# under a preforking server (serving.py) the batcher is created before the
+# fork, and threads do not survive a fork.
+#
+# Stage timings (queue, encode, search, lexical, fuse) go to telemetry. A
+# query's trace is queued with it, so each query in a batch is credited
+# with the batch's encode and search time.
+
+QUERY_BATCHING = os.environ.get("QUERY_BATCHING", "1") == "1"
+QUERY_BATCH_SIZE = int(os.environ.get("QUERY_BATCH_SIZE", "32"))
+QUERY_BATCH_WAIT_MS = float(os.environ.get("QUERY_BATCH_WAIT_MS", "2"))
+HYBRID_DEPTH = 50  # Cases taken from each ranking before fusion
+
+class QueryBatcher:
+    """Coalesces concurrent case searches into batched encode + search calls."""
+
+    def __init__(self, embedding_model, max_batch=QUERY_BATCH_SIZE, max_wait_ms=QUERY_BATCH_WAIT_MS,
+                 enabled=QUERY_BATCHING):
+        self.embedding_model = embedding_model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.enabled = enabled and max_batch > 1
+        self.batches = self.queries = 0
+        self._last_batch = 1
+        self._queue = queue.Queue()
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+    def search_cases(self, case_index, query, top_k, aggregate="max", nprobe=None, ef_search=None, case_ids=None,
+                     mode=SEARCH_MODE):
+        """case_index.search_cases for one query string. Returns that query's hits.
+
+        mode is "vector", "lexical" (BM25) or "hybrid" (both, reciprocal rank
+        fusion). Searches restricted to case_ids (metadata filters) run in the
+        calling thread.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        if mode == "lexical":
+            with telemetry.timed("lexical"):
+                return case_index.search_lexical([query], top_k, aggregate, case_ids)[0]
+        if mode == "vector":
+            return self._search_vector(case_index, query, top_k, aggregate, nprobe, ef_search, case_ids).result()
+        depth = max(top_k, HYBRID_DEPTH)
+        # The vector search is queued first, BM25 runs here while it waits for its batch
+        vector_hits = self._search_vector(case_index, query, depth, aggregate, nprobe, ef_search, case_ids)
+        with telemetry.timed("lexical"):
+            lexical_hits = case_index.search_lexical([query], depth, aggregate, case_ids)[0]
+        vector_hits = vector_hits.result()
+        with telemetry.timed("fuse"):
+            return reciprocal_rank_fusion([vector_hits, lexical_hits], top_k)
+
+    def _search_vector(self, case_index, query, top_k, aggregate, nprobe, ef_search, case_ids):
+        """Future of the query's vector search hits, queued for the worker when batching applies."""
+        future = Future()
+        if not self.enabled or case_ids is not None:
+            with telemetry.timed("encode"):
+                query_embedding = encode_query(self.embedding_model, query, case_index.version)
+            with telemetry.timed("search"):
+                future.set_result(case_index.search_cases(query_embedding, top_k, aggregate, nprobe, ef_search,
+                                                          case_ids)[0])
+            return future
+        params = (top_k, aggregate, nprobe, ef_search)
+        hash(params)  # bad arguments fail here, not in the shared batch
+        if self._worker_pid != os.getpid():
+            self._start_worker()
+        self._queue.put((case_index, query, params, future, telemetry.current_trace(), time.perf_counter()))
+        return future
+
+    def stats(self):
+        return {"batches": self.batches, "queries": self.queries,
+                "avg_batch": round(self.queries / self.batches, 2) if self.batches else 0.0}
+
+    def _start_worker(self):
+        with self._start_lock:
+            if self._worker_pid != os.getpid():
+                self._queue = queue.Queue()  # a copy made by fork may hold a locked mutex
+                threading.Thread(target=self._run, name="query-batcher", daemon=True).start()
+                self._worker_pid = os.getpid()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + (self.max_wait if self._last_batch > 1 else 0)
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Past the deadline, still take whatever is already queued
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._last_batch = len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._process(batch)
+            except Exception as e:
+                for _, _, _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _process(self, batch):
+        self.batches += 1
+        self.queries += len(batch)
+        started = time.perf_counter()
+        embeddings = self._encode(batch)
+        encoded = time.perf_counter()
+        for *_, trace, queued in batch:
+            telemetry.observe("queue", started - queued, trace)
+            telemetry.observe("encode", encoded - started, trace)
+        groups = {}
+        for i, (case_index, _, params, *_) in enumerate(batch):
+            groups.setdefault((id(case_index), params), []).append(i)
+        for members in groups.values():
+            case_index, _, (top_k, aggregate, nprobe, ef_search), *_ = batch[members[0]]
+            start = time.perf_counter()
+            try:
+                results = case_index.search_cases(embeddings[members], top_k, aggregate, nprobe, ef_search)
+            except Exception as e:  # only this group's requests fail
+                for i in members:
+                    batch[i][3].set_exception(e)
+                continue
+            seconds = time.perf_counter() - start
+            for i, hits in zip(members, results):
+                telemetry.observe("search", seconds, batch[i][4])
+                batch[i][3].set_result(hits)
+
+    def _encode(self, batch):
+        """Stacked query embeddings; only distinct cache misses go through the model."""
+        rows = [embedding_cache.get(query, case_index.version) for case_index, query, *_ in batch]
+        missing = {}
+        for i, row in enumerate(rows):
+            if row is None:
+                missing.setdefault(batch[i][1], []).append(i)
+        if missing:
+            queries = list(missing)
+            encoded = self.embedding_model.encode(queries, batch_size=len(queries), convert_to_numpy=True)
+            for query, vector in zip(queries, encoded):
+                row = vector[None, :].copy()
+                row.setflags(write=False)
+                for i in missing[query]:
+                    rows[i] = row
+                embedding_cache.put(query, row, batch[missing[query][0]][0].version)
+        return np.vstack(rows)
@@ -0,0 +1,86 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# In-process caches for the retrieval path.
+#
+# The frontend sends the same queries over and over (judge names, common
+# keywords), so query embeddings are kept in an LRU cache and finished
+# top-k results in a second, TTL'd one. Every lookup passes the version of
+# the index it is about to search (CaseIndex.version, new for every published
+# index); a cache that sees a new version drops everything it holds, so a
+# rebuilt, updated or compacted index never serves stale results.
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "300"))  # seconds
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional TTL, tied to one index version."""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self.version = version
+
+    def get(self, key, version):
+        """Returns the cached value, or None on a miss."""
+        with self._lock:
+            self._check_version(version)
+            entry = self._data.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[1] > self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, version):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations}
+
+embedding_cache = LRUCache(EMBEDDING_CACHE_SIZE)
+result_cache = LRUCache(RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+def encode_query(embedding_model, query, version):
+    """embedding_model.encode([query]) through the embedding cache, a read-only (1, d) array."""
+    embedding = embedding_cache.get(query, version)
+    if embedding is None:
+        embedding = embedding_model.encode([query], convert_to_numpy=True)
+        embedding.setflags(write=False)
+        embedding_cache.put(query, embedding, version)
+    return embedding
+
+def cache_stats():
+    return {"embeddings": embedding_cache.stats(), "results": result_cache.stats()}
@@ -1,65 +1,78 @@
-import os
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
+import logging
+import telemetry
+from index_store import MODEL_NAME, LiveIndex
+from encoders import load_encoder
+from query_cache import result_cache
+from query_batcher import QueryBatcher
+from lexical_index import SEARCH_MODE
+from shards import SHARDS, ShardCoordinator
 
-# Load the extracted text
-EXTRACTED_TEXT_FILE = "C:\\Users\\mehta\\Downloads\\dataset-innovatex-test-output\\extracted_text.txt"
-MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"  # Lightweight, fast, and free
+telemetry.configure_logging()  # LOG_LEVEL, LOG_FORMAT
+log = logging.getLogger(__name__)
 
-# Load embedding model
-embedding_model = SentenceTransformer(MODEL_NAME)
+# Load embedding model (ENCODER_BACKEND: torch, onnx or onnx-int8)
+embedding_model = load_encoder(MODEL_NAME)
 
-# Read and logically separate cases
-def load_cases(file_path):
-    cases = []
-    with open(file_path, "r", encoding="utf-8") as f:
-        text = f.read()
-    
-    # Assuming cases are separated by "--- Extracted Text from:"
-    raw_cases = text.split("--- Extracted Text from:")[1:]
-    for case in raw_cases:
-        case = case.strip()
-        if case:
-            cases.append(case)
-    return cases
+# With SHARDS set the shard servers hold the index (see shards.py) and
+# every search is scattered to them
+coordinator = live_index = batcher = None
+if SHARDS:
+    coordinator = ShardCoordinator(embedding_model)
+    log.info("searching shards", extra={"shards": SHARDS})
+else:
+    # Load the prebuilt index (python index_store.py build), rebuilt only if stale;
+    # versions published later by `python index_store.py update` are picked up
+    live_index = LiveIndex(embedding_model)
 
-cases = load_cases(EXTRACTED_TEXT_FILE)
+    # Check the number of entries in the FAISS index; searches read the
+    # current version through live_index.get()
+    log.info("index ready", extra={"passages": live_index.get().index.ntotal, "cases": len(live_index.get().cases)})
 
-# Ensure cases were extracted
-if not cases:
-    print("Error: No cases were extracted. Check the extracted_text.txt format.")
-    exit()
+    # Concurrent requests share one encode + search (QUERY_BATCHING=0 turns it off)
+    batcher = QueryBatcher(embedding_model)
 
-print(f"Number of cases loaded: {len(cases)}")
+# Function to get the most relevant cases, as snippets of their best matching
+# passages (snippets=False returns the whole case texts). mode is "vector",
+# "lexical" (BM25) or "hybrid", SEARCH_MODE by default
+def retrieve_cases(query, top_k=3, judge_name=None, date=None, nprobe=None, ef_search=None,
+                   aggregate="max", snippets=True, mode=None):
+    mode = mode or SEARCH_MODE
+    if coordinator is not None:
+        return coordinator.search(query, top_k, {"judge": judge_name, "date": date}, mode=mode, aggregate=aggregate,
+                                  nprobe=nprobe, ef_search=ef_search, snippets=snippets)[0]
+    case_index = live_index.get()
+    cases = case_index.cases
+    # Repeated queries are answered from the result cache, which is tied to the index version
+    cache_key = (query, top_k, judge_name, date, nprobe, ef_search, aggregate, snippets, mode)
+    cached = result_cache.get(cache_key, case_index.version)
+    if cached is not None:
+        return list(cached)
 
-# Create embeddings
-case_embeddings = embedding_model.encode(cases, convert_to_numpy=True)
+    if not query.strip():
+        return find_cases(judge_name, date, limit=top_k)
 
-# Create FAISS index
-d = case_embeddings.shape[1]  # Embedding dimensionality
-index = faiss.IndexFlatL2(d)
-index.add(case_embeddings)
-
-# Check the number of entries in the FAISS index
-print(f"Number of entries in FAISS index: {index.ntotal}")
-
-# Function to get the most relevant cases
-def retrieve_cases(query, top_k=3, judge_name=None, date=None):
-    query_embedding = embedding_model.encode([query], convert_to_numpy=True)
-    distances, indices = index.search(query_embedding, top_k)
-    retrieved_cases = [cases[i] for i in indices[0] if i < len(cases)]
-
-    # Apply filters
-    if judge_name:
-        retrieved_cases = [case for case in retrieved_cases if judge_name.lower() in case.lower()]
-    if date:
-        retrieved_cases = [case for case in retrieved_cases if date in case]
+    # Metadata filters pick the candidate cases before the vector search
+    with telemetry.timed("filter"):
+        case_ids = case_index.metadata.filter({"judge": judge_name, "date": date})
+    hits = []
+    if case_ids is None or len(case_ids):
+        hits = batcher.search_cases(case_index, query, top_k, aggregate, nprobe=nprobe, ef_search=ef_search,
+                                    case_ids=case_ids, mode=mode)
+    with telemetry.timed("serialize"):
+        retrieved_cases = [case_index.snippet(hit) if snippets else str(cases[hit["case"]]) for hit in hits]
 
+    result_cache.put(cache_key, tuple(retrieved_cases), case_index.version)
     return retrieved_cases
 
-# Save index
-faiss.write_index(index, "case_embeddings.index")
-np.save("case_ids.npy", cases)
-
-print("✅ Embeddings created & saved!")
+# Cases matching metadata filters (judge name, date or timeframe), straight
+# from the metadata index without embedding anything
+def find_cases(judge_name=None, date=None, limit=20):
+    if coordinator is not None:
+        return coordinator.search("", limit, {"judge": judge_name, "date": date})[0]
+    case_index = live_index.get()
+    with telemetry.timed("filter"):
+        case_ids = case_index.metadata.filter({"judge": judge_name, "date": date})
+    if case_ids is None:
+        return []
+    with telemetry.timed("serialize"):
+        return [str(case_index.cases[i]) for i in case_index.live_cases(case_index.canonical_cases(case_ids))[:limit]]
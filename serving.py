@@ -0,0 +1,147 @@
+import os
+import time
+import argparse
+import importlib
+import logging
+import threading
+from flask import jsonify
+from lexical_index import SEARCH_MODES
+import telemetry
+
+# Production serving of backend.py (/chat) and app.py (/search-cases).
+#
+# `python serving.py backend` runs the Flask app under gunicorn instead of
+# the single-threaded Werkzeug dev server. The app module is imported once,
+# in the master (preload): the encoder is loaded and the index opened,
+# memory mapped, before the workers are forked. The workers share the model
+# weights copy-on-write and the index and case store through the page cache
+# (flat and IVF indexes; faiss reads the other types into each worker).
+# Each worker runs SERVER_THREADS request threads, whose concurrent searches
+# the query batcher coalesces.
+#
+# Nothing is encoded or searched before the fork, since the torch (OpenMP)
+# and ONNX Runtime thread pools do not survive one. Each worker warms up
+# after the fork with one search per mode. /ready answers 503 until that is
+# done, so a load balancer only routes to warm workers. A watcher thread per
+# worker polls CURRENT and warms a newly published index version before it
+# is swapped in, off the request path. `kill -HUP <master pid>` replaces the
+# workers gracefully, letting in-flight requests finish. Each live worker
+# gets its own row of the shared telemetry counters.
+#
+# Front ends of a sharded index (SHARDS set, see shards.py) have no index of
+# their own: they warm up the encoder and the shard connections, and /ready
+# reports the shards' last known status.
+
+SERVER_BIND = os.environ.get("SERVER_BIND", "127.0.0.1:5000")
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", "2"))
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", "8"))  # Request threads per worker
+SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", "120"))  # seconds, also the graceful shutdown limit
+WARMUP_QUERY = "bail application of the accused"
+APPS = ("backend", "app", "shard_server")
+
+log = logging.getLogger(__name__)
+
+_server = {"state": "cold", "error": None, "warm_up_ms": None}
+
+def register(app, embedding_model, live_index, batcher, coordinator=None):
+    """Adds /ready to app and remembers the components start() warms up in each process.
+
+    live_index and batcher are None when a shards.ShardCoordinator searches instead.
+    """
+    _server.update(embedding_model=embedding_model, live_index=live_index, batcher=batcher,
+                   coordinator=coordinator)
+    if live_index is not None:
+        live_index.warm = warm
+    app.add_url_rule("/ready", "ready", ready, methods=["GET"])
+
+def warm(case_index):
+    """One search per mode on case_index, so its index, postings and case pages are faulted in."""
+    for mode in SEARCH_MODES:
+        hits = _server["batcher"].search_cases(case_index, WARMUP_QUERY, 3, mode=mode)
+        for hit in hits:
+            case_index.snippet(hit)
+
+def start():
+    """Per-process start, after the fork: reopens the encoder, warms up and watches the index."""
+    if "embedding_model" not in _server:
+        return
+    reopen = getattr(_server["embedding_model"], "reopen", None)
+    if reopen is not None:
+        reopen()
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+
+def _warm_up():
+    _server["state"] = "warming"
+    live_index = _server["live_index"]
+    started = time.perf_counter()
+    try:
+        if live_index is None:
+            _server["coordinator"].warm(WARMUP_QUERY)
+        else:
+            # A worker forked long after the preload picks up the published version first
+            live_index.get(refresh=True)
+            warm(live_index.get())
+    except Exception as e:
+        _server.update(state="failed", error=str(e))
+        log.exception("warm-up failed", extra={"pid": os.getpid()})
+        return
+    _server.update(state="ready", warm_up_ms=round(1000 * (time.perf_counter() - started), 1))
+    if live_index is None:  # the shards watch their own indexes
+        log.info("worker ready", extra={"pid": os.getpid(), "warm_up_ms": _server["warm_up_ms"]})
+        return
+    log.info("worker ready", extra={"pid": os.getpid(), "index_version": live_index.get().version,
+                                    "warm_up_ms": _server["warm_up_ms"]})
+    while True:
+        time.sleep(max(live_index.check_interval, 1))
+        try:
+            live_index.get()
+        except Exception:
+            log.exception("index reload failed", extra={"pid": os.getpid()})
+
+def ready():
+    live_index = _server["live_index"]
+    status = {"status": _server["state"], "pid": os.getpid(), "warm_up_ms": _server["warm_up_ms"]}
+    if live_index is None:
+        status.update(_server["coordinator"].status())
+    else:
+        status.update(index_version=live_index.case_index.version, published=live_index.published,
+                      reloads=live_index.reloads)
+    if _server["error"]:
+        status["error"] = _server["error"]
+    return jsonify(status), 200 if _server["state"] == "ready" else 503
+
+def _pre_fork(arbiter, worker):
+    # In the master: the lowest metrics row no live worker uses, row 0 is the master's
+    taken = {getattr(w, "metrics_slot", None) for w in arbiter.WORKERS.values()}
+    worker.metrics_slot = next(slot for slot in range(1, len(taken) + 2) if slot not in taken)
+
+def _post_fork(arbiter, worker):
+    telemetry.use_slot(worker.metrics_slot)
+    start()
+
+def run(module, bind=SERVER_BIND, workers=SERVER_WORKERS, threads=SERVER_THREADS, timeout=SERVER_TIMEOUT):
+    """Serves module.app with gunicorn: preloaded, forked into workers running request threads."""
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {"bind": bind, "workers": workers, "worker_class": "gthread", "threads": threads,
+                               "preload_app": True, "timeout": timeout, "graceful_timeout": timeout,
+                               "pre_fork": _pre_fork, "post_fork": _post_fork}.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return importlib.import_module(module).app
+
+    Server().run()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve backend.py, app.py or a shard with preloaded gunicorn workers.")
+    parser.add_argument("app", choices=APPS)
+    parser.add_argument("--bind", default=SERVER_BIND)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS)
+    parser.add_argument("--timeout", type=int, default=SERVER_TIMEOUT)
+    args = parser.parse_args()
+    import serving  # the apps register with the serving module, not __main__
+    serving.run(args.app, args.bind, args.workers, args.threads, args.timeout)
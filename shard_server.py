@@ -0,0 +1,93 @@
+import os
+import logging
+import numpy as np
+from flask import Flask, request, jsonify
+import telemetry
+from index_store import AGGREGATIONS, CURRENT_FILE, MODEL_NAME, INDEX_DIR, LiveIndex
+from encoders import load_encoder
+from query_cache import embedding_cache
+from query_batcher import QueryBatcher
+from lexical_index import SEARCH_MODES
+import serving
+
+# One shard of the sharded index (see shards.py), searched by the
+# ShardCoordinator of rag.py and app.py. Started per shard by
+# `python shards.py serve`, or by hand:
+#
+#   INDEX_DIR=index_shards/h00/index EXTRACTED_TEXT_FILE=index_shards/h00/extracted_text.txt \
+#       python serving.py shard_server --bind 127.0.0.1:5101
+#
+# It is an ordinary index server (LiveIndex, query batcher, /ready, warm-up,
+# /metrics) with a single JSON endpoint. The coordinator sends the query's
+# embedding along, it goes into the embedding cache so the shard does not
+# encode the query again. Once `python shards.py update` has removed the
+# shard (no cases left), it answers 410 and the coordinators drop it.
+
+telemetry.configure_logging()  # LOG_LEVEL, LOG_FORMAT
+log = logging.getLogger('shard_server')
+
+SHARD_NAME = os.environ.get("SHARD_NAME") or os.path.basename(os.path.dirname(os.path.abspath(INDEX_DIR)))
+
+app = Flask(__name__)
+
+embedding_model = load_encoder(MODEL_NAME)
+live_index = LiveIndex(embedding_model)  # follows versions published by shards.py update
+batcher = QueryBatcher(embedding_model)
+serving.register(app, embedding_model, live_index, batcher)  # /ready, warm-up per worker
+
+@app.route('/shard-search', methods=['POST'])
+def shard_search():
+    if not os.path.exists(os.path.join(INDEX_DIR, CURRENT_FILE)):
+        return jsonify({"error": f"shard {SHARD_NAME} has been removed"}), 410
+    with telemetry.timed('parse'):
+        data = request.get_json()
+        query = data.get('query', '')
+        top_k = int(data.get('top_k', 3))
+        mode = data.get('mode')
+        aggregate = data.get('aggregate') or 'max'
+    if mode not in SEARCH_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(SEARCH_MODES)}"}), 400
+    if aggregate not in AGGREGATIONS:
+        return jsonify({"error": f"aggregate must be one of {', '.join(AGGREGATIONS)}"}), 400
+    telemetry.annotate(query=query[:200], mode=mode)
+    case_index = live_index.get()
+    cases = case_index.cases
+
+    # Metadata filters and the keyword pick the candidate cases, as in app.py
+    with telemetry.timed('filter'):
+        try:
+            case_ids = case_index.metadata.filter(data.get('filters') or {})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if data.get('keyword'):
+            keyword_ids = case_index.keyword_cases(data['keyword'])
+            if case_ids is not None:  # only canonical cases have passages, so a near-duplicate's id never matches
+                keyword_ids = np.intersect1d(case_index.canonical_cases(case_ids), keyword_ids)
+            case_ids = keyword_ids
+
+    if not query.strip():  # filters only, like rag.find_cases
+        found = [] if case_ids is None else case_index.live_cases(case_index.canonical_cases(case_ids))[:top_k]
+        with telemetry.timed('serialize'):
+            return jsonify({"shard": SHARD_NAME, "version": case_index.version,
+                            "cases": [{"case": int(i), "score": None, "text": str(cases[i])} for i in found]})
+
+    if data.get('embedding') is not None and embedding_cache.get(query, case_index.version) is None:
+        embedding = np.asarray([data['embedding']], dtype=np.float32)
+        embedding.setflags(write=False)
+        embedding_cache.put(query, embedding, case_index.version)
+    hits = []
+    if case_ids is None or len(case_ids):
+        hits = batcher.search_cases(case_index, query, top_k, aggregate, nprobe=data.get('nprobe'),
+                                    ef_search=data.get('efSearch'), case_ids=case_ids, mode=mode)
+    with telemetry.timed('serialize'):
+        return jsonify({"shard": SHARD_NAME, "version": case_index.version, "cases": [
+            {"case": hit["case"], "score": hit["score"],
+             "text": case_index.snippet(hit) if data.get('snippets', True) else str(cases[hit["case"]])}
+            for hit in hits]})
+
+telemetry.instrument(app)  # stage histograms on /metrics, X-Trace-Id, slow request log
+
+if __name__ == '__main__':
+    # Development server; in production run `python serving.py shard_server`
+    serving.start()
+    app.run(debug=True, use_reloader=False, port=5101)
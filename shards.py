@@ -0,0 +1,301 @@
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import shutil
+import signal
+import logging
+import argparse
+import subprocess
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+import telemetry
+from index_store import (CURRENT_FILE, INDEX_TYPE, INDEX_TYPES, MODEL_NAME, EXTRACTED_TEXT_FILE, build_index,
+                         load_cases, update_index)
+from case_metadata import extract_metadata
+from lexical_index import SEARCH_MODE, SEARCH_MODES
+from query_cache import encode_query
+
+# Sharded case index with scatter-gather search.
+#
+# `python shards.py build` splits the extracted text into shards, by a hash
+# of the case text, by year of the judgment or by court, and builds one
+# ordinary versioned index per shard (see index_store.py) under SHARD_DIR:
+#
+#   SHARD_DIR/shards.json                  how the corpus was split
+#   SHARD_DIR/<shard>/extracted_text.txt   the shard's cases
+#   SHARD_DIR/<shard>/index/               its index versions
+#
+# `python shards.py update` splits the corpus again and updates each shard,
+# so only cases that are new to a shard are embedded. A shard left without
+# cases is removed: its CURRENT file goes first, so its running server
+# answers 410 Gone from then on and the coordinators stop asking it.
+#
+# Each shard is served by its own process, shard_server.py under
+# serving.py. `python shards.py serve` starts one per shard on this machine
+# and prints the SHARDS setting for the front ends. With SHARDS set, rag.py
+# (/chat) and app.py (/search-cases) do not open an index themselves: the
+# ShardCoordinator encodes the query once, sends it with the filters to
+# every shard in parallel and merges the shards' top-k cases by score. A
+# shard that fails or has not answered within SHARD_TIMEOUT is left out and
+# the result is marked partial.
+#
+# Scores of vector searches are comparable across shards. BM25 scores use
+# each shard's own document frequencies, and hybrid searches are fused
+# within each shard, so merged lexical and hybrid rankings are
+# approximations. Near-duplicates are only detected within a shard.
+
+SHARD_DIR = os.environ.get("SHARD_DIR", "index_shards")
+SHARD_BY = os.environ.get("SHARD_BY", "hash")
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", "4"))  # shards for SHARD_BY=hash
+SHARD_TIMEOUT = float(os.environ.get("SHARD_TIMEOUT", "2"))  # seconds a search waits for the shards
+SHARDS = [url.rstrip("/") for url in os.environ.get("SHARDS", "").split(",") if url.strip()]
+SHARD_BASE_PORT = int(os.environ.get("SHARD_BASE_PORT", "5101"))
+SHARD_KEYS = ("hash", "year", "court")
+MANIFEST_FILE = "shards.json"
+SHARD_TEXT_FILE = "extracted_text.txt"
+SHARD_INDEX_DIR = "index"
+SEPARATOR = "--- Extracted Text from:"
+
+log = logging.getLogger(__name__)
+
+def shard_name(case, by=SHARD_BY, count=SHARD_COUNT):
+    """The shard a case belongs to: h00.., its judgment year or its court; "unknown" if not found."""
+    if by == "hash":
+        return f"h{zlib.crc32(case.encode('utf-8')) % count:02d}"
+    metadata = extract_metadata(case)
+    if by == "year":
+        return metadata["date"][:4] if metadata["date"] else "unknown"
+    if by == "court":
+        courts = metadata["court"]
+        return re.sub(r"[^a-z0-9]+", "-", courts[0].lower()).strip("-") if courts else "unknown"
+    raise ValueError(f"Unknown shard key {by!r}, expected one of {SHARD_KEYS}")
+
+def split_corpus(text_file=EXTRACTED_TEXT_FILE, shard_dir=SHARD_DIR, by=SHARD_BY, count=SHARD_COUNT):
+    """Writes each shard's extracted text and the manifest. Returns {shard: number of cases}."""
+    groups = {}
+    for case in load_cases(text_file):
+        groups.setdefault(shard_name(case, by, count), []).append(case)
+    if not groups:
+        raise ValueError(f"No cases were extracted from {text_file}. Check the extracted_text.txt format.")
+    for name, cases in groups.items():
+        path = os.path.join(shard_dir, name, SHARD_TEXT_FILE)
+        text = "".join(f"{SEPARATOR} {case}\n\n" for case in cases)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                if f.read() == text:  # unchanged, keep the mtime the shard's index was checked against
+                    continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+    manifest = read_manifest(shard_dir) or {}
+    for name in sorted(set(manifest.get("shards", {})) - set(groups)):
+        remove_shard(shard_dir, name)
+    manifest = {"by": by, "count": count if by == "hash" else None, "corpus_file": os.path.abspath(text_file),
+                "shards": {name: len(cases) for name, cases in sorted(groups.items())},
+                "split_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    with open(os.path.join(shard_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest["shards"]
+
+def remove_shard(shard_dir, name):
+    """Unpublishes a shard's index, so its server stops answering, and deletes the shard."""
+    current = os.path.join(shard_paths(shard_dir, name)[1], CURRENT_FILE)
+    if os.path.exists(current):
+        os.remove(current)
+    # Files a running server still maps can't be deleted on Windows, they go with the next removal
+    shutil.rmtree(os.path.join(shard_dir, name), ignore_errors=True)
+    print(f"⚠️ Shard {name} has no cases left and was removed, drop its server from SHARDS")
+
+def read_manifest(shard_dir=SHARD_DIR):
+    path = os.path.join(shard_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def shard_paths(shard_dir, name):
+    """(extracted text, index dir) of a shard."""
+    return os.path.join(shard_dir, name, SHARD_TEXT_FILE), os.path.join(shard_dir, name, SHARD_INDEX_DIR)
+
+def build_shards(embedding_model, text_file=EXTRACTED_TEXT_FILE, shard_dir=SHARD_DIR, by=SHARD_BY,
+                 count=SHARD_COUNT, index_type=INDEX_TYPE):
+    """Splits text_file and builds a new index for every shard."""
+    shards = split_corpus(text_file, shard_dir, by, count)
+    for name, ncases in shards.items():
+        print(f"Shard {name}: {ncases} cases")
+        build_index(embedding_model, *shard_paths(shard_dir, name), index_type=index_type)
+
+def update_shards(embedding_model, text_file=EXTRACTED_TEXT_FILE, shard_dir=SHARD_DIR, index_type=INDEX_TYPE):
+    """Splits text_file the way the shards were built and updates them; new shards are built."""
+    manifest = read_manifest(shard_dir)
+    if manifest is None:
+        raise RuntimeError(f"Cannot update the shards: no {MANIFEST_FILE} in {shard_dir}, build them instead")
+    shards = split_corpus(text_file, shard_dir, manifest["by"], manifest["count"] or SHARD_COUNT)
+    for name, ncases in shards.items():
+        text, index_dir = shard_paths(shard_dir, name)
+        print(f"Shard {name}: {ncases} cases")
+        if os.path.exists(os.path.join(index_dir, "CURRENT")):
+            update_index(embedding_model, text, index_dir)
+        else:
+            build_index(embedding_model, text, index_dir, index_type=index_type)
+
+def serve_shards(shard_dir=SHARD_DIR, host="127.0.0.1", base_port=SHARD_BASE_PORT, workers=1, threads=4):
+    """Runs one shard_server process per shard on this machine until interrupted."""
+    manifest = read_manifest(shard_dir)
+    if manifest is None:
+        raise SystemExit(f"No {MANIFEST_FILE} in {shard_dir}, run `python shards.py build` first")
+    processes, urls = [], []
+    for port, name in enumerate(manifest["shards"], start=base_port):
+        text, index_dir = shard_paths(shard_dir, name)
+        env = {**os.environ, "INDEX_DIR": index_dir, "EXTRACTED_TEXT_FILE": text, "SHARD_NAME": name}
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "serving.py"),
+                   "shard_server", "--bind", f"{host}:{port}", "--workers", str(workers), "--threads", str(threads)]
+        processes.append(subprocess.Popen(command, env=env))
+        urls.append(f"http://{host}:{port}")
+        print(f"Shard {name}: {urls[-1]} (pid {processes[-1].pid})")
+    print(f"SHARDS={','.join(urls)}")
+    try:
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+        print("⚠️ A shard server exited, stopping the others")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in processes:
+            if p.poll() is None:
+                p.send_signal(signal.SIGTERM)
+        for p in processes:
+            p.wait()
+
+class ShardCoordinator:
+    """Scatter-gather case search over the shard servers at urls."""
+
+    def __init__(self, embedding_model, urls=SHARDS, timeout=SHARD_TIMEOUT):
+        self.embedding_model = embedding_model
+        self.urls = list(urls)
+        self.timeout = timeout
+        self.shards = {url: {"status": "unknown"} for url in self.urls}  # latest answer of each shard
+        self.partial = 0
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def search(self, query, top_k, filters=None, keyword=None, mode=None, aggregate="max", nprobe=None,
+               ef_search=None, snippets=True):
+        """The top_k case texts over all shards, and the shards that did not answer.
+
+        filters are metadata filters (column -> value), keyword a word the
+        case text must contain. Without a query the shards return their
+        cases matching the filters, in shard order.
+        """
+        mode = mode or SEARCH_MODE
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        payload = {"query": query, "filters": filters or {}, "keyword": keyword, "top_k": top_k, "mode": mode,
+                   "aggregate": aggregate, "nprobe": nprobe, "efSearch": ef_search, "snippets": snippets}
+        if query.strip() and mode != "lexical":
+            with telemetry.timed("encode"):  # once for all shards
+                payload["embedding"] = encode_query(self.embedding_model, query, "shards")[0].tolist()
+        with telemetry.timed("search"):
+            answers, missing = self._scatter(json.dumps(payload).encode("utf-8"))
+        hits = [hit for answer in answers for hit in answer["cases"]]
+        if query.strip():
+            hits.sort(key=lambda hit: hit["score"], reverse=True)
+        if missing:
+            self.partial += 1
+            telemetry.annotate(missing_shards=missing)
+            log.warning("partial result", extra={"missing_shards": missing, "shards": len(self.urls)})
+        return [hit["text"] for hit in hits[:top_k]], missing
+
+    def warm(self, query):
+        """Encodes query and asks every shard once, filling the shards' status."""
+        self.search(query, 3)
+
+    def status(self):
+        return {"shards": self.shards, "partial_results": self.partial}
+
+    def _executor(self):
+        # Threads do not survive the fork of a preloading server, each process gets its own pool
+        with self._lock:
+            if self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=4 * len(self.urls), thread_name_prefix="shard")
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _scatter(self, body):
+        trace = telemetry.current_trace()
+        headers = {"Content-Type": "application/json"}
+        if trace is not None:
+            headers[telemetry.TRACE_HEADER] = trace.id  # the shards log under the same id
+        pool = self._executor()
+        futures = {pool.submit(self._post, url, body, headers): url for url in self.urls}
+        done, _ = wait(futures, timeout=self.timeout)
+        answers, missing = [], []
+        for future, url in futures.items():
+            if future in done and isinstance(future.exception(), ValueError):
+                raise future.exception()  # a bad filter, every shard rejects it
+            if future in done and future.exception() is None and future.result() is None:
+                self._drop(url)
+            elif future in done and future.exception() is None:
+                answer = future.result()
+                self.shards[url] = {"status": "ok", "shard": answer.get("shard"), "version": answer.get("version")}
+                answers.append(answer)
+            else:
+                error = f"no answer within {self.timeout}s" if future not in done else str(future.exception())
+                self.shards[url] = {**self.shards[url], "status": "failed", "error": error}
+                missing.append(url)
+        return answers, missing
+
+    def _drop(self, url):
+        """Stops asking a shard that was removed by `shards.py update`."""
+        with self._lock:
+            if url in self.urls:
+                self.urls = [u for u in self.urls if u != url]
+                self.shards[url] = {**self.shards[url], "status": "removed"}
+                log.warning("shard removed", extra={"shard": url, "shards": len(self.urls)})
+
+    def _post(self, url, body, headers):
+        """The shard's answer, None if the shard has been removed."""
+        request = urllib.request.Request(f"{url}/shard-search", data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 400:
+                raise ValueError(json.loads(e.read()).get("error", "bad request")) from None
+            if e.code == 410:
+                return None
+            raise
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, update or serve the sharded case index.")
+    parser.add_argument("command", choices=["build", "update", "serve", "info"])
+    parser.add_argument("--text-file", default=EXTRACTED_TEXT_FILE)
+    parser.add_argument("--shard-dir", default=SHARD_DIR)
+    parser.add_argument("--by", choices=SHARD_KEYS, default=SHARD_BY)
+    parser.add_argument("--count", type=int, default=SHARD_COUNT, help="shards for --by hash")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=SHARD_BASE_PORT)
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers per shard")
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        manifest = read_manifest(args.shard_dir)
+        print(json.dumps(manifest, indent=2) if manifest else f"No shards in {args.shard_dir}")
+    elif args.command == "serve":
+        serve_shards(args.shard_dir, args.host, args.base_port, args.workers, args.threads)
+    else:
+        from encoders import load_encoder
+        if args.command == "build":
+            build_shards(load_encoder(MODEL_NAME), args.text_file, args.shard_dir, args.by, args.count,
+                         args.index_type)
+        else:
+            update_shards(load_encoder(MODEL_NAME), args.text_file, args.shard_dir, args.index_type)
@@ -0,0 +1,236 @@
+import os
+import mmap
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+import numpy as np
+from flask import Response, g, request
+
+# Latency metrics, request traces and logging for the servers.
+#
+# Every retrieval stage is timed into a histogram, retrieval_stage_seconds:
+#
+#   parse      reading and validating the request
+#   filter     metadata / keyword filters -> candidate cases
+#   queue      waiting for the query batcher to pick the query up
+#   encode     query embedding (a batched encode counts for each query in it)
+#   search     vector search and grouping of passages into cases
+#   lexical    BM25 search
+#   fuse       reciprocal rank fusion of the hybrid rankings
+#   serialize  case texts / snippets and the JSON response
+#
+# plus the whole request per endpoint in http_request_seconds. GET /metrics
+# serves them in the Prometheus text format. The counts live in anonymous
+# shared memory allocated at import, before serving.py forks its workers.
+# Each worker writes to its own row, and /metrics on any worker sums them
+# all, so a scrape sees the whole server.
+#
+# A request that sends X-Trace-Id gets it back along with a Server-Timing
+# header of its stage durations. Requests slower than SLOW_QUERY_MS are
+# logged, a SLOW_QUERY_SAMPLE fraction of them, with their stages. Log
+# records are JSON lines (LOG_FORMAT=text for plain lines) at LOG_LEVEL, and
+# carry the trace id of the request being served.
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # json or text
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_SAMPLE = float(os.environ.get("SLOW_QUERY_SAMPLE", "1.0"))  # fraction of slow requests logged
+TRACE_HEADER = "X-Trace-Id"
+
+STAGES = ("parse", "filter", "queue", "encode", "search", "lexical", "fuse", "serialize")
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATUS_CLASSES = ("2xx", "3xx", "4xx", "5xx")
+MAX_SLOTS = 64  # rows of the shared counters: the master/dev server plus one per live worker
+
+log = logging.getLogger(__name__)
+
+_slot = 0
+_lock = threading.Lock()  # per process, each process writes only its own row
+_local = threading.local()
+
+def _shared(shape):
+    # Anonymous MAP_SHARED memory stays shared with processes forked later
+    buffer = mmap.mmap(-1, int(np.prod(shape)) * 8)
+    return np.frombuffer(buffer, dtype=np.float64).reshape(shape)
+
+def use_slot(slot):
+    """Row of the shared counters this process writes to, serving.py gives each worker its own."""
+    global _slot
+    _slot = slot % MAX_SLOTS
+
+class Histogram:
+    """Prometheus histogram with one label, over a fixed set of label values."""
+
+    def __init__(self, name, doc, label, values, buckets=BUCKETS):
+        self.name, self.doc, self.label = name, doc, label
+        self.values = tuple(values)
+        self._index = {value: i for i, value in enumerate(self.values)}
+        self.buckets = buckets
+        # Per slot and label value: a count per bucket and one above the last, then the sum
+        self._data = _shared((MAX_SLOTS, len(self.values), len(buckets) + 2))
+
+    def observe(self, value, seconds):
+        row = self._data[_slot, self._index[value]]
+        with _lock:
+            row[bisect_left(self.buckets, seconds)] += 1
+            row[-1] += seconds
+
+    def expose(self):
+        totals = self._data.sum(0)
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for value, row in zip(self.values, totals):
+            counts = np.cumsum(row[:-1])
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {int(count)}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="+Inf"}} {int(counts[-1])}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {row[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {int(counts[-1])}')
+        return lines
+
+class Counter:
+    """Prometheus counter with two labels, over fixed sets of label values."""
+
+    def __init__(self, name, doc, labels, values):
+        self.name, self.doc, self.labels = name, doc, labels
+        self.values = tuple(tuple(v) for v in values)
+        self._index = [{value: i for i, value in enumerate(vs)} for vs in self.values]
+        self._data = _shared((MAX_SLOTS,) + tuple(len(vs) for vs in self.values))
+
+    def inc(self, *values):
+        with _lock:
+            self._data[(_slot,) + tuple(index[v] for index, v in zip(self._index, values))] += 1
+
+    def expose(self):
+        totals = self._data.sum(0)
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for position in np.ndindex(totals.shape):
+            labels = ",".join(f'{label}="{vs[i]}"' for label, vs, i in zip(self.labels, self.values, position))
+            lines.append(f"{self.name}{{{labels}}} {int(totals[position])}")
+        return lines
+
+stage_seconds = Histogram("retrieval_stage_seconds", "Time spent per retrieval stage.", "stage", STAGES)
+_families = [stage_seconds]
+
+class Trace:
+    """Stage durations of one request."""
+
+    def __init__(self, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.fields = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self):
+        return ", ".join(f"{stage};dur={1000 * seconds:.2f}" for stage, seconds in self.stages.items())
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+def observe(stage, seconds, trace=None):
+    """Records seconds of stage in the histogram and in trace (the current request's by default)."""
+    stage_seconds.observe(stage, seconds)
+    trace = trace or current_trace()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+def annotate(**fields):
+    """Adds fields (query, mode, ...) to the current request's slow-query log entry."""
+    trace = current_trace()
+    if trace is not None:
+        trace.fields.update(fields)
+
+def instrument(app):
+    """Times every request of app and adds GET /metrics. Call once the routes are defined."""
+    endpoints = sorted(rule.endpoint for rule in app.url_map.iter_rules()) + ["metrics", "other"]
+    request_seconds = Histogram("http_request_seconds", "Request latency per endpoint.", "endpoint", endpoints)
+    requests_total = Counter("http_requests_total", "Requests per endpoint and status class.",
+                             ("endpoint", "status"), (endpoints, STATUS_CLASSES))
+    _families.extend([request_seconds, requests_total])
+
+    @app.before_request
+    def start_trace():
+        g.trace = _local.trace = Trace(request.headers.get(TRACE_HEADER))
+
+    @app.after_request
+    def trace_headers(response):
+        trace = g.get("trace")
+        if trace is not None:
+            g.status = response.status_code
+            if TRACE_HEADER in request.headers:
+                response.headers[TRACE_HEADER] = trace.id
+                response.headers["Server-Timing"] = trace.server_timing()
+        return response
+
+    # Teardown runs even when the view raised and no after_request did, so
+    # the trace never outlives its request on this thread
+    @app.teardown_request
+    def finish_trace(exc=None):
+        trace = g.pop("trace", None)
+        _local.trace = None
+        if trace is None:
+            return
+        status = g.pop("status", 500)
+        seconds = time.perf_counter() - trace.started
+        endpoint = request.endpoint if request.endpoint in request_seconds.values else "other"
+        request_seconds.observe(endpoint, seconds)
+        requests_total.inc(endpoint, f"{status // 100}xx")
+        if 1000 * seconds >= SLOW_QUERY_MS and random.random() < SLOW_QUERY_SAMPLE:
+            log.warning("slow request", extra={
+                "trace_id": trace.id, "endpoint": endpoint, "status": status,
+                "ms": round(1000 * seconds, 2), **trace.fields,
+                "stages_ms": {stage: round(1000 * s, 2) for stage, s in trace.stages.items()}})
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        lines = [line for family in _families for line in family.expose()]
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+# Attributes every LogRecord has, the rest were passed through extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+                 "msg": record.getMessage()}
+        entry.update((k, v) for k, v in vars(record).items() if k not in _RECORD_FIELDS)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TraceFilter(logging.Filter):
+    """Tags records logged while serving a request with its trace id."""
+
+    def filter(self, record):
+        trace = current_trace()
+        if trace is not None and not hasattr(record, "trace_id"):
+            record.trace_id = trace.id
+        return True
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Sets up the root logger once per process; later calls do nothing."""
+    root = logging.getLogger()
+    if any(getattr(h, "telemetry", False) for h in root.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.telemetry = True
+    handler.addFilter(TraceFilter())
+    handler.setFormatter(JsonFormatter() if fmt == "json" else
+                         logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(level)
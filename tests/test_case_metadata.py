@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from case_metadata import MetadataIndex, parse_timeframe
+
+RECORDS = [
+    {"judge": ["Hon'ble Mr. Justice A. K. Sharma"], "petitioner": ["Ram Kumar"], "case_number": ["Crl.M.C. 3/2014"],
+     "date": "2014-03-12"},
+    {"judge": ["Justice B. Sharma"], "respondent": ["State of Delhi"], "accused": ["Ram Lal"], "date": "2015-07-01"},
+    {"judge": ["Justice A. K. Sharma"], "court": ["High Court of Delhi"], "date": None},
+]
+
+@pytest.fixture
+def metadata():
+    return MetadataIndex(RECORDS)
+
+def test_no_filter_returns_none(metadata):
+    assert metadata.filter({}) is None
+    assert metadata.filter({"judge": "", "date": "  "}) is None
+
+def test_every_token_must_match(metadata):
+    assert list(metadata.filter({"judge": "sharma"})) == [0, 1, 2]
+    assert list(metadata.filter({"judge": "a k sharma"})) == [0, 2]
+    assert list(metadata.filter({"judge": "verma"})) == []
+
+def test_filters_are_intersected(metadata):
+    assert list(metadata.filter({"judge": "sharma", "date": "2015"})) == [1]
+    assert list(metadata.filter({"judge": "a k sharma", "date": "2014-2015"})) == [0]
+
+def test_parties_cover_petitioner_accused_and_respondent(metadata):
+    assert list(metadata.filter({"parties": "ram"})) == [0, 1]
+    assert list(metadata.filter({"parties": "state"})) == [1]
+
+def test_case_numbers_ignore_punctuation(metadata):
+    assert list(metadata.filter({"case_number": "CRLMC 3/2014"})) == [0]
+
+def test_undated_cases_never_match_a_timeframe(metadata):
+    assert list(metadata.filter({"date": "2000-2030"})) == [0, 1]
+
+def test_bad_filters_raise(metadata):
+    with pytest.raises(ValueError):
+        metadata.filter({"date": "sometime"})
+    with pytest.raises(ValueError):
+        metadata.filter({"shoe_size": "9"})
+
+@pytest.mark.parametrize("value, expected", [
+    ("2014", ("2014-01-01", "2014-12-31")),
+    ("2014 to 2016", ("2014-01-01", "2016-12-31")),
+    ("2014-02", ("2014-02-01", "2014-02-28")),
+    ("2014-03-12", ("2014-03-12", "2014-03-12")),
+])
+def test_parse_timeframe(value, expected):
+    assert parse_timeframe(value) == tuple(np.datetime64(day) for day in expected)
@@ -0,0 +1,49 @@
+import pytest
+from case_records import CaseRecordReader, CaseRecordWriter, case_id_of
+
+def record(case_id, text="text"):
+    return {"case_id": case_id, "text": f"{text} of {case_id} – ü"}
+
+@pytest.mark.parametrize("name", ["cases.jsonl", "cases.jsonl.gz"])
+def test_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    with CaseRecordWriter(path, fsync_every=2) as writer:
+        for case_id in ("a", "b", "c"):
+            writer.write(record(case_id))
+    reader = CaseRecordReader(path)
+    assert len(reader) == 3 and "b" in reader and "z" not in reader
+    assert reader.get("b") == record("b")
+    assert reader.get("z") is None
+    assert list(reader) == [record(case_id) for case_id in ("a", "b", "c")]
+
+def test_later_write_of_a_case_wins(tmp_path):
+    path = str(tmp_path / "cases.jsonl")
+    with CaseRecordWriter(path) as writer:
+        writer.write(record("a"))
+    with CaseRecordWriter(path, append=True) as writer:
+        writer.write(record("a", "new text"))
+    assert CaseRecordReader(path).get("a") == record("a", "new text")
+
+def test_torn_tail_after_a_crash_is_ignored(tmp_path):
+    path = str(tmp_path / "cases.jsonl")
+    with CaseRecordWriter(path) as writer:
+        writer.write(record("a"))
+        writer.write(record("b"))
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 5)  # the last record lost its end
+    with open(path + ".idx", "a", encoding="utf-8") as f:
+        f.write('["c", 9')  # and the index a half written line
+    reader = CaseRecordReader(path)
+    assert reader.ids() == ["a"]
+    assert list(reader) == [record("a")]
+
+def test_missing_index_is_rebuilt_from_line_offsets(tmp_path):
+    path = str(tmp_path / "cases.jsonl")
+    with CaseRecordWriter(path) as writer:
+        writer.write(record("a"))
+        writer.write(record("b"))
+    (tmp_path / "cases.jsonl.idx").unlink()
+    assert CaseRecordReader(path).get("b") == record("b")
+
+def test_case_id_of():
+    assert case_id_of("scanned_2037_1.pdf --- IN THE HIGH COURT") == "scanned_2037_1"
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from case_store import CaseStore, write_case_store
+
+CASES = ["scanned_1.pdf --- IN THE HIGH COURT", "", "ÖRDER – ₹ 500 fine", "x" * 10_000]
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_round_trip(tmp_path, compression):
+    write_case_store(str(tmp_path), CASES, compression)
+    store = CaseStore(str(tmp_path), compression)
+    assert len(store) == len(CASES)
+    assert list(store) == CASES
+    assert store[2] == store[-2] == CASES[2]
+    assert store[1:3] == CASES[1:3]
+    with pytest.raises(IndexError):
+        store[len(CASES)]
+
+def test_zlib_shrinks_the_blob(tmp_path):
+    (tmp_path / "plain").mkdir()
+    (tmp_path / "zlib").mkdir()
+    write_case_store(str(tmp_path / "plain"), CASES)
+    write_case_store(str(tmp_path / "zlib"), CASES, "zlib")
+    assert CaseStore(str(tmp_path / "zlib"), "zlib").nbytes < CaseStore(str(tmp_path / "plain")).nbytes
+
+def test_empty_store(tmp_path):
+    write_case_store(str(tmp_path), [])
+    assert CaseStore.exists(str(tmp_path))
+    assert len(CaseStore(str(tmp_path))) == 0
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError):
+        write_case_store(str(tmp_path), CASES, "lz4")
+    assert not CaseStore.exists(str(tmp_path))
+
+def test_threads_always_read_their_own_case(tmp_path):
+    cases = [f"case {i} " * 50 for i in range(20)]
+    write_case_store(str(tmp_path), cases, "zlib")
+    store = CaseStore(str(tmp_path), "zlib")
+    ids = [i % len(cases) for i in range(5000)]
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(store.__getitem__, ids)) == [cases[i] for i in ids]
@@ -0,0 +1,49 @@
+import faiss
+import numpy as np
+import pytest
+from chunking import chunk_cases, chunk_spans
+from index_store import CaseIndex
+
+def words(n, start=0):
+    return " ".join(f"w{i}" for i in range(start, start + n))
+
+def test_windows_overlap_and_cover_the_text():
+    text = words(25)
+    spans = chunk_spans(text, words=10, overlap=3)
+    passages = [text[start:end].split() for start, end in spans]
+    assert passages[0] == words(10).split()
+    assert passages[1][:3] == passages[0][-3:]  # the overlap
+    assert [len(p) for p in passages] == [10, 10, 10, 4]
+    assert passages[-1][-1] == "w24"
+
+def test_short_and_empty_texts():
+    assert chunk_spans("  one   two ", words=10, overlap=3) == [(2, 11)]
+    assert chunk_spans("", words=10, overlap=3) == []
+
+def test_overlap_larger_than_the_window_still_advances():
+    assert len(chunk_spans(words(5), words=2, overlap=4)) == 4
+
+def test_chunk_cases():
+    cases = [words(12), words(3, 100)]
+    texts, chunk_case, spans = chunk_cases(cases, words=10, overlap=5)
+    assert chunk_case.tolist() == [0, 0, 1]
+    assert texts == [cases[c][s:e] for c, (s, e) in zip(chunk_case, spans)]
+    assert texts[-1] == words(3, 100)
+
+def case_index(chunk_vectors, chunk_case):
+    index = faiss.IndexFlatL2(chunk_vectors.shape[1])
+    index.add(chunk_vectors)
+    cases = [f"case{i}.pdf --- text" for i in range(max(chunk_case) + 1)]
+    spans = np.array([(0, len(cases[c])) for c in chunk_case])
+    return CaseIndex(index, cases, {}, chunk_vectors, np.array(chunk_case), spans)
+
+@pytest.mark.parametrize("aggregate, expected", [("max", [0, 1]), ("sum", [1, 0])])
+def test_passage_hits_are_aggregated_to_cases(aggregate, expected):
+    # Case 0 has one passage close to the query, case 1 two fairly close ones
+    query = np.array([[1, 0]], dtype=np.float32)
+    vectors = np.array([[1, 0], [0.8, 0.6], [0.8, -0.6], [-1, 0]], dtype=np.float32)
+    hits = case_index(vectors, [0, 1, 1, 2]).search_cases(query, 2, aggregate)[0]
+    assert [hit["case"] for hit in hits] == expected
+    assert [c for c, _ in hits[expected.index(1)]["chunks"]] == [1, 2]
+    with pytest.raises(ValueError):
+        case_index(vectors, [0, 1, 1, 2]).search_cases(query, 2, "mean")
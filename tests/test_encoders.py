@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from encoders import OnnxEncoder, load_encoder, onnx_dir
+
+class FakeTokenizer:
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        ids = np.zeros((len(texts), max(len(t) for t in texts)), dtype=np.int32)
+        for i, text in enumerate(texts):
+            ids[i, :len(text)] = [ord(c) for c in text]
+        return {"input_ids": ids, "attention_mask": (ids > 0).astype(np.int32), "token_type_ids": np.zeros_like(ids)}
+
+class FakeSession:
+    """Embeds a sentence as [its length, its first character]."""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, outputs, feeds):
+        assert all(array.dtype == np.int64 for array in feeds.values())
+        lengths = feeds["attention_mask"].sum(1)
+        self.batches.append(lengths.tolist())
+        return [np.stack([lengths, feeds["input_ids"][:, 0]], axis=1).astype(np.float32)]
+
+@pytest.fixture
+def encoder():
+    encoder = OnnxEncoder.__new__(OnnxEncoder)  # without an exported model or onnxruntime
+    encoder.dim = 2
+    encoder.max_seq_length = 128
+    encoder.tokenizer = FakeTokenizer()
+    encoder.session = FakeSession()
+    encoder.inputs = ["input_ids", "attention_mask"]
+    return encoder
+
+def test_encode_keeps_the_input_order(encoder):
+    sentences = ["bb", "a", "dddd", "ccc", "eeeee"]
+    embeddings = encoder.encode(sentences, batch_size=2)
+    assert embeddings.dtype == np.float32 and embeddings.shape == (5, 2)
+    assert embeddings[:, 0].tolist() == [2, 1, 4, 3, 5]
+    assert embeddings[:, 1].tolist() == [ord(s[0]) for s in sentences]
+    assert encoder.session.batches == [[5, 4], [3, 2], [1]]  # longest first, little padding
+
+def test_encode_a_single_sentence(encoder):
+    assert encoder.encode("abc").tolist() == [3, ord("a")]
+    assert encoder.get_sentence_embedding_dimension() == 2
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        load_encoder("sentence-transformers/all-MiniLM-L6-v2", backend="tensorrt")
+
+def test_export_directory_per_model():
+    assert onnx_dir("sentence-transformers/all-MiniLM-L6-v2").endswith("sentence-transformers--all-MiniLM-L6-v2")
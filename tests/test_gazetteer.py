@@ -0,0 +1,41 @@
+from case_metadata import case_fields, extract_date, extract_metadata
+from gazetteer import Gazetteer
+
+CAUSE_TITLE = """scanned_1.pdf --- IN THE HIGH COURT OF KERALA AT ERNAKULAM
+PRESENT THE HONOURABLE MR. JUSTICE P.UBAID THURSDAY, THE 12TH DAY OF MARCH 2015
+Crl.MC.No. 3 of 2014
+CRIME NO. 45/2013 OF KOTTAYAM POLICE STATION
+PETITIONER/ACCUSED: RAM KUMAR, AGED 40 YEARS, S/O KRISHNAN
+BY ADVS. SRI.T.P. MENON
+RESPONDENT/COMPLAINANT: STATE OF KERALA, REPRESENTED BY THE PUBLIC PROSECUTOR
+Dated this the 12th day of March, 2015"""
+
+GAZETTEER = Gazetteer({
+    "judges": {"P. UBAID": ["P.UBAID", "UBAIC"], "SOPHY THOMAS": ["SOPHY THCMAS"]},
+    "courts": {"SESSIONS COURT": ["SESSIONS JUDGE"]},
+})
+
+def test_aliases_map_to_the_canonical_name():
+    found = GAZETTEER.find("Before Justice Sophy Thcmas and Justice P.Ubaid, Sessions Judge")
+    assert found == {"judges": ["SOPHY THOMAS", "P. UBAID"], "courts": ["SESSIONS COURT"]}
+
+def test_only_whole_words_match():
+    assert GAZETTEER.find("UBAICK v. SOPHY THOMASON") == {"judges": [], "courts": []}
+
+def test_extract_metadata():
+    metadata = extract_metadata(CAUSE_TITLE, GAZETTEER)
+    assert metadata == {
+        "court": ["HIGH COURT OF KERALA"], "judge": ["P. UBAID"], "case_number": ["CRLMC 3/2014"],
+        "crime_number": ["45/2013"], "date": "2015-03-12", "petitioner": ["RAM KUMAR"], "accused": ["RAM KUMAR"],
+        "respondent": ["STATE OF KERALA"], "lawyer": ["T.P. MENON"], "location": ["ERNAKULAM", "KOTTAYAM"],
+    }
+    assert case_fields(metadata)["judge_name"] == "P. UBAID"
+
+def test_regexes_fill_in_unknown_names():
+    metadata = extract_metadata(CAUSE_TITLE.replace("P.UBAID", "K. VINOD CHANDRAN"), Gazetteer({"judges": {}}))
+    assert metadata["judge"] == ["K. VINOD CHANDRAN"]
+
+def test_dates_survive_ocr_errors():
+    assert extract_date("Dated this the 3rd day of Februarv, 2016") == "2016-02-03"
+    assert extract_date("ORDER 31.12.2019") == "2019-12-31"
+    assert extract_date("no date here 99.99.2019") is None
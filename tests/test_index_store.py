@@ -0,0 +1,175 @@
+import hashlib
+import random
+import faiss
+import numpy as np
+import pytest
+import index_store
+from index_store import MappedFlatIndex, build_index, compact_index, load_index, update_index
+
+MODEL = "test-model"
+
+class HashingEncoder:
+    """Deterministic bag-of-words encoder standing in for the sentence transformer."""
+
+    dim = 64
+
+    def __init__(self):
+        self.encoded = 0
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms, norms, 1)
+
+def case_text(n, words=120):
+    rng = random.Random(n)
+    vocabulary = [f"word{i}" for i in range(500)]
+    return f"case{n}.pdf --- subject{n} " + " ".join(rng.choice(vocabulary) for _ in range(words))
+
+def write_corpus(path, texts):
+    with open(path, "w", encoding="utf-8") as f:
+        for text in texts:
+            f.write(f"--- Extracted Text from: {text}\n\n")
+
+def live_texts(case_index):
+    return sorted(str(case_index.cases[i]) for i in np.flatnonzero(~case_index.deleted))
+
+def search_texts(case_index, encoder, query, top_k=5, **kwargs):
+    hits = case_index.search_cases(encoder.encode([query]), top_k, **kwargs)[0]
+    return [str(case_index.cases[hit["case"]]) for hit in hits]
+
+@pytest.fixture
+def corpus(tmp_path):
+    return str(tmp_path / "extracted_text.txt"), str(tmp_path / "index")
+
+@pytest.fixture
+def encoder():
+    return HashingEncoder()
+
+def load(index_dir, text_file=None):
+    case_index, problem = load_index(index_dir, MODEL, HashingEncoder.dim, text_file=text_file)
+    assert problem is None
+    return case_index
+
+def test_build_and_load(corpus, encoder):
+    text_file, index_dir = corpus
+    texts = [case_text(n) for n in range(10)]
+    write_corpus(text_file, texts)
+    build_index(encoder, text_file, index_dir, MODEL, "flat")
+    case_index = load(index_dir, text_file)
+    assert isinstance(case_index.index, MappedFlatIndex)
+    assert [str(case) for case in case_index.cases] == texts
+    assert search_texts(case_index, encoder, texts[3])[0] == texts[3]
+
+def test_update_embeds_only_new_cases_and_hides_removed_ones(corpus, encoder):
+    text_file, index_dir = corpus
+    texts = [case_text(n) for n in range(10)]
+    write_corpus(text_file, texts)
+    build_index(encoder, text_file, index_dir, MODEL, "flat")
+    version = load(index_dir).version
+
+    changed = texts[:2] + texts[3:] + [case_text(10), case_text(11)]  # case 2 removed, 10 and 11 added
+    write_corpus(text_file, changed)
+    encoder.encoded = 0
+    update_index(encoder, text_file, index_dir, MODEL)
+    assert encoder.encoded == 2  # one passage per new case
+
+    case_index = load(index_dir, text_file)
+    assert case_index.version != version
+    assert live_texts(case_index) == sorted(changed)
+    assert case_index.deleted.sum() == 1
+    assert texts[2] not in search_texts(case_index, encoder, texts[2], top_k=10)
+    assert search_texts(case_index, encoder, case_text(11))[0] == case_text(11)
+
+def test_unchanged_corpus_publishes_a_new_version(corpus, encoder):
+    text_file, index_dir = corpus
+    write_corpus(text_file, [case_text(n) for n in range(5)])
+    build_index(encoder, text_file, index_dir, MODEL, "flat")
+    version = load(index_dir).version
+    encoder.encoded = 0
+    update_index(encoder, text_file, index_dir, MODEL)
+    assert encoder.encoded == 0
+    assert load(index_dir).version != version
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "sq8"])
+def test_compaction_round_trip(corpus, encoder, monkeypatch, index_type):
+    monkeypatch.setattr(index_store, "COMPACT_RATIO", 1.0)  # compact only when asked
+    text_file, index_dir = corpus
+    texts = [case_text(n) for n in range(40)]
+    write_corpus(text_file, texts)
+    build_index(encoder, text_file, index_dir, MODEL, index_type)
+    kept = texts[::2]
+    write_corpus(text_file, kept)
+    update_index(encoder, text_file, index_dir, MODEL)
+    before = load(index_dir, text_file)
+    assert before.deleted.sum() == 20
+    results = [search_texts(before, encoder, text) for text in kept[:5]]
+
+    compact_index(index_dir, MODEL)
+    after = load(index_dir, text_file)
+    assert not after.deleted.any()
+    assert len(after) == after.meta["ncases"] == 20
+    assert after.index.ntotal == len(after.chunk_case)
+    assert live_texts(after) == sorted(kept)
+    assert [search_texts(after, encoder, text) for text in kept[:5]] == results
+    assert after.version != before.version
+
+def test_update_compacts_past_the_ratio(corpus, encoder, monkeypatch):
+    monkeypatch.setattr(index_store, "COMPACT_RATIO", 0.2)
+    text_file, index_dir = corpus
+    texts = [case_text(n) for n in range(10)]
+    write_corpus(text_file, texts)
+    build_index(encoder, text_file, index_dir, MODEL, "flat")
+    write_corpus(text_file, texts[:5])
+    update_index(encoder, text_file, index_dir, MODEL)
+    case_index = load(index_dir, text_file)
+    assert len(case_index) == 5 and not case_index.deleted.any()
+
+def test_filters_map_to_live_canonical_cases(corpus, encoder):
+    text_file, index_dir = corpus
+    texts = [case_text(n) for n in range(6)]
+    duplicate = texts[1].replace("case1.pdf", "case1-copy.pdf")
+    write_corpus(text_file, texts + [duplicate])
+    build_index(encoder, text_file, index_dir, MODEL, "flat")
+    case_index = load(index_dir, text_file)
+    assert case_index.duplicates == 1
+    assert list(case_index.canonical_cases([6])) == [1]
+    assert list(case_index.keyword_cases("subject1")) == [1]  # a keyword finds the canonical case, not its copy
+    assert duplicate not in search_texts(case_index, encoder, texts[1], top_k=7)  # never takes a top-k slot
+    assert search_texts(case_index, encoder, texts[1], case_ids=np.array([6]))[0] == texts[1]
+
+def test_removing_a_canonical_case_promotes_its_duplicate(corpus, encoder):
+    text_file, index_dir = corpus
+    texts = [case_text(n) for n in range(6)]
+    duplicate = texts[1].replace("case1.pdf", "case1-copy.pdf")
+    write_corpus(text_file, texts + [duplicate])
+    build_index(encoder, text_file, index_dir, MODEL, "flat")
+    write_corpus(text_file, texts[:1] + texts[2:] + [duplicate])
+    update_index(encoder, text_file, index_dir, MODEL)
+    case_index = load(index_dir, text_file)
+    assert live_texts(case_index) == sorted(texts[:1] + texts[2:] + [duplicate])
+    assert search_texts(case_index, encoder, duplicate)[0] == duplicate
+
+def test_mapped_flat_index_matches_faiss():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((1000, 16)).astype(np.float32)
+    queries = rng.standard_normal((4, 16)).astype(np.float32)
+    flat = faiss.IndexFlatL2(16)
+    flat.add(vectors)
+    mapped = MappedFlatIndex(vectors, block_rows=128)
+    distances, ids = mapped.search(queries, 10)
+    expected_distances, expected_ids = flat.search(queries, 10)
+    np.testing.assert_array_equal(ids, expected_ids)
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-4, atol=1e-4)
+
+    allowed = np.zeros(1000, dtype=bool)
+    allowed[[5, 500, 999]] = True
+    distances, ids = mapped.search(queries[:1], 5, allowed)
+    assert sorted(ids[0][:3]) == [5, 500, 999] and list(ids[0][3:]) == [-1, -1]
@@ -0,0 +1,84 @@
+import faiss
+import numpy as np
+import pytest
+from index_store import (DEFAULT_EF_SEARCH, DEFAULT_NPROBE, INDEX_TYPES, CaseIndex, index_info, make_index, rerank,
+                         search_parameter, search_parameters, train_and_add)
+
+MIN_RECALL = {"flat": 1.0, "ivf_flat": 1.0, "hnsw": 0.95, "ivf_pq": 0.8, "fp16": 1.0, "sq8": 0.95, "pq": 0.8}
+
+def clustered_vectors(n=300, d=8, clusters=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, d))
+    vectors = centres[rng.integers(clusters, size=n)] + 0.3 * rng.standard_normal((n, d))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+def recall(ids, expected):
+    return np.mean([len(set(row) & set(truth)) / len(truth) for row, truth in zip(ids, expected)])
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_index_types_find_the_nearest_vectors(index_type):
+    vectors = clustered_vectors()
+    queries = vectors[:50] + 0.05 * np.random.default_rng(1).standard_normal((50, vectors.shape[1])).astype(np.float32)
+    _, expected = faiss.knn(queries, vectors, 10)
+    index = train_and_add(make_index(index_type, vectors.shape[1], len(vectors)), vectors)
+    assert index.ntotal == len(vectors)
+    case_index = CaseIndex(index, [str(i) for i in range(len(vectors))], {"index_type": index_type}, vectors)
+    nlist = index_info(index, index_type).get("nlist", 1)
+    _, ids = case_index.search(queries, 10, nprobe=nlist, ef_search=256)  # searched exhaustively
+    assert recall(ids, expected) >= MIN_RECALL[index_type]
+
+def test_search_parameter_of_a_request():
+    assert search_parameter(None, "nprobe") is None
+    assert search_parameter("16", "nprobe") == 16
+    for bad in (0, -4, "many", [8]):
+        with pytest.raises(ValueError, match="nprobe must be a positive integer"):
+            search_parameter(bad, "nprobe")
+
+def test_search_parameters_apply_to_one_call():
+    vectors = clustered_vectors()
+    ivf = train_and_add(make_index("ivf_flat", vectors.shape[1], len(vectors)), vectors)
+    assert search_parameters(ivf).nprobe == DEFAULT_NPROBE
+    assert search_parameters(ivf, nprobe=3).nprobe == 3
+    hnsw = train_and_add(make_index("hnsw", vectors.shape[1], len(vectors)), vectors)
+    assert search_parameters(hnsw).efSearch == DEFAULT_EF_SEARCH
+    assert search_parameters(hnsw, ef_search=200).efSearch == 200
+    assert search_parameters(faiss.IndexFlatL2(vectors.shape[1])) is None
+
+    case_index = CaseIndex(ivf, [str(i) for i in range(len(vectors))], {"index_type": "ivf_flat"}, vectors)
+    nprobe = faiss.extract_index_ivf(ivf).nprobe
+    case_index.search(vectors[:2], 5, nprobe=7)
+    assert faiss.extract_index_ivf(ivf).nprobe == nprobe  # the shared index is not modified
+
+@pytest.mark.parametrize("n, nlist", [(100, 2), (3000, 76), (1_000_000, 4000)])
+def test_ivf_lists_grow_with_the_corpus(n, nlist):
+    assert faiss.extract_index_ivf(make_index("ivf_flat", 32, n)).nlist == nlist
+
+def test_unknown_index_type():
+    with pytest.raises(ValueError):
+        make_index("lsh", 32, 100)
+
+@pytest.mark.parametrize("index_type, bytes_per_vector", [("flat", 32), ("fp16", 16), ("sq8", 8)])
+def test_compressed_vectors(index_type, bytes_per_vector):
+    vectors = clustered_vectors()
+    index = train_and_add(make_index(index_type, vectors.shape[1], len(vectors)), vectors)
+    assert index_info(index, index_type)["bytes_per_vector"] == bytes_per_vector
+
+def test_lossy_indexes_rerank_by_exact_distance():
+    vectors = clustered_vectors()
+    index = train_and_add(make_index("sq8", vectors.shape[1], len(vectors)), vectors)
+    case_index = CaseIndex(index, [str(i) for i in range(len(vectors))], {"index_type": "sq8"}, vectors)
+    assert case_index.rerank_factor > 1
+    distances, ids = case_index.search(vectors[:5], 3)
+    np.testing.assert_allclose(distances, ((vectors[ids] - vectors[:5, None]) ** 2).sum(-1), atol=1e-5)
+    assert list(ids[:, 0]) == [0, 1, 2, 3, 4]
+    without_vectors = CaseIndex(index, case_index.cases, {"index_type": "sq8"})
+    assert without_vectors.rerank_factor == 1
+
+def test_rerank():
+    vectors = np.array([[0, 0], [1, 0], [3, 0], [0, 2]], dtype=np.float32)
+    queries = np.array([[0.9, 0], [0, 0]], dtype=np.float32)
+    distances, ids = rerank(queries, np.array([[0, 2, 3, -1], [-1, -1, -1, -1]]), vectors, 2)
+    assert ids.tolist() == [[0, 2], [-1, -1]]
+    np.testing.assert_allclose(distances[0], [0.81, 4.41], rtol=1e-5)
+    assert np.isinf(distances[1]).all()
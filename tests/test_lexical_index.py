@@ -0,0 +1,79 @@
+import math
+import random
+from collections import Counter
+import numpy as np
+import pytest
+from lexical_index import BM25_B, BM25_K1, LexicalIndex, reciprocal_rank_fusion, tokenize
+
+def corpus(n=400, seed=0):
+    # Zipf-like word frequencies, so common words have long postings and MaxScore prunes
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(300)]
+    weights = [1 / (i + 1) for i in range(len(words))]
+    return [" ".join(rng.choices(words, weights, k=rng.randint(5, 80))) for _ in range(n)]
+
+def brute_force_bm25(texts, query):
+    docs = [Counter(tokenize(text)) for text in texts]
+    avg_length = sum(sum(doc.values()) for doc in docs) / len(docs)
+    scores = np.zeros(len(docs))
+    for term in set(tokenize(query)):
+        df = sum(term in doc for doc in docs)
+        if not df:
+            continue
+        idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(docs):
+            tf = doc[term]
+            if tf:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(doc.values()) / avg_length)
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores
+
+def assert_top_k(texts, index, query, top_k, allowed=None):
+    expected = brute_force_bm25(texts, query)
+    if allowed is not None:
+        expected[~allowed] = 0
+    scores, ids = index.search(query, top_k, allowed)
+    positive = np.flatnonzero(expected > 0)
+    assert len(ids) == min(top_k, len(positive))
+    np.testing.assert_allclose(scores, expected[ids], rtol=1e-4)
+    # Same scores as the brute-force top k; ties may come back in any order
+    np.testing.assert_allclose(scores, np.sort(expected[positive])[::-1][:top_k], rtol=1e-4)
+    assert list(scores) == sorted(scores, reverse=True)
+
+@pytest.mark.parametrize("query", ["w0 w1 w2", "w250 w3 w0", "w120 w121 w122 w0 w1", "w7", "w299 nothing"])
+@pytest.mark.parametrize("top_k", [1, 5, 40])
+def test_search_matches_brute_force(query, top_k):
+    texts = corpus()
+    assert_top_k(texts, LexicalIndex.build(texts), query, top_k)
+
+def test_search_with_allowed_mask():
+    texts = corpus()
+    allowed = np.zeros(len(texts), dtype=bool)
+    allowed[::3] = True
+    assert_top_k(texts, LexicalIndex.build(texts), "w0 w5 w200", 10, allowed)
+
+def test_search_saved_and_loaded(tmp_path):
+    texts = corpus()
+    def save_array(path, array):
+        np.save(path, array)
+    LexicalIndex.build(texts).save(str(tmp_path), save_array)
+    index = LexicalIndex.load(str(tmp_path))
+    assert_top_k(texts, index, "w1 w50 w51", 10)
+
+def test_search_unknown_terms():
+    index = LexicalIndex.build(corpus(50))
+    scores, ids = index.search("unknown words", 5)
+    assert len(scores) == len(ids) == 0
+
+def test_matching():
+    index = LexicalIndex.build(["HARUN-UL-RASHID v. State", "State v. Harun", "Rashid appeal"])
+    assert list(index.matching("harun rashid")) == [0]
+    assert list(index.matching("state")) == [0, 1]
+    assert list(index.matching("missing")) == []
+
+def test_reciprocal_rank_fusion():
+    vector = [{"case": 1, "score": 0.9, "chunks": [(10, 0.9)]}, {"case": 2, "score": 0.8, "chunks": [(20, 0.8)]}]
+    lexical = [{"case": 2, "score": 7.0, "chunks": [(21, 7.0)]}, {"case": 3, "score": 5.0, "chunks": [(30, 5.0)]}]
+    fused = reciprocal_rank_fusion([vector, lexical], 3)
+    assert [hit["case"] for hit in fused] == [2, 1, 3]
+    assert fused[0]["chunks"] == [(20, 0.8), (21, 7.0)]
@@ -0,0 +1,32 @@
+import numpy as np
+from near_duplicates import NO_SIGNATURE, DuplicateFinder, has_signature, signature, signatures, similarity
+
+JUDGMENT = "IN THE HIGH COURT OF DELHI AT NEW DELHI. " + " ".join(
+    f"{n}. The petitioner was arrested on {n} March under section {300 + n} and seeks regular bail. "
+    f"Heard learned counsel for the parties and perused record number {1000 + n}." for n in range(1, 30))
+
+def test_similar_texts_share_most_signature_slots():
+    rescan = JUDGMENT.replace("perused", "perusad", 1)  # one OCR error
+    assert similarity(signature(JUDGMENT), signature(rescan)) > 0.85
+    assert similarity(signature(JUDGMENT), signature("An unrelated order on land acquisition.")) < 0.2
+
+def test_duplicates_fold_into_the_first_case():
+    texts = ["Another matter entirely, a civil suit for possession of land " * 5, JUDGMENT, JUDGMENT + " Disposed of."]
+    finder = DuplicateFinder(0.85)
+    assert [finder.assign(i, sig) for i, sig in enumerate(signatures(texts))] == [0, 1, 1]
+
+def test_cases_without_tokens_stay_canonical():
+    texts = ["", "--- ... ---", JUDGMENT, "", "  "]
+    sigs = signatures(texts)
+    assert signature("") is None
+    assert (sigs[0] == NO_SIGNATURE).all() and not has_signature(sigs[0])
+    finder = DuplicateFinder(0.85)
+    assert [finder.assign(i, sig) for i, sig in enumerate(sigs)] == [0, 1, 2, 3, 4]
+    assert list(finder.signatures) == [2]
+
+def test_threshold_zero_turns_dedup_off():
+    finder = DuplicateFinder(0)
+    assert [finder.assign(i, sig) for i, sig in enumerate(signatures([JUDGMENT, JUDGMENT]))] == [0, 1]
+
+def test_signature_is_stable():
+    np.testing.assert_array_equal(signature(JUDGMENT), signature(JUDGMENT))
@@ -0,0 +1,112 @@
+import os
+import fitz
+import pytest
+from ocr_cache import OCRCache, page_fingerprint
+from ocr_jobs import JobQueue
+
+def make_pdf(path, texts):
+    doc = fitz.open()
+    for text in texts:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(path)
+    doc.close()
+
+def fingerprints(path, salt):
+    with fitz.open(path) as doc:
+        return [page_fingerprint(page, salt) for page in doc]
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = str(tmp_path / "case1.pdf")
+    make_pdf(path, ["first page", "second page"])
+    return path
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr_cache.sqlite"))
+    yield cache
+    cache.close()
+
+def store(cache, pdf, salt):
+    hashes = fingerprints(pdf, salt)
+    for n, h in enumerate(hashes):
+        cache.put_page(h, f"page {n} ({salt})", "ocr")
+    cache.put_document("case1.pdf", pdf, hashes, salt)
+    return hashes
+
+def test_page_fingerprint_depends_on_salt(pdf):
+    assert fingerprints(pdf, "dpi=300") == fingerprints(pdf, "dpi=300")
+    assert fingerprints(pdf, "dpi=300") != fingerprints(pdf, "dpi=400")
+
+def test_lookup_document(cache, pdf):
+    assert cache.lookup_document("case1.pdf", pdf, "dpi=300") is None
+    store(cache, pdf, "dpi=300")
+    assert cache.lookup_document("case1.pdf", pdf, "dpi=300") == [("page 0 (dpi=300)", "ocr"),
+                                                                   ("page 1 (dpi=300)", "ocr")]
+
+def test_document_page_count(cache, pdf):
+    assert cache.document_page_count("case1.pdf") is None
+    store(cache, pdf, "dpi=300")
+    assert cache.document_page_count("case1.pdf") == 2
+
+def test_lookup_document_misses_after_a_settings_change(cache, pdf):
+    store(cache, pdf, "dpi=300")
+    assert cache.lookup_document("case1.pdf", pdf, "dpi=400") is None
+    assert cache.get_pages(fingerprints(pdf, "dpi=400")) == {}
+
+def test_touched_but_identical_pdf_is_a_hit(cache, pdf):
+    store(cache, pdf, "dpi=300")
+    st = os.stat(pdf)
+    os.utime(pdf, (st.st_atime, st.st_mtime + 10))
+    assert cache.lookup_document("case1.pdf", pdf, "dpi=300") is not None
+
+def test_changed_pdf_misses(cache, pdf):
+    store(cache, pdf, "dpi=300")
+    make_pdf(pdf, ["first page", "second page, amended"])
+    assert cache.lookup_document("case1.pdf", pdf, "dpi=300") is None
+
+def test_done_pdf_is_queued_again_after_a_settings_change(cache, pdf):
+    jobs = JobQueue(cache)
+    hashes = fingerprints(pdf, "dpi=300")
+    assert not jobs.add("case1.pdf", pdf, hashes, salt="dpi=300")
+    filename, pages = jobs.claim(4)
+    assert jobs.complete(filename, [(n, f"page {n}", "ocr", 0.1) for n in pages])
+    assert jobs.state("case1.pdf", pdf) == "done"
+
+    # Same settings: nothing to do
+    assert not jobs.add("case1.pdf", pdf, hashes, cache.get_pages(hashes), salt="dpi=300")
+    assert jobs.claim(4) is None
+
+    # Other settings: every page is OCR'd again
+    hashes = fingerprints(pdf, "dpi=400")
+    assert not jobs.add("case1.pdf", pdf, hashes, cache.get_pages(hashes), salt="dpi=400")
+    assert jobs.claim(4) == ("case1.pdf", [0, 1])
+
+def test_extraction_ocrs_a_cached_pdf_again_after_a_settings_change(tmp_path, monkeypatch):
+    ocr_extraction = pytest.importorskip("ocr_extraction")
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    make_pdf(str(input_dir / "case1.pdf"), ["first page", "second page"])
+    monkeypatch.setattr(ocr_extraction, "INPUT_DIR", str(input_dir))
+    monkeypatch.setattr(ocr_extraction, "OUTPUT_DIR", str(output_dir))
+    monkeypatch.setattr(ocr_extraction, "TEXT_FILE", str(output_dir / "extracted_text.txt"))
+    monkeypatch.setattr(ocr_extraction, "RECORDS_FILE", str(output_dir / "all_extracted_cases.jsonl"))
+    monkeypatch.setattr(ocr_extraction, "CACHE_FILE", str(output_dir / "ocr_cache.sqlite"))
+    ocred = []
+
+    def ocr_page_task(task):
+        pdf_path, page_numbers = task
+        ocred.extend(page_numbers)
+        results = [(f"page {n}", "ocr", 0.1) for n in page_numbers]
+        return os.path.basename(pdf_path), page_numbers, results, os.getpid(), 0.1, None
+
+    monkeypatch.setattr(ocr_extraction, "ocr_page_task", ocr_page_task)
+    ocr_extraction.process_pdfs(num_workers=1)
+    assert ocred == [0, 1]
+    ocr_extraction.process_pdfs(num_workers=1)
+    assert ocred == [0, 1]
+
+    monkeypatch.setattr(ocr_extraction, "PREPROCESS_SETTINGS", ocr_extraction.make_settings(deskew=True))
+    ocr_extraction.process_pdfs(num_workers=1)
+    assert ocred == [0, 1, 0, 1]
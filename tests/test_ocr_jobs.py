@@ -0,0 +1,169 @@
+import os
+import socket
+import subprocess
+import sys
+import fitz
+import pytest
+import ocr_jobs
+from ocr_cache import OCRCache, page_fingerprint
+from ocr_jobs import JobQueue
+
+def make_pdf(path, pages):
+    doc = fitz.open()
+    for n in range(pages):
+        doc.new_page().insert_text((72, 72), f"{os.path.basename(path)} page {n}")
+    doc.save(path)
+    doc.close()
+
+def add_pdf(jobs, tmp_path, filename, pages):
+    path = str(tmp_path / filename)
+    make_pdf(path, pages)
+    with fitz.open(path) as doc:
+        hashes = [page_fingerprint(page) for page in doc]
+    jobs.add(filename, path, hashes)
+    return path
+
+def ocr(jobs, task):
+    filename, pages = task
+    return jobs.complete(filename, [(n, f"{filename} text {n}", "ocr", 0.1) for n in pages])
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "ocr_cache.sqlite")
+
+@pytest.fixture
+def jobs(db):
+    cache = OCRCache(db)
+    yield JobQueue(cache, worker="test:1")
+    cache.close()
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ocr_jobs, "backoff", lambda attempts: 0.0)
+
+def test_claim_complete_and_checkpoint(jobs, tmp_path):
+    path = add_pdf(jobs, tmp_path, "a.pdf", 5)
+    assert jobs.claim(2) == ("a.pdf", [0, 1])
+    assert jobs.claim(2) == ("a.pdf", [2, 3])
+    assert not ocr(jobs, ("a.pdf", [0, 1]))
+    assert jobs.cache.lookup_document("a.pdf", path) is None  # not complete yet
+    assert jobs.claim(2) == ("a.pdf", [4])
+    assert jobs.claim(2) is None
+    assert not ocr(jobs, ("a.pdf", [4]))
+    assert ocr(jobs, ("a.pdf", [2, 3]))
+    assert jobs.state("a.pdf", path) == "done"
+    assert [text for text, _ in jobs.cache.lookup_document("a.pdf", path)] == [f"a.pdf text {n}" for n in range(5)]
+
+def test_pages_are_checkpointed_across_runs(db, tmp_path):
+    cache = OCRCache(db)
+    jobs = JobQueue(cache, worker="test:1")
+    add_pdf(jobs, tmp_path, "a.pdf", 3)
+    ocr(jobs, jobs.claim(2))
+    cache.close()  # the run stops here
+
+    cache = OCRCache(db)
+    jobs = JobQueue(cache, worker="test:2")
+    assert jobs.claim(4) == ("a.pdf", [2])
+    assert ocr(jobs, ("a.pdf", [2]))
+    cache.close()
+
+def test_workers_never_claim_the_same_page(db, jobs, tmp_path):
+    add_pdf(jobs, tmp_path, "a.pdf", 3)
+    add_pdf(jobs, tmp_path, "b.pdf", 2)
+    other_cache = OCRCache(db)
+    other = JobQueue(other_cache, worker="test:2")
+    claimed = []
+    for queue in [jobs, other, jobs, other]:
+        task = queue.claim(2)
+        if task:
+            claimed += [(task[0], n) for n in task[1]]
+    other_cache.close()
+    assert sorted(claimed) == [("a.pdf", 0), ("a.pdf", 1), ("a.pdf", 2), ("b.pdf", 0), ("b.pdf", 1)]
+
+def test_failed_pages_wait_for_their_backoff(jobs, tmp_path):
+    add_pdf(jobs, tmp_path, "a.pdf", 2)
+    task = jobs.claim(2)
+    assert not jobs.fail(*task, "boom")
+    assert jobs.claim(2) is None  # backing off
+    assert 0 < jobs.next_retry() <= ocr_jobs.OCR_RETRY_BACKOFF
+    assert jobs.status()["pages_waiting_retry"] == 2
+
+def test_poison_page_is_quarantined_and_released(jobs, tmp_path, no_backoff):
+    path = add_pdf(jobs, tmp_path, "a.pdf", 2)
+    for attempt in range(1, jobs.max_attempts + 1):
+        task = jobs.claim(1)
+        assert task == ("a.pdf", [0])
+        assert jobs.fail(*task, "poison") == (attempt == jobs.max_attempts)
+    assert jobs.state("a.pdf", path) == "quarantined"
+    assert jobs.claim(1) is None
+    status = jobs.status()
+    assert status["quarantined"] == [("a.pdf", "page 1: poison")]
+    assert status["failed_attempts"] == jobs.max_attempts
+
+    assert jobs.retry_quarantined() == 1
+    assert jobs.state("a.pdf", path) == "pending"
+    assert jobs.claim(2) == ("a.pdf", [0, 1])
+
+def test_fail_ignores_pages_another_worker_holds(db, jobs, tmp_path):
+    add_pdf(jobs, tmp_path, "a.pdf", 1)
+    task = jobs.claim(1)
+    other_cache = OCRCache(db)
+    other = JobQueue(other_cache, worker="test:2")
+    assert not other.fail(*task, "not mine")
+    other_cache.close()
+    assert jobs.status()["pages_running"] == 1
+
+def test_expired_lease_is_claimed_again(db, tmp_path, no_backoff):
+    cache = OCRCache(db)
+    hung = JobQueue(cache, worker="test:1", lease=-1)  # every lease is already over
+    add_pdf(hung, tmp_path, "a.pdf", 1)
+    assert hung.claim(1) == ("a.pdf", [0])
+    other = JobQueue(cache, worker="test:2")
+    assert other.claim(1) is None  # the expiry counts as a failed attempt, retried after its backoff
+    assert other.claim(1) == ("a.pdf", [0])
+    assert not hung.fail("a.pdf", [0], "late")  # the page is no longer the hung worker's
+    assert ocr(other, ("a.pdf", [0]))
+    cache.close()
+
+@pytest.mark.skipif(os.name == "nt", reason="dead workers are only detected through os.kill on POSIX")
+def test_recover_releases_pages_of_dead_workers(db, jobs, tmp_path, no_backoff):
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    dead = JobQueue(jobs.cache, worker=f"{socket.gethostname()}:{child.pid}")
+    add_pdf(jobs, tmp_path, "a.pdf", 2)
+    assert dead.claim(1) == ("a.pdf", [0])
+    assert jobs.claim(1) == ("a.pdf", [1])  # a live worker's page stays claimed
+    assert jobs.recover() == 1
+    assert jobs.claim(2) == ("a.pdf", [0])
+
+def test_unreadable_pdf_is_quarantined_after_max_attempts(jobs, tmp_path):
+    path = str(tmp_path / "broken.pdf")
+    with open(path, "wb") as f:
+        f.write(b"not a pdf")
+    results = [jobs.add_unreadable("broken.pdf", path, "cannot open") for _ in range(jobs.max_attempts)]
+    assert results == [False] * (jobs.max_attempts - 1) + [True]
+    assert jobs.state("broken.pdf", path) == "quarantined"
+
+def test_changed_pdf_drops_its_job(jobs, tmp_path):
+    path = add_pdf(jobs, tmp_path, "a.pdf", 2)
+    make_pdf(path, 3)
+    os.utime(path, (0, 0))
+    assert jobs.state("a.pdf", path) is None
+    assert jobs.claim(4) is None
+
+def test_cached_pages_are_done_on_add(jobs, tmp_path):
+    path = str(tmp_path / "a.pdf")
+    make_pdf(path, 2)
+    with fitz.open(path) as doc:
+        hashes = [page_fingerprint(page) for page in doc]
+    assert not jobs.add("a.pdf", path, hashes, {hashes[0]})
+    assert jobs.claim(4) == ("a.pdf", [1])
+    jobs.cache.put_page(hashes[0], "cached", "native")
+    assert ocr(jobs, ("a.pdf", [1]))
+    assert jobs.cache.lookup_document("a.pdf", path) == [("cached", "native"), ("a.pdf text 1", "ocr")]
+
+def test_prune_forgets_removed_pdfs(jobs, tmp_path):
+    add_pdf(jobs, tmp_path, "a.pdf", 1)
+    add_pdf(jobs, tmp_path, "b.pdf", 1)
+    assert jobs.prune(["b.pdf"]) == 1
+    assert jobs.claim(4) == ("b.pdf", [0])
@@ -0,0 +1,94 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from query_batcher import QueryBatcher
+
+class GatedModel:
+    """Encodes "q<n>" as [n, 1]; the first encode waits until the gate opens."""
+
+    def __init__(self):
+        self.calls = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+
+    def encode(self, queries, batch_size=32, convert_to_numpy=True):
+        if not self.entered.is_set():
+            self.entered.set()
+            self.gate.wait(5)
+        self.calls.append(list(queries))
+        return np.array([[float(q[1:]), 1.0] for q in queries], dtype=np.float32)
+
+class FakeCaseIndex:
+    def __init__(self, fail_top_k=None):
+        self.version = uuid.uuid4().hex  # a fresh embedding cache for every test
+        self.searches = []
+        self.fail_top_k = fail_top_k
+
+    def search_cases(self, query_embeddings, top_k, aggregate="max", nprobe=None, ef_search=None, case_ids=None):
+        if top_k == self.fail_top_k:
+            raise RuntimeError("search failed")
+        self.searches.append((len(query_embeddings), top_k))
+        return [[{"case": int(row[0]), "score": 1.0, "chunks": [], "top_k": top_k}] for row in query_embeddings]
+
+def submit_while_busy(pool, batcher, case_index, requests):
+    """Futures of the (query, top_k) requests; the rest queue up while the first one is being encoded."""
+    futures = [pool.submit(batcher.search_cases, case_index, *requests[0])]
+    assert batcher.embedding_model.entered.wait(5)
+    futures += [pool.submit(batcher.search_cases, case_index, query, top_k) for query, top_k in requests[1:]]
+    deadline = time.monotonic() + 5
+    while batcher._queue.qsize() < len(requests) - 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    batcher.embedding_model.gate.set()
+    return futures
+
+def run_concurrently(batcher, case_index, requests):
+    with ThreadPoolExecutor(len(requests)) as pool:
+        return [future.result(timeout=5) for future in submit_while_busy(pool, batcher, case_index, requests)]
+
+def test_queued_queries_are_encoded_and_searched_together():
+    batcher = QueryBatcher(GatedModel(), max_batch=32, max_wait_ms=50)
+    case_index = FakeCaseIndex()
+    requests = [(f"q{n}", 5) for n in range(8)]
+    results = run_concurrently(batcher, case_index, requests)
+    assert [hits[0]["case"] for hits in results] == list(range(8))
+    assert sorted(len(call) for call in batcher.embedding_model.calls) == [1, 7]
+    assert sorted(case_index.searches) == [(1, 5), (7, 5)]
+    assert batcher.stats() == {"batches": 2, "queries": 8, "avg_batch": 4.0}
+
+def test_batches_are_searched_per_parameter_set_and_encode_repeats_once():
+    batcher = QueryBatcher(GatedModel(), max_batch=32, max_wait_ms=50)
+    case_index = FakeCaseIndex()
+    requests = [("q0", 5), ("q1", 5), ("q1", 3), ("q2", 3), ("q1", 5)]
+    results = run_concurrently(batcher, case_index, requests)
+    assert [(hits[0]["case"], hits[0]["top_k"]) for hits in results] == [(0, 5), (1, 5), (1, 3), (2, 3), (1, 5)]
+    encoded = [q for call in batcher.embedding_model.calls for q in call]
+    assert sorted(encoded) == ["q0", "q1", "q2"]
+
+def test_a_failing_search_fails_only_its_own_requests():
+    batcher = QueryBatcher(GatedModel(), max_batch=32, max_wait_ms=50)
+    case_index = FakeCaseIndex(fail_top_k=3)
+    with ThreadPoolExecutor(4) as pool:
+        futures = submit_while_busy(pool, batcher, case_index, [("q0", 5), ("q1", 3), ("q2", 5), ("q3", 3)])
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result(timeout=5)[0]["case"])
+            except RuntimeError:
+                outcomes.append("failed")
+    assert outcomes == [0, "failed", 2, "failed"]
+
+def test_disabled_batcher_searches_in_the_calling_thread():
+    model = GatedModel()
+    model.gate.set()
+    batcher = QueryBatcher(model, enabled=False)
+    case_index = FakeCaseIndex()
+    assert batcher.search_cases(case_index, "q4", 5)[0]["case"] == 4
+    assert case_index.searches == [(1, 5)] and batcher.stats()["batches"] == 0
+
+def test_bad_parameters_fail_before_queueing():
+    batcher = QueryBatcher(GatedModel())
+    with pytest.raises(TypeError):
+        batcher.search_cases(FakeCaseIndex(), "q1", 5, nprobe=[1])
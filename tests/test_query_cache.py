@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import query_cache
+from query_cache import LRUCache, encode_query
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(2)
+    cache.put("a", 1, "v1")
+    cache.put("b", 2, "v1")
+    assert cache.get("a", "v1") == 1  # "b" is now the oldest
+    cache.put("c", 3, "v1")
+    assert cache.get("b", "v1") is None
+    assert (cache.get("a", "v1"), cache.get("c", "v1")) == (1, 3)
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 3, "misses": 1, "hit_rate": 0.75, "evictions": 1,
+                             "invalidations": 0}
+
+def test_new_index_version_drops_every_entry():
+    cache = LRUCache(10)
+    cache.put("q", "hits of v1", "v1")
+    assert cache.get("q", "v2") is None
+    assert cache.get("q", "v1") is None  # gone for good, not kept per version
+    assert cache.stats()["invalidations"] == 1
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = LRUCache(10, ttl=60)
+    cache.put("q", "hits", "v1")
+    now[0] += 59
+    assert cache.get("q", "v1") == "hits"
+    now[0] += 2
+    assert cache.get("q", "v1") is None
+
+def test_size_zero_disables_the_cache():
+    cache = LRUCache(0)
+    cache.put("q", 1, "v1")
+    assert cache.get("q", "v1") is None
+
+class CountingModel:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, queries, convert_to_numpy=True):
+        self.encoded += queries
+        return np.array([[len(q), 1.0] for q in queries], dtype=np.float32)
+
+@pytest.fixture
+def embedding_cache(monkeypatch):
+    cache = LRUCache(10)
+    monkeypatch.setattr(query_cache, "embedding_cache", cache)
+    return cache
+
+def test_encode_query_reuses_embeddings_of_the_same_index(embedding_cache):
+    model = CountingModel()
+    first = encode_query(model, "bail", "v1")
+    assert encode_query(model, "bail", "v1") is first
+    assert not first.flags.writeable  # shared between requests
+    encode_query(model, "bail", "v2")
+    assert model.encoded == ["bail", "bail"]
@@ -0,0 +1,81 @@
+import pytest
+from shards import SEPARATOR, ShardCoordinator, read_manifest, shard_name, split_corpus
+
+ANSWERS = {
+    "http://a": {"shard": "h00", "version": "1", "cases": [{"text": "a1", "score": 9.0}, {"text": "a2", "score": 4.0}]},
+    "http://b": {"shard": "h01", "version": "1", "cases": [{"text": "b1", "score": 7.0}, {"text": "b2", "score": 5.0}]},
+}
+
+def coordinator(answers, timeout=2):
+    shards = ShardCoordinator(None, urls=list(answers), timeout=timeout)
+    def post(url, body, headers):
+        answer = answers[url]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer  # None: the shard was removed
+    shards._post = post
+    return shards
+
+def test_merges_shard_hits_by_score():
+    shards = coordinator(ANSWERS)
+    assert shards.search("bail", 3, mode="lexical") == (["a1", "b1", "b2"], [])
+    assert shards.status()["shards"]["http://b"]["status"] == "ok"
+
+def test_failed_shard_gives_a_partial_result():
+    shards = coordinator({**ANSWERS, "http://c": ConnectionError("refused")})
+    assert shards.search("bail", 2, mode="lexical") == (["a1", "b1"], ["http://c"])
+    assert shards.status()["partial_results"] == 1
+    assert shards.status()["shards"]["http://c"] == {"status": "failed", "error": "refused"}
+
+def test_removed_shard_is_dropped():
+    shards = coordinator({**ANSWERS, "http://c": None})
+    assert shards.search("bail", 2, mode="lexical") == (["a1", "b1"], [])
+    assert shards.urls == ["http://a", "http://b"]
+    assert shards.status() == {"shards": {"http://a": {"status": "ok", "shard": "h00", "version": "1"},
+                                          "http://b": {"status": "ok", "shard": "h01", "version": "1"},
+                                          "http://c": {"status": "removed"}},
+                               "partial_results": 0}
+
+def test_bad_filter_is_raised():
+    shards = coordinator({**ANSWERS, "http://c": ValueError("Unknown filter field")})
+    with pytest.raises(ValueError, match="Unknown filter field"):
+        shards.search("bail", 2, mode="lexical")
+    with pytest.raises(ValueError):
+        shards.search("bail", 2, mode="fuzzy")
+
+def test_filter_only_search_keeps_shard_order():
+    shards = coordinator(ANSWERS)
+    assert shards.search(" ", 3, mode="lexical")[0] == ["a1", "a2", "b1"]
+
+def write_corpus(text_file, cases):
+    text_file.write_text("".join(f"{SEPARATOR} {case}\n\n" for case in cases), encoding="utf-8")
+
+def test_split_corpus_by_hash(tmp_path):
+    cases = [f"case{n}.pdf --- judgment {n}" for n in range(20)]
+    text_file = tmp_path / "extracted_text.txt"
+    write_corpus(text_file, cases)
+    shard_dir = str(tmp_path / "shards")
+    counts = split_corpus(str(text_file), shard_dir, "hash", 3)
+    assert sum(counts.values()) == 20
+    assert read_manifest(shard_dir)["shards"] == counts
+    for case in cases:
+        text = (tmp_path / "shards" / shard_name(case, "hash", 3) / "extracted_text.txt").read_text(encoding="utf-8")
+        assert f"{SEPARATOR} {case}\n" in text
+    with pytest.raises(ValueError):
+        shard_name(cases[0], "judge")
+
+def test_emptied_shard_is_removed(tmp_path):
+    cases = [f"case{n}.pdf --- judgment {n}" for n in range(20)]
+    text_file, shard_dir = tmp_path / "extracted_text.txt", tmp_path / "shards"
+    write_corpus(text_file, cases)
+    counts = split_corpus(str(text_file), str(shard_dir), "hash", 3)
+    emptied = min(counts)
+    for name in counts:  # as if their indexes had been built
+        index_dir = shard_dir / name / "index"
+        index_dir.mkdir()
+        (index_dir / "CURRENT").write_text("v1", encoding="utf-8")
+    write_corpus(text_file, [case for case in cases if shard_name(case, "hash", 3) != emptied])
+    assert emptied not in split_corpus(str(text_file), str(shard_dir), "hash", 3)
+    assert emptied not in read_manifest(str(shard_dir))["shards"]
+    assert not (shard_dir / emptied).exists()
+    assert all((shard_dir / name / "index" / "CURRENT").exists() for name in counts if name != emptied)
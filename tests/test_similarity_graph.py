@@ -0,0 +1,75 @@
+import importlib.util
+import os
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from index_store import build_index, update_index
+from test_index_store import HashingEncoder, case_text, write_corpus
+
+# The module's file name is not importable as is
+_spec = importlib.util.spec_from_file_location(
+    "clusteredprogram", os.path.join(os.path.dirname(__file__), os.pardir, "clusteredprogram.py.py"))
+graph = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(graph)
+
+def unit_rows(n=60, d=12, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = np.abs(rng.standard_normal((n, d))) * (rng.random((n, d)) < 0.4)
+    vectors[:, 0] += 0.01  # no empty rows
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def brute_force(vectors, k, threshold):
+    sims = vectors @ vectors.T
+    np.fill_diagonal(sims, -np.inf)
+    edges = set()
+    for i, row in enumerate(sims):
+        for j in np.argsort(-row, kind="stable")[:k]:
+            if row[j] > threshold:
+                edges.add((i, int(j)))
+    return edges
+
+@pytest.mark.parametrize("block_rows", [7, 1024])
+def test_sparse_neighbours_match_brute_force(block_rows):
+    vectors = unit_rows()
+    rows, cols, sims = graph.sparse_neighbours(sp.csr_matrix(vectors), 5, 0.5, block_rows)
+    assert set(zip(rows.tolist(), cols.tolist())) == brute_force(vectors, 5, 0.5)
+    np.testing.assert_allclose(sims, (vectors[rows] * vectors[cols]).sum(1), rtol=1e-5)
+
+def test_dense_neighbours_match_sparse_ones():
+    vectors = unit_rows()
+    dense = graph.dense_neighbours(vectors, 5, 0.5)
+    assert set(zip(dense[0].tolist(), dense[1].tolist())) == brute_force(vectors, 5, 0.5)
+
+def test_similarity_matrix_keeps_each_pair_once():
+    rows, cols, sims = np.array([0, 1, 2, 0]), np.array([1, 0, 0, 2]), np.array([0.9, 0.9, 0.7, 0.7])
+    upper = graph.similarity_matrix(3, rows, cols, sims)
+    assert upper.nnz == 2
+    assert sp.triu(upper, 1).nnz == 2
+    G = graph.build_graph(["a", "b", "c"], upper)
+    assert G.number_of_nodes() == 3 and G.nodes[2]["text"] == "c"
+    assert sorted(G.edges(data="weight")) == [(0, 1, pytest.approx(0.9)), (0, 2, pytest.approx(0.7))]
+
+def test_embedding_vectors_average_the_passages(tmp_path):
+    text_file, index_dir = str(tmp_path / "extracted_text.txt"), str(tmp_path / "index")
+    texts = [case_text(n, words=400) for n in range(4)]  # several passages per case
+    write_corpus(text_file, texts)
+    build_index(HashingEncoder(), text_file, index_dir)
+    cases, vectors = graph.embedding_vectors(index_dir)
+    assert [str(case) for case in cases] == texts
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1, rtol=1e-5)
+    expected = HashingEncoder().encode([texts[0]])[0]
+    assert vectors[0] @ expected > 0.9
+
+def test_deleted_cases_are_left_out(tmp_path):
+    text_file, index_dir = str(tmp_path / "extracted_text.txt"), str(tmp_path / "index")
+    texts = [case_text(n) for n in range(5)]
+    write_corpus(text_file, texts)
+    build_index(HashingEncoder(), text_file, index_dir)
+    write_corpus(text_file, texts[:1] + texts[2:] + [texts[1].replace("case1.pdf", "case1-copy.pdf")])
+    update_index(HashingEncoder(), text_file, index_dir)  # case 1 is tombstoned, its copy added
+    cases, vectors = graph.embedding_vectors(index_dir)
+    assert len(cases) == len(vectors) == 5
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1, rtol=1e-5)
+    G = graph.build_graph(cases, graph.similarity_matrix(len(cases), *graph.dense_neighbours(vectors, 3, 0.0)))
+    assert texts[1] not in [str(text) for _, text in G.nodes(data="text")]
+    assert G.number_of_edges() > 0
@@ -0,0 +1,38 @@
+import pytest
+from flask import Flask, jsonify
+import telemetry
+
+@pytest.fixture(scope="module")  # instrument() registers its metrics once per process
+def client():
+    app = Flask(__name__)
+    app.config["TESTING"] = True  # exceptions reach the client, no after_request runs for them
+
+    @app.route("/ok")
+    def ok():
+        telemetry.observe("parse", 0.001)
+        return jsonify({})
+
+    @app.route("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    telemetry.instrument(app)
+    return app.test_client()
+
+def metric(client, line):
+    for exposed in client.get("/metrics").get_data(as_text=True).splitlines():
+        if exposed.startswith(line + " "):
+            return int(exposed.split()[-1])
+    raise AssertionError(f"{line} not exposed")
+
+def test_trace_header_and_server_timing(client):
+    response = client.get("/ok", headers={telemetry.TRACE_HEADER: "abc"})
+    assert response.headers[telemetry.TRACE_HEADER] == "abc"
+    assert response.headers["Server-Timing"].startswith("parse;dur=")
+    assert telemetry.current_trace() is None
+
+def test_trace_is_finished_when_the_view_raises(client):
+    with pytest.raises(RuntimeError):
+        client.get("/boom")
+    assert telemetry.current_trace() is None
+    assert metric(client, 'http_requests_total{endpoint="boom",status="5xx"}') == 1
@@ -0,0 +1,50 @@
+import pytest
+spacy = pytest.importorskip("spacy")
+from token_cache import TokenCache, normalize, text_hash
+
+class CountingNLP:
+    """A blank English pipeline with lowercase lemmas, counting the texts it processes."""
+
+    def __init__(self):
+        self.nlp = spacy.blank("en")
+        self.max_length = self.nlp.max_length
+        self.texts = []
+
+    def pipe(self, texts, n_process=1, batch_size=16):
+        for doc in self.nlp.pipe(texts, batch_size=batch_size):
+            self.texts.append(doc.text)
+            for token in doc:
+                token.lemma_ = token.lower_
+            yield doc
+
+TEXTS = ["The Petitioner was arrested on 12 March.", "Bail is granted, the petitioner shall appear.", ""]
+
+def test_normalize_drops_stop_words_punctuation_and_numbers():
+    assert normalize(TEXTS, nlp=CountingNLP()) == [["petitioner", "arrested", "march"],
+                                                    ["bail", "granted", "petitioner", "shall", "appear"], []]
+
+def test_cached_texts_skip_spacy(tmp_path):
+    path = str(tmp_path / "tokens.sqlite")
+    cache = TokenCache(path)
+    nlp = CountingNLP()
+    first = normalize(TEXTS, cache, nlp=nlp)
+    cache.close()
+
+    cache = TokenCache(path)
+    nlp = CountingNLP()
+    assert normalize(TEXTS + ["A new order."], cache, nlp=nlp) == first + [["new", "order"]]
+    assert nlp.texts == ["A new order."]
+    assert (cache.hits, cache.misses) == (3, 1)
+    cache.close()
+
+def test_settings_are_part_of_the_key():
+    assert text_hash("text", "en_core_web_sm/3.8") != text_hash("text", "en_core_web_md/3.8")
+    assert text_hash("text", "salt") == text_hash("text", "salt")
+
+def test_get_many_reads_in_chunks(tmp_path):
+    cache = TokenCache(str(tmp_path / "tokens.sqlite"))
+    for i in range(1200):
+        cache.put(f"h{i}", [f"w{i}"])
+    found = cache.get_many([f"h{i}" for i in range(1300)])
+    assert len(found) == 1200 and found["h1199"] == ["w1199"]
+    cache.close()
@@ -0,0 +1,110 @@
+import os
+import time
+import sqlite3
+import hashlib
+
+# spaCy normalization of case texts, cached on disk.
+#
+# The similarity graph only uses each token's lemma and its stop word,
+# punctuation and alphabetic flags. The parser and NER are excluded when the
+# model is loaded. The tagger and attribute ruler stay, because the
+# lemmatizer needs the POS tags. Texts go through nlp.pipe in batches, over
+# NLP_PROCESSES worker processes if set.
+#
+# The normalized tokens are stored in a SQLite file keyed by the SHA-256 of
+# the text and the normalization settings, so re-runs and other consumers
+# read them back instead of running spaCy again. Changing the model or its
+# version gives new keys.
+
+SPACY_MODEL = os.environ.get("SPACY_MODEL", "en_core_web_sm")
+EXCLUDED_COMPONENTS = ("parser", "ner")  # only lemmas and lexical flags are used
+NLP_PROCESSES = int(os.environ.get("NLP_PROCESSES", "1"))
+NLP_BATCH_SIZE = int(os.environ.get("NLP_BATCH_SIZE", "16"))
+TOKEN_CACHE_FILE = os.environ.get("TOKEN_CACHE_FILE", "token_cache.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    text_hash TEXT PRIMARY KEY,
+    tokens TEXT NOT NULL
+);
+"""
+
+def load_nlp(model=SPACY_MODEL):
+    import spacy
+    return spacy.load(model, exclude=list(EXCLUDED_COMPONENTS))
+
+def doc_tokens(doc):
+    """Lowercased lemmas of the alphabetic tokens that are not stop words or punctuation."""
+    return [token.lemma_.lower() for token in doc if not token.is_stop and not token.is_punct and token.is_alpha]
+
+def text_hash(text, salt=""):
+    return hashlib.sha256((salt + "\0" + text).encode("utf-8")).hexdigest()
+
+class TokenCache:
+    """SQLite-backed normalized tokens of texts, keyed by content hash."""
+
+    def __init__(self, path=TOKEN_CACHE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def get_many(self, hashes):
+        """Returns {text_hash: tokens} for the hashes already in the cache."""
+        found = {}
+        unique = list(set(hashes))
+        for i in range(0, len(unique), 500):  # stay under SQLite's variable limit
+            chunk = unique[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT text_hash, tokens FROM tokens WHERE text_hash IN ({','.join('?' * len(chunk))})", chunk)
+            found.update((h, tokens.split(" ") if tokens else []) for h, tokens in rows)
+        return found
+
+    def put(self, h, tokens):
+        self.conn.execute("INSERT OR REPLACE INTO tokens (text_hash, tokens) VALUES (?, ?)", (h, " ".join(tokens)))
+
+    def commit(self):
+        self.conn.commit()
+
+def normalize(texts, cache=None, nlp=None, n_process=NLP_PROCESSES, batch_size=NLP_BATCH_SIZE, model=SPACY_MODEL):
+    """Normalized tokens of every text (doc_tokens), through the cache if given.
+
+    Only texts missing from the cache are loaded into spaCy; nlp is loaded
+    on demand when there are any.
+    """
+    salt = None
+    results = [None] * len(texts)
+    missing = list(range(len(texts)))
+    if cache is not None:
+        import spacy
+        salt = f"{model}/{spacy.__version__}/{','.join(EXCLUDED_COMPONENTS)}"
+        hashes = [text_hash(text, salt) for text in texts]
+        found = cache.get_many(hashes)
+        missing = [i for i, h in enumerate(hashes) if h not in found]
+        for i, h in enumerate(hashes):
+            if h in found:
+                results[i] = found[h]
+        cache.hits += len(texts) - len(missing)
+        cache.misses += len(missing)
+    if missing:
+        nlp = nlp or load_nlp(model)
+        nlp.max_length = max(nlp.max_length, max(len(texts[i]) for i in missing) + 1)
+        start = time.perf_counter()
+        docs = nlp.pipe((texts[i] for i in missing), n_process=n_process, batch_size=batch_size)
+        for i, doc in zip(missing, docs):
+            results[i] = doc_tokens(doc)
+            if cache is not None:
+                cache.put(hashes[i], results[i])
+        elapsed = time.perf_counter() - start
+        print(f"spaCy: {len(missing)} docs in {elapsed:.1f}s ({len(missing) / max(elapsed, 1e-9):.1f} docs/sec, "
+              f"{n_process} process{'es' if n_process > 1 else ''})")
+        if cache is not None:
+            cache.commit()
+    if cache is not None:
+        print(f"Token cache: {cache.hits} hits, {cache.misses} misses")
+    return results